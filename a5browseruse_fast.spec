@@ -0,0 +1,86 @@
+# -*- mode: python ; coding: utf-8 -*-
+#
+# Startup-tuned build of the server, next to the onefile a5browseruse.spec:
+#
+# - onedir: the executable runs from its folder instead of unpacking itself
+#   to a temp dir on every launch;
+# - no UPX, so libraries are mapped as they are instead of decompressed;
+# - noarchive: modules are stored as .pyc files compiled at build time
+#   instead of in a compressed archive;
+# - packages of unused providers and of tools installed alongside browser_use
+#   and langchain are left out.
+#
+#   A5_SERVER=main pyinstaller a5browseruse_fast.spec
+#
+# A5_SERVER picks the server (main, mainGemini or mainOllama). A5_PROVIDERS
+# lists the providers to bundle, comma separated; it defaults to the server's
+# own provider. Fallbacks in LLM_FALLBACKS whose provider is not bundled are
+# skipped at startup. Measure with benchmarks/bench_startup.py.
+
+import os
+
+SERVER = os.environ.get("A5_SERVER", "main")
+NAMES = {"main": "a5browseruse", "mainGemini": "a5browseruse-gemini", "mainOllama": "a5browseruse-ollama"}
+SERVER_PROVIDERS = {"main": "openai", "mainGemini": "google", "mainOllama": "ollama"}
+PROVIDERS = set(os.environ.get("A5_PROVIDERS", SERVER_PROVIDERS[SERVER]).split(","))
+
+# OpenAI is always bundled: browser_use imports it
+PROVIDER_PACKAGES = {
+    "google": ["langchain_google_genai", "google.generativeai", "google.ai", "google.api_core", "googleapiclient", "grpc", "httplib2"],
+    "ollama": ["langchain_ollama", "ollama"],
+}
+NEVER_IMPORTED = [
+    "boto3", "botocore", "langchain_aws", "langchain_fireworks",
+    "numpy", "pandas", "matplotlib", "tkinter", "IPython", "pytest", "setuptools", "distutils",
+]
+excludes = NEVER_IMPORTED + [
+    package
+    for provider, packages in PROVIDER_PACKAGES.items()
+    if provider not in PROVIDERS
+    for package in packages
+]
+
+
+a = Analysis(
+    [f'{SERVER}.py'],
+    pathex=[],
+    binaries=[],
+    datas=[('requirements.txt', '.')],
+    # tiktoken finds its encodings through the tiktoken_ext namespace package,
+    # which is only importable from .pyc files when collected explicitly
+    hiddenimports=['pydantic.deprecated.decorator', 'tiktoken_ext', 'tiktoken_ext.openai_public'],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=excludes,
+    noarchive=True,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name=NAMES[SERVER],
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name=NAMES[SERVER],
+)
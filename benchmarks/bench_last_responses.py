@@ -0,0 +1,114 @@
+"""
+Benchmark for GET /lastResponses serialization and compression.
+
+Compares FastAPI's default response_model path (what the endpoint used to do)
+with the cached/orjson path now used by main.py, and reports bytes on the wire
+for identity, gzip and brotli responses.
+
+Usage:
+    python benchmarks/bench_last_responses.py --records 100 --result-size 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
+os.environ.setdefault("BROWSER_PRELAUNCH", "false")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import main
+from utils.agent_server import TaskRecord, TaskStatus
+
+
+def build_records(count: int, result_size: int) -> List[TaskRecord]:
+    """
+    Creates finished task records with results of roughly `result_size` characters.
+    """
+    start = datetime(2025, 1, 1)
+    chunk = "Step result: clicked element, extracted content from page. "
+    result = (chunk * (result_size // len(chunk) + 1))[:result_size]
+    records = []
+    for i in range(1, count + 1):
+        records.append(
+            TaskRecord(
+                id=i,
+                task=f"Search for item number {i} and summarize the top results",
+                status=TaskStatus.COMPLETED,
+                start_time=start + timedelta(seconds=i),
+                end_time=start + timedelta(seconds=i + 42),
+                duration=42.0,
+                result=result,
+            )
+        )
+    return records
+
+
+def baseline_app(records: List[TaskRecord]) -> FastAPI:
+    """
+    Reproduces the previous endpoint: return the models and let FastAPI serialize.
+    """
+    app = FastAPI()
+
+    @app.get("/lastResponses", response_model=List[TaskRecord])
+    async def get_last_responses():
+        return sorted(records, key=lambda x: x.id, reverse=True)
+
+    return app
+
+
+def measure(client: TestClient, iterations: int, headers: dict) -> tuple:
+    """
+    Returns (requests/sec, wire bytes of the last response).
+    """
+    wire_bytes = 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        response = client.get("/lastResponses", headers=headers)
+        response.raise_for_status()
+        wire_bytes = response.num_bytes_downloaded
+    elapsed = time.perf_counter() - started
+    return iterations / elapsed, wire_bytes
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=100)
+    parser.add_argument("--result-size", type=int, default=20000)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    records = build_records(args.records, args.result_size)
+    main.server.task_records.clear()
+    main.server.task_records.update((record.id, main.server.TaskEntry.from_model(record)) for record in records)
+
+    rows = []
+    identity = {"Accept-Encoding": "identity"}
+    with TestClient(baseline_app(records)) as client:
+        rps, wire = measure(client, args.iterations, identity)
+        rows.append(("before (pydantic + json)", "identity", rps, wire))
+
+    with TestClient(main.app) as client:
+        for label, headers in (
+            ("identity", identity),
+            ("gzip", {"Accept-Encoding": "gzip"}),
+            ("br", {"Accept-Encoding": "br"}),
+        ):
+            rps, wire = measure(client, args.iterations, headers)
+            rows.append(("after (cached orjson)", label, rps, wire))
+
+    print(f"{args.records} records, ~{args.result_size} chars of result each, {args.iterations} requests")
+    print(f"{'path':<26} {'encoding':<9} {'records/sec':>14} {'wire bytes':>12}")
+    for path, encoding, rps, wire in rows:
+        print(f"{path:<26} {encoding:<9} {rps * args.records:>14,.0f} {wire:>12,}")
+
+
+if __name__ == "__main__":
+    main_cli()
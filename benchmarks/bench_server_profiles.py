@@ -0,0 +1,112 @@
+"""
+Micro-benchmark of request throughput per launcher profile.
+
+Starts the server with each profile (see utils/launcher.py) and drives GET /
+and GET /lastResponses over `--connections` keep-alive connections for
+`--seconds` each, reporting requests/sec and latency percentiles. The load
+generator runs in this process, so absolute numbers are bounded by it; the
+comparison between profiles is what matters.
+
+Usage:
+    python benchmarks/bench_server_profiles.py --profiles dev prod --connections 32
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def wait_ready(url: str, timeout: float) -> None:
+    started = time.perf_counter()
+    async with httpx.AsyncClient() as client:
+        while time.perf_counter() - started < timeout:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise TimeoutError(f"{url} did not answer within {timeout}s")
+
+
+async def drive(url: str, connections: int, seconds: float) -> tuple:
+    """
+    Returns (requests/sec, p50 ms, p99 ms, errors).
+    """
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+    async with httpx.AsyncClient(limits=limits, timeout=10) as client:
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    if response.status_code != 200:
+                        errors += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(connections)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0.0
+    return len(latencies) / elapsed, statistics.median(latencies or [0.0]) * 1000, p99 * 1000, errors
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", default="main.py")
+    parser.add_argument("--profiles", nargs="+", default=["dev", "prod"])
+    parser.add_argument("--port", type=int, default=8890)
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    base = f"http://127.0.0.1:{args.port}"
+    env = dict(os.environ, ANONYMIZED_TELEMETRY="false")
+    env.setdefault("OPENAI_API_KEY", "benchmark")
+    rows = []
+    for profile in args.profiles:
+        server = subprocess.Popen(
+            [sys.executable, args.server, "--profile", profile, "--port", str(args.port)],
+            cwd=ROOT,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        try:
+            asyncio.run(wait_ready(base + "/", 120))
+            for path in ("/", "/lastResponses"):
+                rows.append((profile, path, *asyncio.run(drive(base + path, args.connections, args.seconds))))
+        finally:
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait()
+
+    print(f"{args.connections} connections, {args.seconds:.0f}s per endpoint")
+    print(f"{'profile':<8} {'path':<15} {'req/sec':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for profile, path, rps, p50, p99, errors in rows:
+        print(f"{profile:<8} {path:<15} {rps:>9,.0f} {p50:>8.2f} {p99:>8.2f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main_cli()
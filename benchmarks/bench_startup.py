@@ -0,0 +1,74 @@
+"""
+Benchmark for server startup: seconds from launch until GET / answers.
+
+Each command is started `--runs` times; the process group is killed once the
+server answers. Used to compare the onefile build (a5browseruse.spec) with
+the startup-tuned onedir build (a5browseruse_fast.spec), e.g.:
+
+    pyinstaller --distpath dist/onefile a5browseruse.spec
+    pyinstaller --distpath dist/fast a5browseruse_fast.spec
+    python benchmarks/bench_startup.py \\
+        "onefile=dist/onefile/a5browseruse" \\
+        "onedir=dist/fast/a5browseruse/a5browseruse" \\
+        "python=python main.py"
+
+The first run of a command also pays for a cold disk cache; it is reported
+separately from the median of the other runs.
+"""
+
+import argparse
+import os
+import shlex
+import signal
+import statistics
+import subprocess
+import time
+import urllib.error
+import urllib.request
+
+
+def time_to_ready(command: str, url: str, timeout: float) -> float:
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        shlex.split(command),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"{command!r} exited with code {process.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                time.sleep(0.05)
+        raise TimeoutError(f"{command!r} did not answer within {timeout}s")
+    finally:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("commands", nargs="+", help='"label=command" to start a server')
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--url", default="http://127.0.0.1:8888/")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    print(f"{'build':<12} {'first run (s)':>14} {'median (s)':>11} {'min (s)':>8}")
+    for entry in args.commands:
+        label, _, command = entry.partition("=")
+        runs = [time_to_ready(command, args.url, args.timeout) for _ in range(args.runs)]
+        rest = runs[1:] or runs
+        print(f"{label:<12} {runs[0]:>14.2f} {statistics.median(rest):>11.2f} {min(rest):>8.2f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,111 @@
+"""
+Benchmark for the in-memory task record representation.
+
+Compares the pydantic TaskRecord that used to be stored in the registry with
+the slotted TaskEntry now used by main.py: bytes per finished record
+(measured with tracemalloc, excluding the shared result and URL strings),
+the cost of the attribute updates execute_task makes, and the cost of
+converting an entry to a TaskRecord when a response is serialized.
+
+Usage:
+    python benchmarks/bench_task_records.py --records 10000
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
+
+from datetime import datetime
+
+import main
+from utils.agent_server import TaskRecord, TaskStatus
+
+RESULT = "Found the item and summarized the top results."
+URLS = ["https://www.example.com/", "https://www.example.com/search?q=item"]
+
+
+def finish_model(record: TaskRecord) -> None:
+    record.status = TaskStatus.COMPLETED
+    record.end_time = datetime.utcnow()
+    record.duration = (record.end_time - record.start_time).total_seconds()
+    record.result = RESULT
+    record.is_done = True
+    record.steps = 4
+    record.urls = URLS
+    record.llm_retries = 0
+
+
+def finish_entry(record: main.server.TaskEntry) -> None:
+    record.status = TaskStatus.COMPLETED
+    record.end_time = time.time()
+    record.duration = record.end_time - record.start_time
+    record.result = RESULT
+    record.is_done = True
+    record.steps = 4
+    record.urls = URLS
+    record.llm_retries = 0
+
+
+def new_model(i: int) -> TaskRecord:
+    return TaskRecord(id=i, task="", status=TaskStatus.QUEUED, start_time=datetime.utcnow())
+
+
+def new_entry(i: int) -> main.server.TaskEntry:
+    return main.server.TaskEntry(id=i, task="", status=TaskStatus.QUEUED, start_time=time.time())
+
+
+def bytes_per_record(create, finish, count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = []
+    for i in range(count):
+        record = create(i)
+        finish(record)
+        records.append(record)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # The list itself is not part of a record
+    return (after - before - sys.getsizeof(records)) / count
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+
+    model, entry = new_model(0), new_entry(0)
+    rows = [
+        (
+            "TaskRecord (pydantic)",
+            bytes_per_record(new_model, finish_model, args.records),
+            timeit.timeit(lambda: finish_model(model), number=args.iterations) / args.iterations,
+            timeit.timeit(lambda: new_model(1), number=args.iterations // 10) / (args.iterations // 10),
+        ),
+        (
+            "TaskEntry (slots)",
+            bytes_per_record(new_entry, finish_entry, args.records),
+            timeit.timeit(lambda: finish_entry(entry), number=args.iterations) / args.iterations,
+            timeit.timeit(lambda: new_entry(1), number=args.iterations // 10) / (args.iterations // 10),
+        ),
+    ]
+    to_model = timeit.timeit(entry.to_model, number=args.iterations // 10) / (args.iterations // 10)
+
+    print(f"{args.records} finished records, {args.iterations} updates")
+    print(f"{'representation':<22} {'bytes/record':>13} {'update (us)':>12} {'create (us)':>12}")
+    for name, size, update, create in rows:
+        print(f"{name:<22} {size:>13,.0f} {update * 1e6:>12.2f} {create * 1e6:>12.2f}")
+    print(f"TaskEntry.to_model() at the API edge: {to_model * 1e6:.2f} us per record")
+
+
+if __name__ == "__main__":
+    main_cli()
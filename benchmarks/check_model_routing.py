@@ -0,0 +1,73 @@
+"""
+Check of ModelRouter's routing decisions on a real browser-use conversation.
+
+Builds the messages with browser-use's own MessageManager, the way Agent.step
+does (state message, model output, action results and errors), and checks the
+tier ModelRouter.choose picks for each step. No model is called.
+
+Usage:
+    python benchmarks/check_model_routing.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
+
+from browser_use.agent.message_manager.service import MessageManager
+from browser_use.agent.prompts import SystemPrompt
+from browser_use.agent.views import ActionResult, AgentBrain, AgentOutput
+from browser_use.browser.views import BrowserState
+from browser_use.dom.views import DOMElementNode
+
+from utils.llm_routing import FAST, STRONG, ModelRouter
+
+
+def page_state() -> BrowserState:
+    root = DOMElementNode(
+        is_visible=True, parent=None, tag_name="body", xpath="/body", attributes={}, children=[]
+    )
+    return BrowserState(element_tree=root, selector_map={}, url="https://example.com", title="Example", tabs=[])
+
+
+def model_output(goal: str) -> AgentOutput:
+    brain = AgentBrain(evaluation_previous_goal="Success", memory="", next_goal=goal)
+    return AgentOutput(current_state=brain, action=[])
+
+
+def main_cli():
+    manager = MessageManager(
+        llm=None,
+        task="Find the price of the first product",
+        action_descriptions="",
+        system_prompt_class=SystemPrompt,
+    )
+    router = ModelRouter(fast=None, strong=None, planning_steps=1, sticky_steps=0)
+
+    # (results of the previous step, expected tier and reason)
+    steps = [
+        (None, (STRONG, "planning")),
+        ([ActionResult(extracted_content="Opened the page", include_in_memory=True)], (FAST, "routine")),
+        ([ActionResult(error="Element with index 7 does not exist", include_in_memory=True)], (STRONG, "failure")),
+        ([ActionResult(error="Timeout while clicking", include_in_memory=False)], (STRONG, "failure")),
+        ([ActionResult(extracted_content="Clicked", include_in_memory=False)], (FAST, "routine")),
+    ]
+    failures = 0
+    for number, (results, expected) in enumerate(steps, start=1):
+        # Same sequence as Agent.step in browser-use 0.1.21
+        manager.add_state_message(page_state(), results)
+        routed = router.choose(manager.get_messages(), is_agent_step=True)
+        manager._remove_last_state_message()
+        manager.add_model_output(model_output(f"Step {number}"))
+
+        status = "ok" if routed == expected else "FAIL"
+        failures += routed != expected
+        print(f"step {number}: {routed[0]:<6} {routed[1]:<9} expected {expected[0]}/{expected[1]}  {status}")
+
+    if failures:
+        sys.exit(f"{failures} routing decision(s) differ from the expected ones")
+
+
+if __name__ == "__main__":
+    main_cli()
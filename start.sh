@@ -20,4 +20,4 @@ pip install -r requirements.txt
 
 # Start the FastAPI application
 echo "🌐 Starting FastAPI server..."
-uvicorn main:app --host 0.0.0.0 --port ${PORT:-8000} --workers 1
\ No newline at end of file
+python main.py --profile prod --host 0.0.0.0 --port ${PORT:-8000}
\ No newline at end of file
@@ -0,0 +1,4 @@
+import os
+
+# browser_use reports usage on import unless this is set
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "false")
@@ -0,0 +1,54 @@
+from utils.agent_history import history_to_json, summarize_history
+
+
+class FakeHistory:
+    def __init__(self, steps, urls, errors, final=None, done=True):
+        self.history = [object()] * steps
+        self._urls, self._errors, self._final, self._done = urls, errors, final, done
+
+    def final_result(self):
+        if self._final is None:
+            raise IndexError("list index out of range")
+        return self._final
+
+    def is_done(self):
+        return self._done
+
+    def urls(self):
+        return self._urls
+
+    def errors(self):
+        return self._errors
+
+    def model_dump(self):
+        return {"history": len(self.history)}
+
+
+def test_summary_of_an_agent_history():
+    history = FakeHistory(
+        steps=3,
+        urls=["about:blank", "https://a.test/", None, "https://b.test/", "https://a.test/"],
+        errors=["timeout"],
+        final="42",
+    )
+    summary = summarize_history(history)
+
+    assert summary.final_result == "42"
+    assert summary.is_done
+    assert summary.steps == 3
+    assert summary.urls == ["https://a.test/", "https://b.test/"]
+    assert summary.errors == ["timeout"]
+    assert history_to_json(history) == b'{"history":3}'
+
+
+def test_history_without_a_final_result():
+    summary = summarize_history(FakeHistory(steps=1, urls=[], errors=[], done=False))
+    assert summary.final_result is None
+    assert not summary.is_done
+
+
+def test_plain_results():
+    assert summarize_history("answer").final_result == "answer"
+    assert summarize_history("answer").is_done
+    assert not summarize_history(None).is_done
+    assert history_to_json("answer") is None
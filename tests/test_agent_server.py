@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from utils.agent_server import AgentServer
+from tests.test_browser_governor import FakeChromeGovernor
+
+
+class FakeChatModel:
+    def __init__(self, model, **kwargs):
+        self.model = model
+        self.cache = kwargs["cache"]
+
+
+class CountingServer(AgentServer):
+    provider = "openai"
+    llm_model = "test-model"
+    default_fast_model = "test-fast-model"
+    default_rate_limits = ""
+
+    def __init__(self):
+        super().__init__()
+        self.created = []
+        self.browser_governor = FakeChromeGovernor()
+
+    def create_chat_model(self, model, **kwargs):
+        self.created.append(model)
+        return FakeChatModel(model, **kwargs)
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("LOG_LEVEL", "WARNING")
+    monkeypatch.setenv("MODEL_ROUTING", "adaptive")
+    server = CountingServer()
+    yield server
+    server.log_pipeline.stop()
+
+
+def test_prewarm_launches_chrome_and_keeps_the_clients(server):
+    asyncio.run(server.prewarm())
+    assert server.browser_governor.launches == 1
+    assert server.created == ["test-model", "test-fast-model"]
+
+    # Tasks use the clients created at startup
+    failover = server.build_failover_llm(False, task_id=1)
+    assert failover.chain[0][1].llm is server.chat_models[("openai", "test-model", False)]
+    server.build_llm("test-fast-model", False)
+    assert server.created == ["test-model", "test-fast-model"]
+
+
+def test_clients_with_and_without_llm_cache_are_kept_apart(server):
+    cache = object()
+    assert server.build_llm("test-model", cache).llm.cache is cache
+    assert server.build_llm("test-model", False).llm.cache is False
+    assert server.created == ["test-model", "test-model"]
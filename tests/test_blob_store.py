@@ -0,0 +1,65 @@
+import gzip
+import itertools
+import os
+
+import pytest
+
+from utils import blob_store
+from utils.blob_store import BlobStore
+
+
+@pytest.fixture(autouse=True)
+def ticking_clock(monkeypatch):
+    # Every access gets a distinct time, so the LRU order does not depend on clock resolution
+    clock = itertools.count(1000.0)
+    monkeypatch.setattr(blob_store.time, "time", lambda: next(clock))
+
+
+def blob(seed):
+    # Random bytes do not compress, so each blob takes about 4 KB on disk
+    return seed.encode() + os.urandom(4096)
+
+
+def test_round_trip_and_streaming(tmp_path):
+    store = BlobStore(str(tmp_path))
+    data = b"result " * 10000
+    handle = store.put(data)
+
+    assert store.put(data) == handle
+    assert store.get(handle) == data
+    assert b"".join(store.iter_decompressed(handle, chunk_size=1000)) == data
+    assert gzip.decompress(b"".join(store.iter_compressed(handle))) == data
+    assert store.stats()["blobs"] == 1
+
+
+def test_least_recently_used_blobs_are_evicted(tmp_path):
+    store = BlobStore(str(tmp_path), max_bytes=10000)
+    first, second = store.put(blob("a")), store.put(blob("b"))
+    store.get(first)  # Now the second is the least recently used
+    third = store.put(blob("c"))
+
+    assert store.exists(first) and store.exists(third)
+    assert not store.exists(second)
+    assert store.stats()["evictions"] == 1
+    assert store.stats()["bytes"] <= 10000
+
+
+def test_blob_larger_than_the_cap_is_kept(tmp_path):
+    store = BlobStore(str(tmp_path), max_bytes=1000)
+    handle = store.put(blob("a"))
+    assert store.exists(handle)
+
+
+def test_index_is_rebuilt_from_disk(tmp_path):
+    handles = [BlobStore(str(tmp_path)).put(blob(seed)) for seed in "ab"]
+    store = BlobStore(str(tmp_path), max_bytes=10000)
+    assert store.stats()["blobs"] == 2
+
+    assert store.delete([handles[0], "0" * 64]) == 1
+    assert not store.exists(handles[0])
+    assert store.stats()["blobs"] == 1
+
+
+def test_invalid_handles_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        BlobStore(str(tmp_path)).get("../../etc/passwd")
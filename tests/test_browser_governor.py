@@ -0,0 +1,104 @@
+import asyncio
+
+from utils.browser_governor import BrowserGovernor
+
+
+class FakeChromeGovernor(BrowserGovernor):
+    """Counts launches and recycles instead of starting Chrome."""
+
+    def __init__(self, **kwargs):
+        super().__init__(chrome_path=lambda: "chrome", **kwargs)
+        self.launches = 0
+        self.chrome_running = False
+
+    def _running(self):
+        return self.chrome_running
+
+    def launch(self):
+        self.launches += 1
+        self.chrome_running = True
+        return 1
+
+    def recycle(self):
+        self.chrome_running = False
+        return 1
+
+    def sample(self):
+        pass
+
+
+async def acquired(governor, **kwargs):
+    """Whether `acquire` returned without waiting for a recycle."""
+    try:
+        await asyncio.wait_for(governor.acquire(**kwargs), timeout=0.1)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+def test_recycle_after_max_tasks():
+    async def run():
+        governor = FakeChromeGovernor(max_tasks=2)
+        for _ in range(2):
+            await governor.acquire()
+            await governor.release()
+        assert governor.recycles == {"tasks": 1}
+        assert governor.tasks_served == 0
+        await governor.acquire()
+        assert governor.launches == 2
+
+    asyncio.run(run())
+
+
+def test_pending_recycle_waits_for_running_tasks():
+    async def run():
+        governor = FakeChromeGovernor(max_tasks=2)
+        await governor.acquire()
+        await governor.acquire()
+        await governor.release()
+        governor.tasks_served = 2
+        async with governor._condition:
+            await governor._check()
+        assert governor.recycle_reason == "tasks"
+        assert not await acquired(governor)
+
+        await governor.release()
+        assert governor.recycle_reason is None
+        assert await acquired(governor)
+
+    asyncio.run(run())
+
+
+def test_open_session_does_not_stall_tasks_when_recycle_is_due():
+    async def run():
+        governor = FakeChromeGovernor(max_tasks=1)
+        await governor.acquire(session=True)
+        await governor.acquire()
+        await governor.release()
+        # Due, but the session still uses Chrome
+        assert governor.recycle_reason == "tasks"
+        assert governor.recycles == {}
+
+        assert await acquired(governor)
+        assert await acquired(governor, session=True)
+        await governor.release()
+        await governor.release(session=True)
+        assert governor.recycles == {}
+
+        await governor.release(session=True)
+        assert governor.recycles == {"tasks": 1}
+        assert governor.snapshot()["active_sessions"] == 0
+
+    asyncio.run(run())
+
+
+def test_prelaunch_starts_chrome_once():
+    async def run():
+        governor = FakeChromeGovernor()
+        await governor.prelaunch()
+        assert governor.launches == 1
+        await governor.acquire()
+        assert governor.launches == 1
+        assert governor.snapshot()["active_tasks"] == 1
+
+    asyncio.run(run())
@@ -0,0 +1,73 @@
+import asyncio
+
+from utils.concurrency import AdaptiveConcurrency
+
+
+class FakeHostConcurrency(AdaptiveConcurrency):
+    """Reads host load from `host` instead of psutil."""
+
+    def __init__(self, **options):
+        super().__init__(**{"min_limit": 1, "max_limit": 4, "initial_limit": 2, **options})
+        self.host = {"memory_percent": 50.0, "cpu_percent": 20.0}
+
+    def _read_signals(self):
+        return {**super()._read_signals(), **self.host}
+
+
+def test_limit_grows_by_one_while_tasks_wait_for_a_full_pool():
+    limiter = FakeHostConcurrency()
+
+    async def scenario():
+        await limiter.acquire()
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.waiting == 1
+        await limiter.adjust()
+        await asyncio.wait_for(waiter, 1)
+
+    asyncio.run(scenario())
+    assert (limiter.limit, limiter.in_flight) == (3.0, 3)
+    assert limiter.decisions[-1]["reason"] == "increase:demand"
+
+
+def test_limit_holds_without_demand():
+    limiter = FakeHostConcurrency()
+    asyncio.run(limiter.adjust())
+    assert limiter.limit == 2.0
+    assert not limiter.decisions
+
+
+def test_memory_pressure_backs_off_down_to_the_floor():
+    limiter = FakeHostConcurrency(backoff=0.5)
+    limiter.host["memory_percent"] = 95.0
+    asyncio.run(limiter.adjust())
+    assert limiter.limit == 1.0
+    assert limiter.decisions[-1]["reason"] == "decrease:memory"
+
+    asyncio.run(limiter.adjust())
+    assert limiter.limit == 1.0
+    assert len(limiter.decisions) == 1
+
+
+def test_error_rate_only_counts_with_fresh_calls():
+    limiter = FakeHostConcurrency(backoff=0.5)
+    for _ in range(5):
+        limiter.record_llm_call(None, ok=False)
+    asyncio.run(limiter.adjust())
+    assert limiter.decisions[-1]["reason"] == "decrease:errors"
+
+    asyncio.run(limiter.adjust())
+    assert len(limiter.decisions) == 1
+
+
+def test_latency_gradient_decreases_the_limit():
+    limiter = FakeHostConcurrency(initial_limit=4)
+    for _ in range(20):
+        limiter.record_llm_call(1.0, ok=True)
+    for _ in range(3):
+        limiter.record_llm_call(5.0, ok=True)
+    asyncio.run(limiter.adjust())
+    assert limiter.decisions[-1]["reason"] == "decrease:latency"
+    assert limiter.limit == 4 * 0.7
+    assert limiter.slots == 2
@@ -0,0 +1,67 @@
+from browser_use.dom.views import DOMElementNode, DOMTextNode
+
+from utils.dom_pruning import DomPruner
+
+
+def element(tag, children=(), highlight_index=None, **attributes):
+    node = DOMElementNode(
+        is_visible=True,
+        parent=None,
+        tag_name=tag,
+        xpath=tag,
+        attributes=attributes,
+        children=[],
+        highlight_index=highlight_index,
+    )
+    for child in children:
+        child.parent = node
+        node.children.append(child)
+    return node
+
+
+def text(value, visible=True):
+    return DOMTextNode(is_visible=visible, parent=None, text=value)
+
+
+def page(links=10):
+    return element("body", [
+        element("a", [text(f"Link number {i}")], highlight_index=i, href=f"/page/{i}") for i in range(links)
+    ])
+
+
+def indexes(root):
+    return [child.highlight_index for child in root.children]
+
+
+def test_token_budget_keeps_elements_in_document_order():
+    root = page()
+    full = DomPruner().prune(root)[0]
+    pruned, stats = DomPruner(token_budget=40).prune(root)
+
+    assert indexes(full) == list(range(10))
+    assert 0 < len(pruned.children) < 10
+    assert indexes(pruned) == list(range(len(pruned.children)))
+    assert stats.tokens_after <= 40 < stats.tokens_before
+    assert stats.nodes_removed == 10 - len(pruned.children)
+    # The original tree is left whole
+    assert indexes(root) == list(range(10))
+
+
+def test_element_cap():
+    pruned, _ = DomPruner(max_elements=3).prune(page())
+    assert indexes(pruned) == [0, 1, 2]
+
+
+def test_hidden_text_and_repeated_items_are_pruned():
+    root = element("body", [
+        text("Visible"),
+        text("Off-screen", visible=False),
+        element("ul", [element("li", [text("Same item")]) for _ in range(3)]),
+        element("div", [text("Decoration")], **{"aria-hidden": "true"}),
+        element("div", [element("button", [text("Menu")], highlight_index=0)], **{"aria-hidden": "true"}),
+    ])
+    rendered = DomPruner().render(DomPruner().prune(root)[0])
+
+    assert "Visible" in rendered and "Menu" in rendered
+    assert "Off-screen" not in rendered and "Decoration" not in rendered
+    assert rendered.count("Same item") == 1
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from utils import failover
+from utils.failover import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    BreakerRegistry,
+    CircuitBreaker,
+    FailoverModel,
+    is_provider_failure,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(failover.time, "monotonic", clock)
+    return clock
+
+
+class ProviderError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+class FakeModel:
+    def __init__(self, error=None, answer="answer"):
+        self.error = error
+        self.answer = answer
+        self.calls = 0
+
+    def with_structured_output(self, schema, include_raw=False, **kwargs):
+        return self
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.answer
+
+
+def test_provider_failures():
+    assert is_provider_failure(TimeoutError())
+    assert is_provider_failure(APIConnectionError())
+    assert is_provider_failure(ProviderError(429))
+    assert is_provider_failure(ProviderError(503))
+    assert not is_provider_failure(ProviderError(400))
+    assert not is_provider_failure(ValueError("unparsable output"))
+
+
+def test_breaker_opens_then_half_opens_and_closes(clock):
+    breaker = CircuitBreaker("openai:gpt-4o", min_calls=4, open_seconds=30)
+    for ok in (True, False, True):
+        breaker.record(ok, 1.0)
+    assert breaker.state == CLOSED
+    breaker.record(True, 90.0)  # Slow calls count as failures
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # Only one trial at a time
+    breaker.record(True, 1.0)
+    assert breaker.state == CLOSED
+    assert breaker.snapshot() == {"state": CLOSED, "recent_failure_rate": 0.0, "opened": 1, "rejected": 2}
+
+
+def test_failed_or_cancelled_trial(clock):
+    breaker = CircuitBreaker("m", min_calls=1)
+    breaker.record(False, 1.0)
+    clock.now += breaker.open_seconds
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+    breaker.record(False, 1.0)
+    assert breaker.state == OPEN
+    assert breaker.opened == 2
+
+
+def test_failover_to_the_next_provider(clock):
+    primary, fallback = FakeModel(ProviderError(503)), FakeModel(answer="fallback")
+    breakers = BreakerRegistry(min_calls=1)
+    model = FailoverModel([("openai:gpt-4o", primary), ("gemini:flash", fallback)], breakers)
+
+    assert asyncio.run(model.with_structured_output(dict).ainvoke([])) == "fallback"
+    assert breakers.get("openai:gpt-4o").state == OPEN
+    # The open breaker skips the primary
+    assert asyncio.run(model.with_structured_output(dict).ainvoke([])) == "fallback"
+    assert primary.calls == 1
+    assert dict(model.calls) == {"gemini:flash": 2}
+    assert (model.failovers, model.last_provider) == (2, "gemini:flash")
+
+
+def test_request_errors_are_not_failed_over(clock):
+    primary, fallback = FakeModel(ProviderError(400)), FakeModel()
+    breakers = BreakerRegistry(min_calls=1)
+    model = FailoverModel([("openai:gpt-4o", primary), ("gemini:flash", fallback)], breakers)
+
+    with pytest.raises(ProviderError):
+        asyncio.run(model.with_structured_output(dict).ainvoke([]))
+    assert fallback.calls == 0
+    assert breakers.get("openai:gpt-4o").state == CLOSED
+
+
+def test_last_provider_is_tried_with_an_open_breaker(clock):
+    breakers = BreakerRegistry(min_calls=1)
+    breakers.get("ollama:qwen").record(False, 1.0)
+    model = FailoverModel([("ollama:qwen", FakeModel())], breakers)
+    assert asyncio.run(model.with_structured_output(dict).ainvoke([])) == "answer"
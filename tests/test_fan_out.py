@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.agent_server import AgentServer, TaskRequest, TaskStatus
+from utils.fan_out import MergedResult, TaskPlan, list_results, merge_results, plan_subtasks
+
+
+class FakeLLM:
+    """Answers structured-output calls with the given plan and a fixed merge, or fails the merge."""
+
+    def __init__(self, subtasks, merge_error=None):
+        self.subtasks = subtasks
+        self.merge_error = merge_error
+
+    def with_structured_output(self, schema):
+        llm = self
+
+        class Runnable:
+            async def ainvoke(self, messages):
+                if schema is TaskPlan:
+                    return TaskPlan(subtasks=llm.subtasks, merge_instructions="combine")
+                if llm.merge_error is not None:
+                    raise llm.merge_error
+                return MergedResult(answer="merged")
+
+        return Runnable()
+
+
+def test_plan_drops_blank_and_repeated_subtasks_and_caps_them():
+    subtasks = [" Look up A ", "", "Look up A", "Look up B", "Look up C"]
+    plan = asyncio.run(plan_subtasks(FakeLLM(subtasks), "Compare A, B and C", max_subtasks=2))
+    assert plan.subtasks == ["Look up A", "Look up B"]
+    assert plan.merge_instructions == "combine"
+
+
+def test_task_that_does_not_split_runs_as_one():
+    assert asyncio.run(plan_subtasks(FakeLLM([]), "Log in and buy A", max_subtasks=8)) is None
+    assert asyncio.run(plan_subtasks(FakeLLM(["Look up A", "Look up A "]), "Look up A", max_subtasks=8)) is None
+
+
+def test_failed_merge_lists_the_results():
+    results = [("Look up A", "A costs 10", None), ("Look up B", None, "Timed out"), ("Look up C", None, None)]
+    plan = TaskPlan(subtasks=[subtask for subtask, _, _ in results])
+
+    assert asyncio.run(merge_results(FakeLLM([]), "Compare", plan, results)) == "merged"
+    listed = asyncio.run(merge_results(FakeLLM([], merge_error=ValueError("bad output")), "Compare", plan, results))
+    assert listed == list_results(results)
+    assert listed == "1. Look up A\nA costs 10\n\n2. Look up B\nFailed: Timed out\n\n3. Look up C\nNo result"
+
+
+class FanOutServer(AgentServer):
+    provider = "openai"
+    llm_model = "test-model"
+    default_fast_model = "test-fast-model"
+    default_rate_limits = ""
+
+    def __init__(self, subtasks, outcomes):
+        super().__init__()
+        self.subtasks = subtasks
+        self.outcomes = outcomes  # Fields of each child's record, in plan order
+
+    def build_planner_llm(self, cache, task_id):
+        return FakeLLM(self.subtasks)
+
+    async def execute_task(self, task_id, request, session=None, parent_id=None):
+        fields = self.outcomes[self.subtasks.index(request.task)]
+        async with self.task_lock:
+            self.task_records[task_id] = self.TaskEntry(
+                id=task_id, task=request.task, start_time=time.time(), parent_id=parent_id, **fields
+            )
+
+
+@pytest.fixture
+def make_server(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("LOG_LEVEL", "WARNING")
+    monkeypatch.setenv("HTTP_CACHE_MAX_MB", "0")
+    servers = []
+
+    def make(*args):
+        servers.append(FanOutServer(*args))
+        return servers[-1]
+
+    yield make
+    for server in servers:
+        server.log_pipeline.stop()
+
+
+def run_fan_out(server, task):
+    async def run():
+        task_id = await server.next_task_id()
+        await server.execute_fan_out(task_id, TaskRequest(task=task, fan_out=True))
+        return server.task_records[task_id]
+
+    return asyncio.run(run())
+
+
+def test_merge_keeps_going_when_a_child_failed(make_server):
+    server = make_server(
+        ["Look up product A", "Look up product B"],
+        [
+            dict(status=TaskStatus.COMPLETED, result="A costs 10", is_done=True, steps=3,
+                 urls=["https://shop.example/a"], step_errors=["Element 4 not found"]),
+            # A child that failed before its agent ran leaves its list fields unset
+            dict(status=TaskStatus.FAILED, error="Browser crashed"),
+        ],
+    )
+    record = run_fan_out(server, "Compare A and B")
+    assert record.status == TaskStatus.COMPLETED
+    assert record.child_ids == [2, 3]
+    assert record.result == "merged"
+    assert record.is_done is False
+    assert record.steps == 3
+    assert record.urls == ["https://shop.example/a"]
+    assert record.step_errors == ["Subtask 2: Element 4 not found", "Subtask 3: Browser crashed"]
+    assert record.to_model().error is None
+
+
+def test_all_children_failed(make_server):
+    server = make_server(
+        ["Look up product A", "Look up product B"],
+        [dict(status=TaskStatus.FAILED, error="Timed out"), dict(status=TaskStatus.QUEUED)],
+    )
+    record = run_fan_out(server, "Compare A and B")
+    assert record.status == TaskStatus.FAILED
+    assert record.error == "All subtasks failed"
+    assert record.urls == []
+    assert record.step_errors == ["Subtask 2: Timed out"]
@@ -0,0 +1,73 @@
+import asyncio
+
+from utils.failover import BreakerRegistry, FailoverModel
+from utils.hedging import HedgedModel, HedgePolicy
+
+
+class FakeModel:
+    """Answers structured-output calls with `answer` after `delay` seconds."""
+
+    def __init__(self, answer, delay=0.0):
+        self.answer = answer
+        self.delay = delay
+        self.calls = 0
+
+    def with_structured_output(self, schema, include_raw=False, **kwargs):
+        model = self
+
+        class Runnable:
+            async def ainvoke(self, messages, config=None, **kwargs):
+                model.calls += 1
+                await asyncio.sleep(model.delay)
+                return model.answer
+
+        return Runnable()
+
+
+def test_deadline_is_the_latency_percentile_once_there_are_enough_samples():
+    policy = HedgePolicy(percentile=90, min_samples=10)
+    for seconds in range(1, 10):
+        policy.record("openai:gpt-4o", seconds)
+    assert policy.deadline("openai:gpt-4o") is None
+    policy.record("openai:gpt-4o", 10)
+    assert policy.deadline("openai:gpt-4o") == 9
+    assert policy.deadline("google:gemini-2.0-flash-exp") is None
+
+
+def test_hedges_stay_under_the_ratio():
+    policy = HedgePolicy(max_ratio=0.1)
+    policy.calls = 9
+    assert not policy.try_fire()
+    policy.calls = 10
+    assert policy.try_fire()
+    assert not policy.try_fire()
+    assert policy.fired == 1
+
+
+def hedged_failover(primary, hedge, hedge_name):
+    policy = HedgePolicy(max_ratio=1.0, min_samples=1)
+    policy.record("openai:gpt-4o", 0.01)
+    hedged = HedgedModel(primary, "openai:gpt-4o", policy, hedge_llm=hedge, hedge_name=hedge_name)
+    return FailoverModel([("openai:gpt-4o", hedged)], BreakerRegistry()), policy
+
+
+def test_call_won_by_the_hedge_is_counted_under_the_hedge_provider():
+    failover, policy = hedged_failover(
+        FakeModel("slow", delay=1.0), FakeModel("fast"), "google:gemini-2.0-flash-exp"
+    )
+    answer = asyncio.run(failover.with_structured_output(dict).ainvoke([]))
+
+    assert answer == "fast"
+    assert policy.won == 1
+    assert failover.last_provider == "google:gemini-2.0-flash-exp"
+    assert dict(failover.calls) == {"google:gemini-2.0-flash-exp": 1}
+
+
+def test_call_answered_by_the_primary_is_counted_under_it():
+    failover, policy = hedged_failover(FakeModel("primary"), FakeModel("hedge"), "google:gemini-2.0-flash-exp")
+    answer = asyncio.run(failover.with_structured_output(dict).ainvoke([]))
+
+    assert answer == "primary"
+    assert policy.fired == 0
+    assert failover.last_provider == "openai:gpt-4o"
+    assert dict(failover.calls) == {"openai:gpt-4o": 1}
@@ -0,0 +1,70 @@
+import itertools
+import json
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+
+from utils import llm_cache
+from utils.llm_cache import DiskLLMCache, normalize_prompt
+
+
+@pytest.fixture(autouse=True)
+def ticking_clock(monkeypatch):
+    clock = itertools.count(1000.0)
+    monkeypatch.setattr(llm_cache.time, "time", lambda: next(clock))
+
+
+def generations(text):
+    return [ChatGeneration(message=AIMessage(content=text))]
+
+
+def prompt(text, date="2025-01-31 14:05", image="data:image/png;base64,AAAA"):
+    return json.dumps([
+        {"role": "system", "content": f"Current date and time: {date}"},
+        {"role": "user", "content": [{"type": "text", "text": text}, {"type": "image_url", "image_url": image}]},
+    ])
+
+
+def test_normalize_drops_timestamps_and_images():
+    assert normalize_prompt(prompt("page", image="a")) == normalize_prompt(
+        prompt("page", date="2026-10-19 09:00", image="b")
+    )
+    assert normalize_prompt(prompt("page")) != normalize_prompt(prompt("other page"))
+    assert normalize_prompt("not json") == "not json"
+
+
+def test_hit_after_rerun(tmp_path):
+    cache = DiskLLMCache(str(tmp_path))
+    cache.update(prompt("page"), "gpt-4o", generations("click"))
+
+    hit = cache.lookup(prompt("page", date="2026-10-19 09:00"), "gpt-4o")
+    assert hit[0].message.content == "click"
+    assert cache.lookup(prompt("page"), "gpt-4o-mini") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DiskLLMCache(str(tmp_path))
+    cache.update(prompt("first"), "m", generations("1"))
+    entry_size = cache.stats()["bytes"]
+    cache.max_bytes = entry_size * 2 + entry_size // 2
+    cache.update(prompt("second"), "m", generations("2"))
+    cache.lookup(prompt("first"), "m")  # Now the second is the least recently used
+    cache.update(prompt("third"), "m", generations("3"))
+
+    assert cache.lookup(prompt("first"), "m") is not None
+    assert cache.lookup(prompt("second"), "m") is None
+    assert cache.lookup(prompt("third"), "m") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_unreadable_entry_is_discarded(tmp_path):
+    cache = DiskLLMCache(str(tmp_path))
+    cache.update(prompt("page"), "m", generations("click"))
+    path = cache._path(prompt("page"), "m")
+    with open(path, "w") as f:
+        f.write("{")
+
+    assert cache.lookup(prompt("page"), "m") is None
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from utils import parallel_extract
+from utils.parallel_extract import ParallelExtractAction, ParallelExtractor, split_budget
+
+
+class FakePage:
+    def __init__(self, pages):
+        self.pages = pages
+        self.url = "about:blank"
+
+    async def goto(self, url, **kwargs):
+        if url not in self.pages:
+            raise RuntimeError("net::ERR_NAME_NOT_RESOLVED")
+        self.url = url
+
+    async def content(self):
+        return self.pages[self.url]
+
+    async def close(self):
+        pass
+
+
+class FakeBrowser:
+    """A browser context whose pages serve `pages`, a dict of URL to text."""
+
+    def __init__(self, pages):
+        pages_ = pages
+
+        class Context:
+            async def new_page(self):
+                return FakePage(pages_)
+
+        class Session:
+            context = Context()
+            current_page = "agent tab"
+
+        self.session = Session()
+
+    async def get_session(self):
+        return self.session
+
+
+@pytest.fixture(autouse=True)
+def plain_text_pages(monkeypatch):
+    monkeypatch.setattr(parallel_extract.MainContentExtractor, "extract", lambda html, output_format: html)
+
+
+def extract(extractor, urls, pages):
+    return asyncio.run(extractor.extract(ParallelExtractAction(urls=urls), FakeBrowser(pages)))
+
+
+def test_split_budget_shares_what_short_texts_leave():
+    assert split_budget([100, 5000, 20000], 9000) == [100, 4450, 4450]
+    assert split_budget([10, 20], 100) == [10, 20]
+    assert split_budget([], 100) == []
+    assert sum(split_budget([7, 7, 7], 10)) <= 10
+
+
+def test_content_shares_the_character_budget():
+    pages = {"https://a.example": "a" * 50, "https://b.example": "b" * 500, "https://c.example": "c" * 500}
+    extractor = ParallelExtractor(max_chars=450)
+    result = extract(extractor, list(pages), pages)
+
+    assert result.include_in_memory
+    content = result.extracted_content
+    assert "a" * 50 + "\n" in content
+    assert "b" * 200 + "\n[truncated]" in content and "b" * 201 not in content
+    assert "c" * 200 + "\n[truncated]" in content
+    assert extractor.snapshot()["truncated"] == 2
+
+
+def test_urls_beyond_the_limit_are_left_to_another_call():
+    pages = {f"https://{name}.example": name for name in "abcd"}
+    extractor = ParallelExtractor(max_urls=2)
+    result = extract(extractor, list(pages) + ["https://a.example"], pages)
+
+    content = result.extracted_content
+    assert "## https://a.example\na" in content and "## https://b.example\nb" in content
+    assert "## https://c.example\n" not in content
+    assert content.endswith("call parallel_extract again for: https://c.example, https://d.example")
+    assert extractor.snapshot()["pages"] == 2
+    assert extractor.snapshot()["skipped"] == 2
+
+
+def test_failed_pages_are_reported():
+    extractor = ParallelExtractor()
+    result = extract(extractor, ["https://a.example", "https://missing.example"], {"https://a.example": "a"})
+
+    assert "## https://missing.example\nFailed to load: net::ERR_NAME_NOT_RESOLVED" in result.extracted_content
+    assert result.extracted_content.startswith("📄  Extracted 1 of 2 pages")
+    assert extractor.snapshot()["failed"] == 1
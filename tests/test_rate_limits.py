@@ -0,0 +1,138 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from utils import rate_limits
+from utils.rate_limits import (
+    LimiterStats,
+    ProviderLimiter,
+    RetryingModel,
+    TokenBucket,
+    parse_rate_limits,
+    track_task,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limits.time, "monotonic", clock)
+    return clock
+
+
+class ProviderError(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+        self.response = SimpleNamespace(headers={"retry-after": retry_after} if retry_after else {})
+
+
+class FlakyModel:
+    """Fails with the given errors in turn, then answers."""
+
+    def __init__(self, *errors):
+        self.errors = iter(errors)
+        self.calls = 0
+
+    def with_structured_output(self, schema, include_raw=False, **kwargs):
+        return self
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        self.calls += 1
+        error = next(self.errors, None)
+        if error is not None:
+            raise error
+        return "answer"
+
+
+def test_token_bucket_refills_over_time(clock):
+    bucket = TokenBucket(60)
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(3) == pytest.approx(3.0)
+    clock.now += 5
+    assert bucket.reserve(1) == pytest.approx(0.0)
+    clock.now += 600
+    bucket.reserve(0)
+    assert bucket.level == 60
+    assert TokenBucket(0).reserve(10**6) == 0.0
+
+
+def test_limiter_waits_for_the_tighter_bucket_and_charges_the_task(clock):
+    limiter = ProviderLimiter("openai:gpt-4o", requests_per_minute=600, tokens_per_minute=6000, tokens_estimate=4000)
+
+    async def run():
+        # asyncio.run gives the task its own context, so the stats do not leak into other tests
+        stats = track_task()
+        return [limiter._reserve(), limiter._reserve()], stats
+
+    delays, stats = asyncio.run(run())
+    # 2000 tokens are left after the first call and the second reserves another 4000
+    assert delays == [0.0, pytest.approx(20.0)]
+    assert stats.wait_seconds == pytest.approx(20.0)
+    assert limiter.snapshot()["throttled"] == 1
+
+
+def test_usage_corrects_the_reservation_and_estimate(clock):
+    limiter = ProviderLimiter("m", tokens_per_minute=6000, tokens_estimate=4000)
+    limiter._reserve()
+    limiter.record_usage(1000)
+    assert limiter.tokens.level == 5000
+    assert limiter.tokens_estimate == 3400
+    assert limiter.tokens_used == 1000
+
+
+def test_parse_rate_limits():
+    assert parse_rate_limits(" gpt-4o=500/30000, gpt-4o-mini=500 ,,") == {
+        "gpt-4o": (500.0, 30000.0),
+        "gpt-4o-mini": (500.0, 0.0),
+    }
+
+
+def test_server_errors_are_retried_with_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limits.random, "uniform", lambda low, high: high)
+    llm = FlakyModel(ProviderError(503), ProviderError(502))
+    model = RetryingModel(llm, ProviderLimiter("m"), base_delay=0.01)
+
+    async def run():
+        stats = track_task()
+        return await model.with_structured_output(dict).ainvoke([]), stats
+
+    answer, stats = asyncio.run(run())
+    assert answer == "answer"
+    assert llm.calls == 3
+    assert stats == LimiterStats(backoff_seconds=pytest.approx(0.03), retries=2)
+    assert model.limiter.errors == {"503": 1, "502": 1}
+
+
+def test_rate_limit_pauses_the_shared_limiter(clock):
+    limiter = ProviderLimiter("m")
+    llm = FlakyModel(ProviderError(429, retry_after="7"))
+    model = RetryingModel(llm, limiter, base_delay=0)
+
+    assert asyncio.run(model.with_structured_output(dict).ainvoke([])) == "answer"
+    assert limiter.paused_until == clock.now + 7
+    assert limiter._reserve() == 7
+
+
+def test_client_errors_and_exhausted_retries_are_raised():
+    llm = FlakyModel(ProviderError(400))
+    model = RetryingModel(llm, ProviderLimiter("m"))
+    with pytest.raises(ProviderError):
+        asyncio.run(model.with_structured_output(dict).ainvoke([]))
+    assert llm.calls == 1
+
+    llm = FlakyModel(*itertools.repeat(ProviderError(500), 3))
+    model = RetryingModel(llm, ProviderLimiter("m"), max_retries=2, base_delay=0)
+    with pytest.raises(ProviderError):
+        asyncio.run(model.with_structured_output(dict).ainvoke([]))
+    assert llm.calls == 3
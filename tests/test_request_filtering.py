@@ -0,0 +1,72 @@
+import asyncio
+
+from utils.http_cache import SharedHttpCache
+from utils.request_filtering import FilterProfile, RequestFilter
+
+URL = "https://cdn.example/app.js"
+RESPONSE_HEADERS = [
+    {"name": "Content-Type", "value": "application/javascript"},
+    {"name": "Cache-Control", "value": "public, max-age=3600"},
+]
+
+
+class FakeCDP:
+    """Records the commands sent; the context has `cookies` for every URL."""
+
+    def __init__(self, cookies=()):
+        self.cookies = list(cookies)
+        self.sent = []
+
+    async def send(self, method, params=None):
+        self.sent.append(method)
+        if method == "Network.getCookies":
+            return {"cookies": self.cookies}
+        if method == "Fetch.getResponseBody":
+            return {"body": "console.log(1)", "base64Encoded": False}
+        return {}
+
+
+def request_paused(request_id="1", **response):
+    return {
+        "requestId": request_id,
+        "networkId": f"net-{request_id}",
+        "resourceType": "Script",
+        "request": {"url": URL, "method": "GET", "headers": {}},
+        **response,
+    }
+
+
+def response_paused(request_id="1"):
+    return request_paused(request_id, responseStatusCode=200, responseHeaders=RESPONSE_HEADERS)
+
+
+def test_cached_response_is_served_without_cookies(tmp_path):
+    request_filter = RequestFilter(FilterProfile("off"), http_cache=SharedHttpCache(str(tmp_path)))
+    cdp = FakeCDP()
+    asyncio.run(request_filter._on_paused(cdp, response_paused()))
+    assert request_filter.cache_stores == 1
+
+    asyncio.run(request_filter._on_paused(cdp, request_paused("2")))
+    assert cdp.sent[-1] == "Fetch.fulfillRequest"
+    assert request_filter.cache_hits == 1
+
+
+def test_cached_response_is_not_served_when_the_context_has_cookies(tmp_path):
+    http_cache = SharedHttpCache(str(tmp_path))
+    asyncio.run(RequestFilter(FilterProfile("off"), http_cache=http_cache)._on_paused(FakeCDP(), response_paused()))
+
+    request_filter = RequestFilter(FilterProfile("off"), http_cache=http_cache)
+    cdp = FakeCDP(cookies=[{"name": "session", "value": "secret", "domain": "cdn.example"}])
+    asyncio.run(request_filter._on_paused(cdp, request_paused("2")))
+    assert cdp.sent[-1] == "Fetch.continueRequest"
+    assert "Fetch.fulfillRequest" not in cdp.sent
+    assert (request_filter.cache_hits, request_filter.cache_misses) == (0, 1)
+
+
+def test_response_to_a_request_sent_with_cookies_is_not_stored(tmp_path):
+    request_filter = RequestFilter(FilterProfile("off"), http_cache=SharedHttpCache(str(tmp_path)))
+    request_filter._on_request_extra(
+        {"requestId": "net-1", "headers": {}, "associatedCookies": [{"cookie": {"name": "session"}, "blockedReasons": []}]}
+    )
+    asyncio.run(request_filter._on_paused(FakeCDP(), response_paused()))
+    assert request_filter.cache_stores == 0
@@ -0,0 +1,3 @@
+"""
+Shared helpers for the A5 Python servers (main.py, mainGemini.py, mainOllama.py).
+"""
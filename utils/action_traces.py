@@ -0,0 +1,123 @@
+"""
+Record-and-replay of agent action traces.
+
+A successful run's actions are saved per task text. A later run of the same
+task can replay them with `Agent.rerun_history`, which re-locates each
+interacted element in the current DOM and executes the recorded action
+without calling the LLM. If any step cannot be replayed, the caller falls
+back to `Agent.run()` from wherever the replay stopped.
+
+The final `done` answer is replayed from the recording as well, so replay
+suits recurring action-style tasks (log in, fill a form, download a report)
+rather than questions whose answer changes between runs.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+from typing import Any, List, Optional
+
+from browser_use.agent.views import ActionResult, AgentHistoryList
+
+from utils.agent_history import HistorySummary
+from utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_task(task: str) -> str:
+    """
+    Normalizes task text so whitespace and case differences share a trace.
+    """
+    return re.sub(r"\s+", " ", task).strip().lower()
+
+
+def executed_actions(results: List[ActionResult]) -> int:
+    """
+    Number of a step's leading actions that ran without errors. The
+    controller stops a step at its first failed action, and returns one
+    result per action it ran.
+    """
+    for position, result in enumerate(results):
+        if result.error:
+            return position
+    return len(results)
+
+
+class TraceStore:
+    """
+    Stores one replayable action trace per normalized task text under `root`.
+    Methods are blocking; call them through asyncio.to_thread.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, task: str) -> str:
+        digest = hashlib.sha256(normalize_task(task).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, f"{digest}.json")
+
+    def save(self, task: str, history: AgentHistoryList) -> int:
+        """
+        Saves the actions of `history` that ran without errors. A step's
+        actions run in order until one fails, so a failed step keeps the
+        actions before the failure; actions that never ran are dropped too.
+        Screenshots are dropped; replay only needs the actions and the
+        interacted elements. Returns the number of steps saved.
+        """
+        steps = []
+        for item in history.history:
+            if not item.model_output:
+                continue
+            succeeded = executed_actions(item.result)
+            if not succeeded:
+                continue
+            data = item.model_dump()
+            data["model_output"]["action"] = data["model_output"]["action"][:succeeded]
+            data["state"]["interacted_element"] = data["state"]["interacted_element"][:succeeded]
+            data["result"] = data["result"][:succeeded]
+            data["state"]["screenshot"] = None
+            steps.append(data)
+        if not steps:
+            return 0
+
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(task)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(dumps({"task": task, "history": steps}))
+        os.replace(tmp_path, path)
+        return len(steps)
+
+    def load(self, task: str, output_model: Any) -> Optional[AgentHistoryList]:
+        """
+        Loads the trace for `task`, validating actions against the agent's
+        AgentOutput model. Returns None if there is no usable trace.
+        """
+        path = self._path(task)
+        if not os.path.exists(path):
+            return None
+        try:
+            return AgentHistoryList.load_from_file(path, output_model)
+        except (OSError, ValueError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable action trace {path}: {e}")
+            return None
+
+
+def summarize_replay(trace: AgentHistoryList, results: List[ActionResult]) -> Optional[HistorySummary]:
+    """
+    Builds a summary from a replay's action results, or None if the replay
+    did not reach a `done` action.
+    """
+    if not results or not results[-1].is_done:
+        return None
+    return HistorySummary(
+        final_result=results[-1].extracted_content,
+        is_done=True,
+        steps=len(trace.history),
+        urls=list(dict.fromkeys(url for url in trace.urls() if url and url != "about:blank")),
+        errors=[r.error for r in results if r.error],
+    )
@@ -0,0 +1,67 @@
+"""
+Compact summaries of browser-use agent histories.
+
+`Agent.run()` returns an AgentHistoryList holding every step's model output,
+action results, DOM interaction data and base64 screenshots. Callers of the
+API usually only want the final answer, so the servers keep this summary on
+the task record and store the full history as a blob.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+from utils.serialization import dumps
+
+
+@dataclass
+class HistorySummary:
+    final_result: Optional[str] = None
+    is_done: bool = False
+    steps: int = 0
+    urls: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+
+def is_agent_history(result: Any) -> bool:
+    """
+    Returns True for AgentHistoryList-like objects (checked by duck typing).
+    """
+    return hasattr(result, "history") and hasattr(result, "final_result")
+
+
+def summarize_history(result: Any) -> HistorySummary:
+    """
+    Extracts the final answer, visited URLs, errors and step count from an
+    agent history. Anything else is treated as a plain final answer.
+    """
+    if not is_agent_history(result):
+        return HistorySummary(
+            final_result=None if result is None else str(result),
+            is_done=result is not None,
+        )
+
+    try:
+        final_result = result.final_result()
+    except IndexError:
+        # browser-use indexes the last step's results, which are empty after
+        # some step errors
+        final_result = None
+
+    return HistorySummary(
+        final_result=final_result,
+        is_done=result.is_done(),
+        steps=len(result.history),
+        # Deduplicate while keeping visit order
+        urls=list(dict.fromkeys(url for url in result.urls() if url and url != "about:blank")),
+        errors=result.errors(),
+    )
+
+
+def history_to_json(result: Any) -> Optional[bytes]:
+    """
+    Serializes the full step-by-step history to JSON bytes, or None if the
+    result is not an agent history.
+    """
+    if not is_agent_history(result):
+        return None
+    return dumps(result.model_dump())
@@ -0,0 +1,1461 @@
+"""
+The FastAPI server shared by main.py, mainGemini.py and mainOllama.py.
+
+AgentServer holds everything the three servers have in common: task
+records and their blob store, the agent run with its browser, request
+filter, DOM pruning, vision and storage profiles, fan-out, browser sessions,
+the Chrome governor, adaptive concurrency, rate limits, model routing,
+provider failover and hedging, and the HTTP endpoints. Configuration is read
+from the environment when the server is created.
+
+Each entry point subclasses it with its provider's defaults (`provider`,
+`llm_model`, `default_fast_model`, ...) and `create_chat_model`, and
+serves its `app`. Hooks (`task_started`, `wrap_agent_llm`, `finish_record`,
+...) let a provider add to a task's run, as mainOllama.py does to keep its
+models loaded.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import platform
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from browser_use import Agent
+from browser_use.browser.browser import Browser, BrowserConfig
+from browser_use.controller.service import Controller
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from utils.action_traces import TraceStore, summarize_replay
+from utils.agent_history import history_to_json, summarize_history
+from utils.blob_store import BlobStore
+from utils.browser_context import ManagedBrowserContext
+from utils.browser_governor import BrowserGovernor
+from utils.browser_sessions import BrowserSession, SessionClosedError, SessionLimitError, SessionManager
+from utils.compact_records import compact_record_type
+from utils.compression import CompressionCache, accepts_encoding, negotiated_response
+from utils.concurrency import AdaptiveConcurrency
+from utils.dom_pruning import DomPruner
+from utils.failover import BreakerRegistry, FailoverModel
+from utils.fan_out import merge_results, plan_subtasks
+from utils.hedging import HedgedModel, HedgePolicy
+from utils.http_cache import SharedHttpCache
+from utils.llm_cache import DiskLLMCache
+from utils.llm_routing import ModelRouter, RouterStats
+from utils.parallel_extract import ParallelExtractor
+from utils.providers import create_chat_model, parse_provider_chain
+from utils.rate_limits import RateLimitRegistry, RetryingModel, parse_rate_limits, track_task
+from utils.request_filtering import FilterLevel, FilterStats, RequestFilter, build_profiles, parse_domains
+from utils.serialization import RecordEncoder
+from utils.storage_profiles import PROFILE_NAME_PATTERN, StorageProfileStore
+from utils.structured_logging import LogPipeline, bind_log_context, parse_sampling
+from utils.task_supervisor import TaskSupervisor
+from utils.vision import VisionPolicy, VisionProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class TaskRequest(BaseModel):
+    task: str
+    use_cache: bool = True  # Set to False to bypass the LLM response cache for this task
+    replay: bool = False  # Replay a recorded action trace for this task, if one exists
+    vision: Optional[VisionPolicy] = None  # Screenshot policy for this task; defaults to VISION_POLICY
+    request_filter: Optional[FilterLevel] = None  # Requests the browser does not load; defaults to REQUEST_FILTER_PROFILE
+    storage_profile: Optional[str] = Field(None, pattern=PROFILE_NAME_PATTERN)  # Saved cookies and localStorage to start from
+    save_storage: bool = True  # Save the storage state back to storage_profile when the task is done
+    fan_out: bool = False  # Split into independent subtasks run in parallel (see FAN_OUT_MAX_SUBTASKS)
+
+class TaskResponse(BaseModel):
+    result: str
+
+class SessionTaskResponse(TaskResponse):
+    session_id: str
+    task_id: int
+
+class TaskStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class TaskRecord(BaseModel):
+    id: int
+    task: str
+    status: TaskStatus
+    start_time: datetime
+    end_time: Optional[datetime] = None
+    duration: Optional[float] = None  # Duration in seconds
+    session_id: Optional[str] = None  # Browser session the task ran in
+    parent_id: Optional[int] = None  # Fan-out task this task is a subtask of
+    child_ids: List[int] = []  # Subtasks of a fan-out task, in plan order
+    queue_seconds: Optional[float] = None  # Time spent waiting for a concurrency slot (and earlier tasks of its session)
+    rate_limit_wait_seconds: Optional[float] = None  # Time LLM calls waited for rate limits and retry backoff
+    llm_retries: Optional[int] = None  # LLM calls retried after 429/5xx errors
+    provider: Optional[str] = None  # "provider:model" that served the last main-model call
+    provider_calls: Optional[dict] = None  # Main-model calls served per provider, including fallbacks
+    result: Optional[str] = None  # Final answer; a summary only when it is offloaded
+    result_handle: Optional[str] = None  # Blob store handle of the full final answer
+    result_size: Optional[int] = None  # Size of the full final answer in bytes
+    is_done: Optional[bool] = None  # Whether the agent reported the task as done
+    steps: Optional[int] = None  # Number of agent steps taken
+    urls: List[str] = []  # URLs visited, in order
+    step_errors: List[str] = []  # Errors from individual agent steps
+    history_handle: Optional[str] = None  # Blob store handle of the full agent history
+    replayed: Optional[bool] = None  # Whether the result came from replaying a recorded trace
+    storage_profile: Optional[str] = None  # Storage profile the task started from
+    storage_restored: Optional[bool] = None  # Whether a saved storage state was restored
+    storage_saved: Optional[bool] = None  # Whether the storage state was saved at the end
+    dom_tokens_saved: Optional[int] = None  # Estimated prompt tokens removed by DOM pruning
+    vision: Optional[VisionPolicy] = None  # Screenshot policy used for this task
+    screenshot_bytes: Optional[int] = None  # Total screenshot bytes sent to the LLM
+    parallel_extract: Optional[dict] = None  # parallel_extract calls, pages read, failed, skipped and truncated, and time spent
+    request_filter: Optional[FilterLevel] = None  # Request filter profile used for this task
+    network: Optional[dict] = None  # Requests and bytes loaded and blocked (bytes saved are estimated)
+    step_metrics: List[dict] = []  # Per-step timings, prompt token and screenshot sizes
+    model_calls: Optional[dict] = None  # Per-tier calls, latency and escalations when routing is on
+    error: Optional[str] = None
+
+
+@functools.lru_cache(maxsize=None)
+def get_chrome_path() -> str:
+    """
+    Returns the most common Chrome executable path based on the operating system.
+    The path is looked up once and then cached.
+    Raises:
+        FileNotFoundError: If Chrome is not found in the expected path.
+    """
+    system = platform.system()
+
+    if system == "Windows":
+        # Common installation path for Windows
+        chrome_path = os.path.join(
+            os.environ.get("PROGRAMFILES", "C:\\Program Files"),
+            "Google\\Chrome\\Application\\chrome.exe"
+        )
+    elif system == "Darwin":
+        # Common installation path for macOS
+        chrome_path = "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"
+    elif system == "Linux":
+        # Common installation path for Linux
+        chrome_path = "/usr/bin/google-chrome"
+    else:
+        raise FileNotFoundError(f"Unsupported operating system: {system}")
+
+    # Verify that the Chrome executable exists at the determined path
+    if not os.path.exists(chrome_path):
+        raise FileNotFoundError(f"Google Chrome executable not found at: {chrome_path}")
+
+    return chrome_path
+
+
+class AgentServer:
+    """
+    One instance per process; its `app` is what uvicorn serves. Subclasses
+    set the provider defaults below and implement `create_chat_model`.
+    """
+
+    provider: str  # Provider of the main and fast models, as in utils/providers.py
+    llm_model: str  # Main model
+    default_fast_model: str  # FAST_MODEL, for routine steps with MODEL_ROUTING=adaptive
+    default_rate_limits: str  # LLM_RATE_LIMITS
+    default_call_timeout: str = "120"  # LLM_CALL_TIMEOUT; "0" waits as long as the model needs
+    default_dom_token_budget: str = "0"  # DOM_TOKEN_BUDGET
+    default_vision_policy: str = "always"  # VISION_POLICY
+    default_parallel_extract_max_chars: str = "40000"  # PARALLEL_EXTRACT_MAX_CHARS
+    record_model: Type[TaskRecord] = TaskRecord  # Task records as returned by the API
+
+    def __init__(self):
+        # Log records are queued and written by a background thread (see
+        # utils/structured_logging.py), as JSON lines carrying the task_id and
+        # phase of the task that logged them (LOG_FORMAT=text for plain text).
+        # LOG_FILE adds a rotating file of LOG_FILE_MAX_MB megabytes with
+        # LOG_FILE_BACKUPS backups. LOG_SAMPLING keeps only a share of the INFO
+        # records of noisy loggers, as "logger=rate" pairs, e.g.
+        # "uvicorn.access=0.1,browser_use.dom=0".
+        self.log_pipeline = LogPipeline(
+            level=os.getenv("LOG_LEVEL", "INFO"),
+            fmt=os.getenv("LOG_FORMAT", "json").lower(),
+            file=os.getenv("LOG_FILE") or None,
+            file_max_bytes=int(float(os.getenv("LOG_FILE_MAX_MB", "50")) * 1024 * 1024),
+            file_backups=int(os.getenv("LOG_FILE_BACKUPS", "5")),
+            sampling=parse_sampling(os.getenv("LOG_SAMPLING", "")),
+        )
+        self.log_pipeline.install()
+
+        # Records are kept as slotted TaskEntry objects, with the status as a
+        # small code and timestamps as epoch seconds (see
+        # utils/compact_records.py), and converted to `record_model` only when
+        # a response is serialized
+        self.TaskEntry = compact_record_type(self.record_model, TaskStatus, "TaskEntry")
+        self.task_records: Dict[int, Any] = {}  # TaskEntry by task ID
+        self.task_id_counter = 0
+        self.task_lock = asyncio.Lock()  # To manage concurrent access to task_records
+        # Caches the JSON bytes of finished records for /lastResponses
+        self.record_encoder = RecordEncoder(
+            final_statuses=(TaskStatus.COMPLETED, TaskStatus.FAILED), to_model=self.TaskEntry.to_model
+        )
+        # and their gzip/brotli forms, while the list they make up is unchanged
+        self.last_responses_compressed = CompressionCache()
+
+        # Results larger than RESULT_BLOB_THRESHOLD bytes are stored compressed
+        # on disk and only a summary is kept on the record (see GET
+        # /tasks/{task_id}/result). Blobs beyond RESULT_BLOB_MAX_MB are evicted
+        # least recently used first (0 disables the cap). Finished records
+        # beyond the newest MAX_TASK_RECORDS are dropped, together with the
+        # blobs no remaining record points to.
+        self.result_blob_threshold = int(os.getenv("RESULT_BLOB_THRESHOLD", "8192"))
+        self.result_summary_chars = int(os.getenv("RESULT_SUMMARY_CHARS", "500"))
+        self.max_task_records = int(os.getenv("MAX_TASK_RECORDS", "10000"))
+        self.result_store = BlobStore(
+            os.getenv("RESULT_BLOB_DIR", "task_results"),
+            max_bytes=int(os.getenv("RESULT_BLOB_MAX_MB", "2048")) * 1024 * 1024,
+        )
+
+        # Optional on-disk LLM response cache, enabled by setting LLM_CACHE_DIR.
+        # Repeated prompts (same model and messages) are answered from disk.
+        self.llm_cache = (
+            DiskLLMCache(
+                os.getenv("LLM_CACHE_DIR"),
+                max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+            )
+            if os.getenv("LLM_CACHE_DIR")
+            else None
+        )
+
+        # Optional action trace recording, enabled by setting ACTION_TRACE_DIR.
+        # Successful runs are recorded; tasks submitted with replay=True reuse them.
+        self.trace_store = TraceStore(os.getenv("ACTION_TRACE_DIR")) if os.getenv("ACTION_TRACE_DIR") else None
+        self.action_trace_replay_delay = float(os.getenv("ACTION_TRACE_REPLAY_DELAY", "0.5"))
+
+        # Storage profiles (see utils/storage_profiles.py), enabled by setting
+        # STORAGE_PROFILE_KEY to a Fernet key. A task with a storage_profile
+        # starts with its cookies and localStorage restored, on the page it was
+        # saved from, and saves the state back when done. Profiles are stored
+        # encrypted under STORAGE_PROFILE_DIR and expire
+        # STORAGE_PROFILE_TTL_HOURS after being saved (0: never).
+        self.storage_profiles = (
+            StorageProfileStore(
+                os.getenv("STORAGE_PROFILE_DIR", "storage_profiles"),
+                key=os.getenv("STORAGE_PROFILE_KEY"),
+                ttl_seconds=float(os.getenv("STORAGE_PROFILE_TTL_HOURS", "24")) * 3600,
+            )
+            if os.getenv("STORAGE_PROFILE_KEY")
+            else None
+        )
+
+        # DOM pruning before each LLM call (see utils/dom_pruning.py).
+        # A DOM_TOKEN_BUDGET or DOM_MAX_ELEMENTS of 0 means unlimited.
+        self.dom_pruning = os.getenv("DOM_PRUNING", "true").lower() == "true"
+        self.dom_token_budget = int(os.getenv("DOM_TOKEN_BUDGET", self.default_dom_token_budget))
+        self.dom_max_elements = int(os.getenv("DOM_MAX_ELEMENTS", "0"))
+
+        # Screenshot policy for agent steps (see utils/vision.py): off,
+        # on_demand or always. Screenshots that are sent are downscaled to
+        # VISION_MAX_WIDTH pixels and, where possible, VISION_TARGET_BYTES bytes.
+        self.vision_policy = VisionPolicy(os.getenv("VISION_POLICY", self.default_vision_policy))
+        self.vision_max_width = int(os.getenv("VISION_MAX_WIDTH", "1024"))
+        self.vision_target_bytes = int(os.getenv("VISION_TARGET_BYTES", "150000"))
+
+        # Parallel extraction (see utils/parallel_extract.py). The agent's
+        # parallel_extract action reads up to PARALLEL_EXTRACT_MAX_TABS pages
+        # at once in background tabs (0 removes the action), giving each page
+        # PARALLEL_EXTRACT_TIMEOUT_SECONDS to load. A call reads at most
+        # PARALLEL_EXTRACT_MAX_URLS pages, whose content shares a budget of
+        # PARALLEL_EXTRACT_MAX_CHARS characters in the agent's memory.
+        self.parallel_extract_max_tabs = int(os.getenv("PARALLEL_EXTRACT_MAX_TABS", "6"))
+        self.parallel_extract_timeout_seconds = float(os.getenv("PARALLEL_EXTRACT_TIMEOUT_SECONDS", "20"))
+        self.parallel_extract_max_urls = int(os.getenv("PARALLEL_EXTRACT_MAX_URLS", "12"))
+        self.parallel_extract_max_chars = int(
+            os.getenv("PARALLEL_EXTRACT_MAX_CHARS", self.default_parallel_extract_max_chars)
+        )
+
+        # Request filtering (see utils/request_filtering.py).
+        # REQUEST_FILTER_PROFILE picks what the agent's browser does not
+        # download: off, trackers (ad and analytics domains), lean (plus media
+        # and fonts) or text (plus images). REQUEST_FILTER_DOMAINS adds domains
+        # to block, comma separated. Tasks can pick another profile; traffic
+        # and step timings per profile are at GET /requestFilter.
+        self.request_filter_profile = FilterLevel(os.getenv("REQUEST_FILTER_PROFILE", "trackers"))
+        self.request_filter_profiles = build_profiles(parse_domains(os.getenv("REQUEST_FILTER_DOMAINS", "")))
+        self.request_filter_stats = FilterStats()  # Aggregated over all tasks
+
+        # Each task and session gets its own browser context, with its own
+        # cookies and storage, rather than the default context of the shared
+        # Chrome instance (BROWSER_ISOLATED_CONTEXTS=false shares it). Such
+        # contexts only cache in memory, so cacheable scripts, stylesheets,
+        # images and fonts are kept in a cache shared by all browsers under
+        # HTTP_CACHE_DIR, up to HTTP_CACHE_MAX_MB megabytes (0 disables it; see
+        # utils/http_cache.py and GET /httpCache).
+        self.browser_isolated_contexts = os.getenv("BROWSER_ISOLATED_CONTEXTS", "true").lower() == "true"
+        http_cache_max_mb = float(os.getenv("HTTP_CACHE_MAX_MB", "1024"))
+        self.http_cache = (
+            SharedHttpCache(
+                os.getenv("HTTP_CACHE_DIR", "http_cache"),
+                max_bytes=int(http_cache_max_mb * 1024 * 1024),
+                max_entry_bytes=int(float(os.getenv("HTTP_CACHE_MAX_ENTRY_MB", "10")) * 1024 * 1024),
+            )
+            if http_cache_max_mb > 0
+            else None
+        )
+
+        # Adaptive model routing (see utils/llm_routing.py). With
+        # MODEL_ROUTING=adaptive, routine steps go to FAST_MODEL; planning,
+        # failed and final steps go to the main model.
+        self.fast_model = os.getenv("FAST_MODEL", self.default_fast_model)
+        self.model_routing = os.getenv("MODEL_ROUTING", "off").lower() == "adaptive"
+        self.router_planning_steps = int(os.getenv("ROUTER_PLANNING_STEPS", "1"))
+        self.router_sticky_steps = int(os.getenv("ROUTER_STICKY_STEPS", "1"))
+        self.router_stats = RouterStats()  # Aggregated over all tasks, see GET /routerStats
+
+        # LLM rate limits (see utils/rate_limits.py), shared by all tasks, as
+        # "model=requests/tokens" per minute, comma separated; unlisted models
+        # are not limited. Calls failing with 429/5xx are retried up to
+        # LLM_MAX_RETRIES times with jittered exponential backoff. See GET
+        # /rateLimits.
+        self.rate_limits = RateLimitRegistry(parse_rate_limits(os.getenv("LLM_RATE_LIMITS", self.default_rate_limits)))
+        self.llm_max_retries = int(os.getenv("LLM_MAX_RETRIES", "4"))
+        # Chat model clients, created once and shared by all tasks, by
+        # provider, model and whether they use the LLM cache
+        self.chat_models: Dict[Tuple[str, str, bool], Any] = {}
+
+        # Provider failover (see utils/failover.py). Main-model calls that fail
+        # or take longer than LLM_CALL_TIMEOUT seconds move on to the next
+        # "provider:model" in LLM_FALLBACKS, e.g.
+        # "google:gemini-2.0-flash-exp,ollama:qwen2.5:32b-instruct-q4_K_M".
+        # Providers whose circuit breaker opened are skipped for
+        # BREAKER_OPEN_SECONDS.
+        self.llm_fallbacks = parse_provider_chain(os.getenv("LLM_FALLBACKS", ""))
+        self.call_timeout = float(os.getenv("LLM_CALL_TIMEOUT", self.default_call_timeout)) or None
+        self.breakers = BreakerRegistry(open_seconds=float(os.getenv("BREAKER_OPEN_SECONDS", "30")))
+
+        # Hedged requests (see utils/hedging.py), off by default. With
+        # LLM_HEDGING=true a main-model call still running after the
+        # HEDGE_PERCENTILE latency of recent calls is duplicated to
+        # LLM_HEDGE_PROVIDER ("provider:model", default the main model
+        # itself); the first response wins. At most HEDGE_MAX_RATIO of calls
+        # are hedged. See GET /providers.
+        self.llm_hedging = os.getenv("LLM_HEDGING", "false").lower() == "true"
+        self.llm_hedge_provider = parse_provider_chain(os.getenv("LLM_HEDGE_PROVIDER", ""))[:1]
+        self.hedging = HedgePolicy(
+            percentile=float(os.getenv("HEDGE_PERCENTILE", "95")),
+            max_ratio=float(os.getenv("HEDGE_MAX_RATIO", "0.1")),
+        )
+
+        # Fan-out (see utils/fan_out.py). A task submitted with fan_out=true is
+        # split by a planner call into at most FAN_OUT_MAX_SUBTASKS independent
+        # subtasks. They run as child tasks in their own browser contexts,
+        # under the concurrency limit, and a merge call combines their results
+        # on the parent task's record.
+        self.fan_out_max_subtasks = int(os.getenv("FAN_OUT_MAX_SUBTASKS", "8"))
+
+        # Graceful shutdown (see utils/task_supervisor.py). Running tasks get
+        # SHUTDOWN_DRAIN_SECONDS to finish; the rest are cancelled with their
+        # history checkpointed, and every browser still open is closed.
+        self.shutdown_drain_seconds = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "30"))
+        self.supervisor = TaskSupervisor()
+
+        # Adaptive concurrency (see utils/concurrency.py). Tasks wait for one
+        # of MIN_CONCURRENT_TASKS to MAX_CONCURRENT_TASKS slots; the limit
+        # starts at INITIAL_CONCURRENT_TASKS and follows host memory and CPU,
+        # LLM latency and error rate. Decisions are listed at GET /concurrency.
+        self.concurrency = AdaptiveConcurrency(
+            min_limit=int(os.getenv("MIN_CONCURRENT_TASKS", "1")),
+            max_limit=int(os.getenv("MAX_CONCURRENT_TASKS", "8")),
+            initial_limit=int(os.getenv("INITIAL_CONCURRENT_TASKS", "2")),
+            memory_high_percent=float(os.getenv("CONCURRENCY_MEMORY_HIGH", "85")),
+            cpu_high_percent=float(os.getenv("CONCURRENCY_CPU_HIGH", "90")),
+        )
+
+        # Chrome launching and recycling (see utils/browser_governor.py). All
+        # tasks share one Chrome instance that the server launches with its own
+        # profile in BROWSER_PROFILE_DIR and debugging port BROWSER_DEBUG_PORT;
+        # it is restarted after BROWSER_RECYCLE_TASKS tasks or above
+        # BROWSER_RECYCLE_RSS_MB of resident memory (0 disables either
+        # trigger). BROWSER_KILL_ORPHANS also kills helpers it leaves behind.
+        # With BROWSER_CDP_URL set, tasks attach to that Chrome instead, which
+        # the server never restarts or terminates. The server's own Chrome is
+        # launched at startup; BROWSER_PRELAUNCH=false leaves that to the
+        # first task.
+        self.browser_cdp_url = os.getenv("BROWSER_CDP_URL") or None
+        self.browser_prelaunch = os.getenv("BROWSER_PRELAUNCH", "true").lower() == "true"
+        self.browser_governor = BrowserGovernor(
+            chrome_path=None if self.browser_cdp_url else (lambda: get_chrome_path()),
+            debug_port=int(os.getenv("BROWSER_DEBUG_PORT", "9223")),
+            profile_dir=os.getenv("BROWSER_PROFILE_DIR", "chrome_profile"),
+            max_tasks=int(os.getenv("BROWSER_RECYCLE_TASKS", "50")),
+            max_rss_mb=float(os.getenv("BROWSER_RECYCLE_RSS_MB", "4096")),
+            sample_seconds=float(os.getenv("BROWSER_SAMPLE_SECONDS", "15")),
+            kill_orphans=os.getenv("BROWSER_KILL_ORPHANS", "false").lower() == "true",
+        )
+
+        # Browser sessions (see utils/browser_sessions.py). Tasks submitted to a
+        # session run one after the other on the same browser and tabs. At most
+        # MAX_BROWSER_SESSIONS are open at once; a session without tasks for
+        # SESSION_IDLE_SECONDS is closed (0 keeps it open). An open session
+        # uses Chrome, so a due recycle waits until it is closed; other tasks
+        # keep starting meanwhile. See /sessions.
+        self.sessions = SessionManager(
+            self.open_session_browser,
+            self.close_session_browser,
+            max_sessions=int(os.getenv("MAX_BROWSER_SESSIONS", "4")),
+            idle_seconds=float(os.getenv("SESSION_IDLE_SECONDS", "900")),
+        )
+
+        self.app = FastAPI(title="AI Agent API with BrowserUse", version="1.0", lifespan=self.lifespan)
+        # Configure CORS
+        self.app.add_middleware(
+            CORSMiddleware,
+            allow_origins=["*"],  # For development: allow all origins. In production, specify exact origins.
+            allow_credentials=True,
+            allow_methods=["*"],
+            allow_headers=["*"],
+        )
+        self.add_routes(self.app)
+
+    # ----------------------------
+    # Provider hooks
+    # ----------------------------
+
+    def create_chat_model(self, model: str, **kwargs: Any) -> Any:
+        """
+        Creates a LangChain chat model of the server's provider, once per
+        model and shared by all tasks. `kwargs` (cache, rate_limiter,
+        callbacks) are to be passed through; the model must not retry on its
+        own, RetryingModel does.
+        """
+        raise NotImplementedError
+
+    async def prewarm_provider(self) -> None:
+        """Called at startup, after the LLM clients were created."""
+
+    def task_started(self, task_id: int) -> None:
+        """Called when a task is submitted, before it is queued."""
+
+    def task_finished(self, task_id: int) -> None:
+        """Called when a task ends, however it ends."""
+
+    def wrap_agent_llm(self, llm: Any, task_id: int, started_at: float) -> Any:
+        """Wraps the LLM an agent runs with; `started_at` is the task's monotonic start time."""
+        return llm
+
+    def finish_record(self, record: Any, llm: Any) -> None:
+        """Adds provider fields to the record of a completed task, `llm` being the agent's."""
+
+    # ----------------------------
+    # Lifespan
+    # ----------------------------
+
+    @asynccontextmanager
+    async def lifespan(self, app: FastAPI):
+        """
+        Pre-warms shared resources before the server reports ready. On shutdown,
+        stops accepting tasks, drains or checkpoints running ones and closes
+        their browsers, then the browsers of open sessions.
+        """
+        await self.prewarm()
+        self.browser_governor.start()
+        self.concurrency.start()
+        self.sessions.start()
+        yield
+        await self.supervisor.shutdown(self.shutdown_drain_seconds)
+        await self.sessions.close_all()
+        await self.concurrency.close()
+        await self.browser_governor.close()
+        self.log_pipeline.stop()
+
+    async def prewarm(self) -> None:
+        """
+        Launches the managed Chrome and creates the LLM clients tasks use by
+        default at startup, so the first task does not pay for them and
+        configuration errors are logged before any task runs.
+        """
+        if self.browser_cdp_url:
+            logger.info(f"Attaching to the Chrome at {self.browser_cdp_url}")
+        elif self.browser_prelaunch:
+            try:
+                await self.browser_governor.prelaunch()
+            except Exception as e:
+                logger.error(f"Tasks will fail until Chrome is available: {e}")
+        cache = self.llm_cache if self.llm_cache is not None else False
+        for model in [self.llm_model, self.fast_model] if self.model_routing else [self.llm_model]:
+            try:
+                self.build_llm(model, cache)
+            except Exception as e:
+                logger.error(f"Could not create the LLM client for {model}: {e}")
+        self.build_failover_llm(cache)
+        await self.prewarm_provider()
+
+    # ----------------------------
+    # Browsers and LLMs
+    # ----------------------------
+
+    def new_browser(self) -> Browser:
+        # Connects to the Chrome launched by the governor, or the attached one
+        return Browser(
+            config=BrowserConfig(
+                cdp_url=self.browser_cdp_url or self.browser_governor.cdp_url,
+                disable_security=True,
+                headless=False,  # Set to True for headless mode
+            )
+        )
+
+    async def open_session_browser(self) -> tuple:
+        """
+        Opens the browser and context of a new session. Waits while Chrome is
+        being recycled, then holds the browser until the session is closed.
+        """
+        await self.browser_governor.acquire(session=True)
+        try:
+            browser = self.new_browser()
+            return browser, ManagedBrowserContext(browser=browser, isolated=self.browser_isolated_contexts)
+        except Exception:
+            await self.browser_governor.release(session=True)
+            raise
+
+    async def close_session_browser(self, browser: Browser, browser_context: ManagedBrowserContext) -> None:
+        close_failed = False
+        try:
+            await browser_context.close()
+        except Exception as e:
+            logger.error(f"Error closing session browser context: {e}")
+        try:
+            await browser.close()
+        except Exception as e:
+            logger.error(f"Error closing session browser: {e}", exc_info=True)
+            close_failed = True
+        await self.browser_governor.release(close_failed=close_failed, session=True)
+
+    def retrying_model(self, provider: str, model: str, cache, create: Callable[..., Any]) -> RetryingModel:
+        """
+        The shared chat model client of `provider` and `model`, created with
+        `create(model, **kwargs)` the first time. Calls go through the shared
+        rate limiter of the model and are retried on 429/5xx errors.
+        """
+        limiter = self.rate_limits.get(provider, model)
+        key = (provider, model, cache is not False)
+        llm = self.chat_models.get(key)
+        if llm is None:
+            llm = self.chat_models[key] = create(
+                model,
+                cache=cache,
+                rate_limiter=limiter,
+                callbacks=[self.concurrency.llm_monitor, limiter.usage_handler],
+            )
+        return RetryingModel(llm, limiter, max_retries=self.llm_max_retries)
+
+    def build_llm(self, model: str, cache) -> RetryingModel:
+        """
+        The chat model used by the agent, rate limited and retried.
+        """
+        return self.retrying_model(self.provider, model, cache, self.create_chat_model)
+
+    def build_provider_llm(self, provider: str, model: str, cache) -> RetryingModel:
+        """
+        A model of any provider (fallbacks and hedges), rate limited and
+        retried like the main model.
+        """
+        return self.retrying_model(provider, model, cache, functools.partial(create_chat_model, provider))
+
+    def build_failover_llm(self, cache, task_id: Optional[int] = None) -> FailoverModel:
+        """
+        Creates the main model followed by the LLM_FALLBACKS models, rate limited
+        and retried the same way. Fallbacks that cannot be created (e.g. a missing
+        API key) are left out. With LLM_HEDGING the main model's slow calls are
+        hedged.
+        """
+        primary = self.build_llm(self.llm_model, cache)
+        name = primary.limiter.name
+        chain = [(name, primary)]
+        if self.llm_hedging:
+            hedge_llm = None
+            for provider, model in self.llm_hedge_provider:
+                try:
+                    hedge_llm = self.build_provider_llm(provider, model, cache)
+                except Exception as e:
+                    logger.warning(f"Hedging with {name} instead of {provider}:{model}: {e}")
+            hedged = HedgedModel(
+                primary,
+                name,
+                self.hedging,
+                hedge_llm=hedge_llm,
+                hedge_name=hedge_llm.limiter.name if hedge_llm is not None else None,
+                task_id=task_id,
+            )
+            chain = [(name, hedged)]
+        for provider, model in self.llm_fallbacks:
+            try:
+                llm = self.build_provider_llm(provider, model, cache)
+            except Exception as e:
+                logger.warning(f"Skipping fallback {provider}:{model}: {e}")
+                continue
+            chain.append((llm.limiter.name, llm))
+        return FailoverModel(chain, self.breakers, call_timeout=self.call_timeout, task_id=task_id)
+
+    def build_planner_llm(self, cache, task_id: int):
+        """
+        LLM for the fan-out planner and merge calls: the main model, with failover.
+        """
+        return self.build_failover_llm(cache, task_id)
+
+    # ----------------------------
+    # Task records and results
+    # ----------------------------
+
+    async def next_task_id(self) -> int:
+        async with self.task_lock:
+            self.task_id_counter += 1
+            return self.task_id_counter
+
+    async def offload_result(self, task_id: int, result) -> tuple:
+        """
+        Keeps small results inline. Larger results are written to the blob store
+        and replaced by a summary.
+        Returns (result, result_handle, result_size).
+        """
+        if result is None:
+            return None, None, None
+        text = result if isinstance(result, str) else str(result)
+        data = text.encode("utf-8")
+        if len(data) <= self.result_blob_threshold:
+            return text, None, len(data)
+
+        handle = await asyncio.to_thread(self.result_store.put, data)
+        logger.info(f"Task ID {task_id}: Offloaded {len(data)} byte result to blob {handle}.")
+        summary = text[: self.result_summary_chars] + f"... [truncated, full result at /tasks/{task_id}/result]"
+        return summary, handle, len(data)
+
+    async def evict_task_records(self) -> None:
+        """
+        Drops the oldest finished records beyond MAX_TASK_RECORDS and deletes
+        their result and history blobs, unless a remaining record shares them.
+        """
+        async with self.task_lock:
+            excess = len(self.task_records) - self.max_task_records
+            if not self.max_task_records or excess <= 0:
+                return
+            # Records are inserted in task ID order, oldest first
+            evicted = []
+            for record in self.task_records.values():
+                if record.status in (TaskStatus.COMPLETED, TaskStatus.FAILED):
+                    evicted.append(record)
+                    if len(evicted) == excess:
+                        break
+            handles = set()
+            for record in evicted:
+                del self.task_records[record.id]
+                handles.update(handle for handle in (record.result_handle, record.history_handle) if handle)
+            if handles:
+                for record in self.task_records.values():
+                    handles.difference_update((record.result_handle, record.history_handle))
+        if handles:
+            deleted = await asyncio.to_thread(self.result_store.delete, handles)
+            logger.info(f"Evicted {len(evicted)} task record(s) and {deleted} blob(s).")
+
+    async def store_history(self, task_id: int, result) -> Optional[str]:
+        """
+        Writes the full step-by-step agent history to the blob store.
+        Returns its handle, or None if the result is not an agent history.
+        """
+        def _store() -> Optional[str]:
+            data = history_to_json(result)
+            return self.result_store.put(data) if data is not None else None
+
+        handle = await asyncio.to_thread(_store)
+        if handle:
+            logger.info(f"Task ID {task_id}: Stored agent history as blob {handle}.")
+        return handle
+
+    async def save_storage_profile(self, task_id: int, name: str, browser_context: ManagedBrowserContext) -> bool:
+        """
+        Saves the cookies, localStorage and current URL of a finished task as
+        storage profile `name`. A failure is logged and does not fail the task.
+        """
+        try:
+            state = await browser_context.capture_storage_state()
+            if state is None:
+                return False
+            size = await asyncio.to_thread(self.storage_profiles.save, name, state)
+        except Exception as e:
+            logger.warning(f"Task ID {task_id}: Could not save storage profile {name}: {e}")
+            return False
+        logger.info(f"Task ID {task_id}: Saved storage profile {name} ({len(state['cookies'])} cookies, {size} bytes).")
+        return True
+
+    async def full_result(self, record) -> Optional[str]:
+        """
+        The full final answer of a task, also when it was offloaded to the blob store.
+        """
+        if record.result_handle:
+            data = await asyncio.to_thread(self.result_store.get, record.result_handle)
+            return data.decode("utf-8")
+        return record.result
+
+    # ----------------------------
+    # Running tasks
+    # ----------------------------
+
+    def start_task(self, task_id: int, request: TaskRequest, session: Optional[BrowserSession] = None) -> asyncio.Task:
+        """
+        Starts a task; the supervisor keeps track of it for graceful shutdown.
+        """
+        return self.supervisor.start(task_id, self.execute_task(task_id, request, session))
+
+    async def run_agent(self, task_id: int, task: str, agent: Agent, replay: bool) -> tuple:
+        """
+        Runs the agent, first replaying a recorded action trace when `replay` is
+        set and one exists. A failed replay falls back to the LLM-driven
+        `agent.run()`, continuing from the page the replay stopped on.
+        Successful LLM-driven runs are recorded for later replays.
+        Returns (history, summary, replayed).
+        """
+        if replay and self.trace_store is not None:
+            trace = await asyncio.to_thread(self.trace_store.load, task, agent.AgentOutput)
+            if trace is not None:
+                logger.info(f"Task ID {task_id}: Replaying recorded trace with {len(trace.history)} steps.")
+                # Elements are re-located in the full DOM tree, not the pruned one
+                agent.browser_context.replaying = True
+                try:
+                    results = await agent.rerun_history(
+                        trace,
+                        max_retries=2,
+                        skip_failures=False,
+                        delay_between_actions=self.action_trace_replay_delay,
+                    )
+                    summary = summarize_replay(trace, results)
+                except Exception as e:
+                    logger.warning(f"Task ID {task_id}: Replay failed: {e}")
+                    summary = None
+                finally:
+                    agent.browser_context.replaying = False
+                if summary is not None:
+                    logger.info(f"Task ID {task_id}: Replay completed without LLM calls.")
+                    return trace, summary, True
+                logger.info(f"Task ID {task_id}: Falling back to the LLM-driven agent.")
+
+        result = await agent.run()
+        logger.info(f"Task ID {task_id}: Agent.run() completed successfully.")
+        summary = summarize_history(result)
+        if self.trace_store is not None and summary.is_done:
+            saved_steps = await asyncio.to_thread(self.trace_store.save, task, result)
+            logger.info(f"Task ID {task_id}: Recorded action trace with {saved_steps} steps.")
+        return result, summary, False
+
+    async def execute_fan_out(self, task_id: int, request: TaskRequest):
+        """
+        Background task for requests with fan_out: plans independent subtasks,
+        runs each as a child task (in its own browser context, under the
+        concurrency limit like any other task) and merges their results into
+        this task's record. Tasks the planner does not split run as usual.
+        """
+        task = request.task
+        cache = self.llm_cache if (request.use_cache and self.llm_cache is not None) else False
+        children = []
+        bind_log_context(task_id=task_id, phase="plan")
+        try:
+            logger.info(f"Starting fan-out task ID {task_id}: {task}")
+            async with self.task_lock:
+                task_record = self.TaskEntry(id=task_id, task=task, status=TaskStatus.RUNNING, start_time=time.time())
+                self.task_records[task_id] = task_record
+            await self.evict_task_records()
+            # Running from the start: shutdown drains it, with the children it started
+            self.supervisor.begin(task_id)
+
+            # The planner holds no concurrency slot, so its children can take them
+            llm = self.build_planner_llm(cache, task_id)
+            try:
+                plan = await plan_subtasks(llm, task, self.fan_out_max_subtasks)
+            except Exception as e:
+                logger.warning(f"Task ID {task_id}: Planning failed, running as a single task: {e}")
+                plan = None
+            if plan is None:
+                logger.info(f"Task ID {task_id}: Not split into subtasks, running as a single task.")
+                return await self.execute_task(task_id, request.model_copy(update={"fan_out": False}))
+            if not self.supervisor.accepting:
+                raise RuntimeError("Server is shutting down")
+
+            # Children restore the storage profile but do not race to save it
+            async with self.task_lock:
+                child_ids = []
+                for _ in plan.subtasks:
+                    self.task_id_counter += 1
+                    child_ids.append(self.task_id_counter)
+                task_record.child_ids = child_ids
+            logger.info(f"Task ID {task_id}: Fanning out into {len(child_ids)} subtasks: {child_ids}.")
+            bind_log_context(phase="fan_out")
+            for child_id, subtask in zip(child_ids, plan.subtasks):
+                child_request = request.model_copy(update={"task": subtask, "fan_out": False, "save_storage": False})
+                children.append(
+                    self.supervisor.start(child_id, self.execute_task(child_id, child_request, parent_id=task_id))
+                )
+            await asyncio.gather(*children, return_exceptions=True)
+
+            bind_log_context(phase="finalize")
+            child_records = [self.task_records.get(child_id) for child_id in child_ids]
+            results = [
+                (
+                    subtask,
+                    await self.full_result(record) if record is not None and record.status == TaskStatus.COMPLETED else None,
+                    record.error if record is not None else "Record evicted",
+                )
+                for subtask, record in zip(plan.subtasks, child_records)
+            ]
+            succeeded = [
+                record for record in child_records if record is not None and record.status == TaskStatus.COMPLETED
+            ]
+            merged = await merge_results(llm, task, plan, results) if succeeded else None
+            result_text, result_handle, result_size = await self.offload_result(task_id, merged)
+
+            async with self.task_lock:
+                record = self.task_records.get(task_id)
+                if record is not None:
+                    record.status = TaskStatus.COMPLETED if succeeded else TaskStatus.FAILED
+                    record.end_time = time.time()
+                    record.duration = record.end_time - record.start_time
+                    record.result = result_text
+                    record.result_handle = result_handle
+                    record.result_size = result_size
+                    record.is_done = (
+                        bool(succeeded) and all(child.is_done for child in succeeded) and len(succeeded) == len(child_ids)
+                    )
+                    # Failed and cancelled children leave the fields they never got to as None
+                    finished = [child for child in child_records if child is not None]
+                    record.steps = sum(child.steps or 0 for child in finished)
+                    record.urls = [url for child in finished for url in (child.urls or [])]
+                    record.step_errors = [
+                        f"Subtask {child.id}: {error}"
+                        for child in finished
+                        for error in (child.step_errors or []) + ([child.error] if child.error else [])
+                    ]
+                    record.error = None if succeeded else "All subtasks failed"
+
+        except asyncio.CancelledError:
+            logger.warning(f"Task ID {task_id}: Interrupted by server shutdown.")
+            for child in children:
+                child.cancel()
+            async with self.task_lock:
+                record = self.task_records.get(task_id)
+                if record is not None:
+                    record.status = TaskStatus.FAILED
+                    record.end_time = time.time()
+                    record.duration = record.end_time - record.start_time
+                    record.error = "Interrupted by server shutdown"
+            raise
+
+        except Exception as e:
+            logger.error(f"Error in fan-out task ID {task_id}: {e}", exc_info=True)
+            async with self.task_lock:
+                record = self.task_records.get(task_id)
+                if record is not None:
+                    record.status = TaskStatus.FAILED
+                    record.end_time = time.time()
+                    record.duration = record.end_time - record.start_time
+                    record.error = str(e)
+
+    async def execute_task(
+        self,
+        task_id: int,
+        request: TaskRequest,
+        session: Optional[BrowserSession] = None,
+        parent_id: Optional[int] = None,
+    ):
+        """
+        Background task to execute the AI agent.
+        Initializes a new browser instance for each task to ensure isolation,
+        unless the task belongs to a `session`: it then runs on the session's
+        browser and tabs once the session's earlier tasks finished, and leaves
+        them open. Per-task options (LLM cache, trace replay, vision policy)
+        come from `request`; fan_out is ignored for session tasks, whose steps
+        run in order by design.
+        """
+        if request.fan_out and session is None:
+            return await self.execute_fan_out(task_id, request)
+        task = request.task
+        vision_policy = request.vision or self.vision_policy
+        filter_level = request.request_filter or self.request_filter_profile
+        started_at = time.monotonic()
+        # Collects rate limit waits and retries of this task's LLM calls
+        limiter_stats = track_task()
+        browser = None  # Initialize browser instance for this task
+        browser_context = None
+        agent = None
+        failover = None
+        request_filter = None
+        slot_acquired = False
+        session_locked = False
+        browser_acquired = False
+        browser_close_failed = False
+        completed = False
+        bind_log_context(task_id=task_id, phase="queued")
+        self.task_started(task_id)
+        try:
+            logger.info(f"Starting background task ID {task_id}: {task}")
+
+            # Create and add the task record with status 'queued'
+            async with self.task_lock:
+                task_record = self.TaskEntry(
+                    id=task_id,
+                    task=task,
+                    status=TaskStatus.QUEUED,
+                    start_time=time.time(),
+                    session_id=session.id if session else None,
+                    parent_id=parent_id,
+                    storage_profile=request.storage_profile,
+                    vision=vision_policy,
+                    request_filter=filter_level
+                )
+                self.task_records[task_id] = task_record
+            await self.evict_task_records()
+            if request.storage_profile and self.storage_profiles is None:
+                raise RuntimeError("Storage profiles are disabled; set STORAGE_PROFILE_KEY to enable them")
+
+            queued_at = time.monotonic()
+            if session is not None:
+                # Waits for the session's earlier tasks before taking a slot
+                await session.lock.acquire()
+                session_locked = True
+                if session.closed:
+                    raise SessionClosedError(f"Session {session.id} was closed")
+            # Waits for a slot under the adaptive concurrency limit
+            await self.concurrency.acquire()
+            slot_acquired = True
+            # Queued tasks do not start once shutdown began
+            self.supervisor.begin(task_id)
+            async with self.task_lock:
+                task_record.status = TaskStatus.RUNNING
+                task_record.queue_seconds = round(time.monotonic() - queued_at, 3)
+
+            bind_log_context(phase="browser")
+            if session is None:
+                # Waits while the shared Chrome instance is being recycled
+                await self.browser_governor.acquire()
+                browser_acquired = True
+
+                # Initialize a new browser instance for this task
+                logger.info(f"Task ID {task_id}: Initializing new browser instance.")
+                browser = self.new_browser()
+                self.supervisor.track(task_id, browser)
+                logger.info(f"Task ID {task_id}: Browser initialized successfully.")
+
+            # Processors applied to the page state before each LLM call
+            dom_pruner = None
+            state_processors = []
+            if self.dom_pruning:
+                dom_pruner = DomPruner(
+                    token_budget=self.dom_token_budget, max_elements=self.dom_max_elements, task_id=task_id
+                )
+                state_processors.append(dom_pruner)
+            # Screenshots are captured by the vision processor, so the Agent itself
+            # runs with use_vision=False
+            vision = VisionProcessor(
+                vision_policy,
+                max_width=self.vision_max_width,
+                target_bytes=self.vision_target_bytes,
+                task_id=task_id,
+            )
+            state_processors.append(vision)
+            if session is None:
+                browser_context = ManagedBrowserContext(
+                    browser=browser,
+                    state_processors=state_processors,
+                    isolated=self.browser_isolated_contexts,
+                )
+                self.supervisor.track(task_id, browser_context)
+                agent_browser, agent_context = browser, browser_context
+            else:
+                # Continues on the session's tabs; the session closes them
+                logger.info(f"Task ID {task_id}: Running in browser session {session.id}.")
+                session.context.begin_task(state_processors)
+                agent_browser, agent_context = session.browser, session.context
+            # Counts traffic even when nothing is blocked, as a baseline, and
+            # answers from the shared HTTP cache
+            request_filter = RequestFilter(
+                self.request_filter_profiles[filter_level],
+                shared_stats=self.request_filter_stats,
+                task_id=task_id,
+                http_cache=self.http_cache,
+            )
+            await agent_context.set_request_filter(request_filter)
+            if request.storage_profile:
+                storage_state = await asyncio.to_thread(self.storage_profiles.load, request.storage_profile)
+                async with self.task_lock:
+                    task_record.storage_restored = storage_state is not None
+                if storage_state is not None:
+                    # Applied when the browser opens, so the agent starts logged in
+                    await agent_context.restore_storage_state(storage_state)
+                    logger.info(f"Task ID {task_id}: Restoring storage profile {request.storage_profile}.")
+            controller = Controller()
+            vision.register_actions(controller)
+            extractor = ParallelExtractor(
+                self.parallel_extract_max_tabs,
+                self.parallel_extract_timeout_seconds,
+                max_urls=self.parallel_extract_max_urls,
+                max_chars=self.parallel_extract_max_chars,
+            )
+            extractor.register_actions(controller)
+
+            # Initialize and run the Agent with the new browser instance.
+            # cache=False explicitly disables LangChain caching for this LLM.
+            cache = self.llm_cache if (request.use_cache and self.llm_cache is not None) else False
+            # Falls back to the LLM_FALLBACKS providers when the main model fails or is too slow
+            llm = failover = self.build_failover_llm(cache, task_id)
+            router = None
+            if self.model_routing:
+                llm = router = ModelRouter(
+                    fast=self.build_llm(self.fast_model, cache),
+                    strong=llm,
+                    planning_steps=self.router_planning_steps,
+                    sticky_steps=self.router_sticky_steps,
+                    shared_stats=self.router_stats,
+                    task_id=task_id,
+                )
+            llm = self.wrap_agent_llm(llm, task_id, started_at)
+            agent = Agent(
+                task=task,
+                llm=llm,
+                browser=agent_browser,
+                browser_context=agent_context,
+                controller=controller,
+                use_vision=False
+            )
+            logger.info(f"Task ID {task_id}: Agent initialized. Running task.")
+            bind_log_context(phase="agent")
+            result, summary, replayed = await self.run_agent(task_id, task, agent, request.replay)
+            if cache:
+                logger.info(f"Task ID {task_id}: LLM cache stats {self.llm_cache.stats()}")
+
+            bind_log_context(phase="finalize")
+            # Keep only the final answer and a few facts on the record; the full
+            # history is stored as a blob (see GET /tasks/{task_id}/history)
+            history_handle = await self.store_history(task_id, result)
+            self.request_filter_stats.record_task(request_filter, agent_context.step_metrics)
+            result_text, result_handle, result_size = await self.offload_result(task_id, summary.final_result)
+            storage_saved = False
+            if request.storage_profile and request.save_storage and summary.is_done:
+                storage_saved = await self.save_storage_profile(task_id, request.storage_profile, agent_context)
+
+            # Update the task record with status 'completed'
+            async with self.task_lock:
+                record = self.task_records.get(task_id)
+                if record is not None:
+                    record.status = TaskStatus.COMPLETED
+                    record.end_time = time.time()
+                    record.duration = record.end_time - record.start_time
+                    record.result = result_text
+                    record.result_handle = result_handle
+                    record.result_size = result_size
+                    record.is_done = summary.is_done
+                    record.steps = summary.steps
+                    record.urls = summary.urls
+                    record.step_errors = summary.errors
+                    record.history_handle = history_handle
+                    record.replayed = replayed
+                    record.storage_saved = storage_saved
+                    record.dom_tokens_saved = dom_pruner.tokens_saved if dom_pruner else None
+                    record.screenshot_bytes = vision.bytes_sent
+                    record.parallel_extract = extractor.snapshot() if extractor.calls else None
+                    record.step_metrics = agent_context.step_metrics
+                    record.network = request_filter.snapshot()
+                    record.rate_limit_wait_seconds = round(limiter_stats.wait_seconds + limiter_stats.backoff_seconds, 3)
+                    record.llm_retries = limiter_stats.retries
+                    record.provider = failover.last_provider
+                    record.provider_calls = dict(failover.calls)
+                    record.model_calls = router.stats.snapshot() if router else None
+                    self.finish_record(record, llm)
+            completed = True
+
+        except asyncio.CancelledError:
+            logger.warning(f"Task ID {task_id}: Interrupted by server shutdown.")
+            # Checkpoint the steps taken so far
+            history_handle = await self.store_history(task_id, agent.history) if agent else None
+            async with self.task_lock:
+                record = self.task_records.get(task_id)
+                if record is not None:
+                    record.status = TaskStatus.FAILED
+                    record.end_time = time.time()
+                    record.duration = record.end_time - record.start_time
+                    record.history_handle = history_handle
+                    record.error = "Interrupted by server shutdown"
+            raise
+
+        except Exception as e:
+            # The traceback is formatted by the logging thread
+            logger.error(f"Error in background task ID {task_id}: {e}", exc_info=True)
+
+            # Update the task record with status 'failed'
+            async with self.task_lock:
+                record = self.task_records.get(task_id)
+                if record is not None:
+                    record.status = TaskStatus.FAILED
+                    record.end_time = time.time()
+                    record.duration = record.end_time - record.start_time
+                    record.error = str(e)
+                    record.network = request_filter.snapshot() if request_filter else None
+                    record.rate_limit_wait_seconds = round(limiter_stats.wait_seconds + limiter_stats.backoff_seconds, 3)
+                    record.llm_retries = limiter_stats.retries
+                    if failover:
+                        record.provider = failover.last_provider
+                        record.provider_calls = dict(failover.calls)
+        finally:
+            bind_log_context(phase="cleanup")
+            self.task_finished(task_id)
+            # Ensure that the context and browser are closed in case of failure or success
+            if browser_context:
+                try:
+                    await browser_context.close()
+                except Exception as close_e:
+                    logger.error(f"Task ID {task_id}: Error closing browser context: {close_e}")
+            if browser:
+                try:
+                    logger.info(f"Task ID {task_id}: Closing browser instance.")
+                    await browser.close()
+                    logger.info(f"Task ID {task_id}: Browser instance closed successfully.")
+                except Exception as close_e:
+                    logger.error(f"Task ID {task_id}: Error closing browser: {close_e}", exc_info=True)
+                    browser_close_failed = True
+            self.supervisor.untrack(task_id)
+            if session is not None and request_filter is not None:
+                # The session's tabs stay open; stop filtering them for this task
+                try:
+                    await session.context.set_request_filter(None)
+                except Exception as e:
+                    logger.warning(f"Task ID {task_id}: Error detaching request filter: {e}")
+            if session_locked:
+                session.lock.release()
+            if session is not None:
+                session.task_done()
+            if browser_acquired:
+                await self.browser_governor.release(close_failed=browser_close_failed)
+            if slot_acquired:
+                await self.concurrency.release(ok=completed)
+
+    def blob_response(self, handle: str, request: Request, media_type: str) -> StreamingResponse:
+        """
+        Streams a blob from the result store, as raw gzip when the client accepts it.
+        """
+        if not self.result_store.exists(handle):
+            raise HTTPException(status_code=404, detail=f"Blob {handle} is missing")
+
+        if accepts_encoding(request.headers.get("accept-encoding"), "gzip"):
+            return StreamingResponse(
+                self.result_store.iter_compressed(handle),
+                media_type=media_type,
+                headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"},
+            )
+        return StreamingResponse(
+            self.result_store.iter_decompressed(handle),
+            media_type=media_type,
+            headers={"Vary": "Accept-Encoding"},
+        )
+
+    # ----------------------------
+    # Endpoints
+    # ----------------------------
+
+    def add_routes(self, app: FastAPI) -> None:
+        record_model = self.record_model
+
+        @app.post("/run", response_model=TaskResponse)
+        async def run_task_post(request: TaskRequest):
+            """
+            POST Endpoint to run the AI agent with a specified task.
+
+            - **task**: The task description for the AI agent.
+            """
+            logger.info(f"Received task via POST: {request.task}")
+
+            if not self.supervisor.accepting:
+                raise HTTPException(status_code=503, detail="Server is shutting down")
+
+            self.start_task(await self.next_task_id(), request)
+
+            # Respond immediately
+            return TaskResponse(result="Task is being processed.")
+
+        @app.get("/run", response_model=TaskResponse)
+        async def run_task_get(
+            task: str = Query(..., description="The task description for the AI agent."),
+            use_cache: bool = Query(True, description="Set to false to bypass the LLM response cache."),
+            replay: bool = Query(False, description="Replay a recorded action trace for this task, if one exists."),
+            vision: Optional[VisionPolicy] = Query(None, description="Screenshot policy: off, on_demand or always."),
+            request_filter: Optional[FilterLevel] = Query(None, description="Request filter profile: off, trackers, lean or text."),
+            storage_profile: Optional[str] = Query(None, pattern=PROFILE_NAME_PATTERN, description="Storage profile to start from."),
+            save_storage: bool = Query(True, description="Set to false to leave the storage profile unchanged."),
+            fan_out: bool = Query(False, description="Split into independent subtasks run in parallel."),
+        ):
+            """
+            GET Endpoint to run the AI agent with a specified task.
+
+            - **task**: The task description for the AI agent.
+            - **use_cache**: (Optional) Set to false to bypass the LLM response cache.
+            - **replay**: (Optional) Replay a recorded action trace for this task, if one exists.
+            - **vision**: (Optional) Screenshot policy: 'off', 'on_demand' or 'always'.
+            - **request_filter**: (Optional) Request filter profile: 'off', 'trackers', 'lean' or 'text'.
+            - **storage_profile**: (Optional) Saved cookies and localStorage to start from; saved back when the task is done.
+            - **save_storage**: (Optional) Set to false to leave the storage profile unchanged.
+            - **fan_out**: (Optional) Split into independent subtasks run in parallel, with results merged.
+            """
+            logger.info(f"Received task via GET: {task}")
+
+            if not self.supervisor.accepting:
+                raise HTTPException(status_code=503, detail="Server is shutting down")
+
+            request = TaskRequest(
+                task=task,
+                use_cache=use_cache,
+                replay=replay,
+                vision=vision,
+                request_filter=request_filter,
+                storage_profile=storage_profile,
+                save_storage=save_storage,
+                fan_out=fan_out,
+            )
+            self.start_task(await self.next_task_id(), request)
+
+            # Respond immediately
+            return TaskResponse(result="Task is being processed.")
+
+        @app.post("/sessions")
+        async def create_session():
+            """
+            POST Endpoint to open a browser session. Tasks submitted to
+            /sessions/{session_id}/run run one after the other on its browser and tabs.
+            """
+            if not self.supervisor.accepting:
+                raise HTTPException(status_code=503, detail="Server is shutting down")
+            try:
+                session = await self.sessions.create()
+            except SessionLimitError as e:
+                raise HTTPException(status_code=429, detail=str(e))
+            return session.snapshot()
+
+        @app.post("/sessions/{session_id}/run", response_model=SessionTaskResponse)
+        async def run_session_task(session_id: str, request: TaskRequest):
+            """
+            POST Endpoint to run a task in a browser session, after the tasks
+            submitted to it before. Takes the same body as POST /run.
+
+            - **task**: The task description for the AI agent.
+            """
+            logger.info(f"Received task for session {session_id}: {request.task}")
+
+            if not self.supervisor.accepting:
+                raise HTTPException(status_code=503, detail="Server is shutting down")
+            session = self.sessions.get(session_id)
+            if session is None:
+                raise HTTPException(status_code=404, detail="Session not found")
+
+            task_id = await self.next_task_id()
+            try:
+                session.submit(task_id)
+            except SessionClosedError as e:
+                raise HTTPException(status_code=409, detail=str(e))
+
+            # Start the task; it waits for the session's earlier tasks
+            self.start_task(task_id, request, session)
+
+            # Respond immediately
+            return SessionTaskResponse(result="Task is being processed.", session_id=session_id, task_id=task_id)
+
+        @app.get("/sessions")
+        async def get_sessions():
+            """
+            GET Endpoint to retrieve the open browser sessions with their task IDs,
+            pending tasks and idle time.
+            """
+            return self.sessions.snapshot()
+
+        @app.delete("/sessions/{session_id}")
+        async def close_session(session_id: str):
+            """
+            DELETE Endpoint to close a browser session. Tasks already submitted to it
+            still run; its browser is closed after the last one.
+            """
+            session = self.sessions.close(session_id)
+            if session is None:
+                raise HTTPException(status_code=404, detail="Session not found")
+            return session.snapshot()
+
+        @app.get("/storageProfiles")
+        async def get_storage_profiles():
+            """
+            GET Endpoint to list the saved storage profiles with when they were
+            saved and expire. Their contents are not returned.
+            """
+            if self.storage_profiles is None:
+                return {"enabled": False, "profiles": []}
+            profiles = await asyncio.to_thread(self.storage_profiles.list)
+            return {"enabled": True, "ttl_seconds": self.storage_profiles.ttl_seconds, "profiles": profiles}
+
+        @app.delete("/storageProfiles/{name}")
+        async def delete_storage_profile(name: str):
+            """
+            DELETE Endpoint to delete a saved storage profile, e.g. after logging out.
+            """
+            if self.storage_profiles is None:
+                raise HTTPException(status_code=404, detail="Storage profiles are disabled")
+            try:
+                deleted = await asyncio.to_thread(self.storage_profiles.delete, name)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if not deleted:
+                raise HTTPException(status_code=404, detail="Storage profile not found")
+            return {"deleted": name}
+
+        @app.get("/lastResponses", response_model=List[record_model])
+        async def get_last_responses(
+            request: Request,
+            limit: Optional[int] = Query(100, description="Maximum number of task records to return"),
+            status: Optional[TaskStatus] = Query(None, description="Filter by task status")
+        ):
+            """
+            GET Endpoint to retrieve the last task responses.
+
+            - **limit**: The maximum number of task records to return (default: 100).
+            - **status**: (Optional) Filter tasks by status ('queued', 'running', 'completed', 'failed').
+
+            Returns a list of task records in descending order of task ID.
+            The body is gzip/brotli compressed when the client sends Accept-Encoding.
+            """
+            async with self.task_lock:
+                filtered_tasks = list(self.task_records.values())
+                if status:
+                    filtered_tasks = [task for task in filtered_tasks if task.status == status]
+                # Sort and limit
+                sorted_tasks = sorted(filtered_tasks, key=lambda x: x.id, reverse=True)[:limit]
+                # Encode while holding the lock so running records are not mutated mid-write
+                body = self.record_encoder.encode_list(sorted_tasks)
+            return negotiated_response(body, request.headers.get("accept-encoding"), cache=self.last_responses_compressed)
+
+        @app.get("/tasks/{task_id}/result")
+        async def get_task_result(task_id: int, request: Request):
+            """
+            GET Endpoint to retrieve the full result of a task.
+
+            Offloaded results are streamed from the blob store, as raw gzip when the
+            client accepts it.
+            """
+            async with self.task_lock:
+                record = self.task_records.get(task_id)
+                if record is None:
+                    raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+                result, result_handle = record.result, record.result_handle
+
+            if result_handle is None:
+                if result is None:
+                    raise HTTPException(status_code=404, detail=f"Task {task_id} has no result")
+                return PlainTextResponse(result)
+
+            return self.blob_response(result_handle, request, "text/plain; charset=utf-8")
+
+        @app.get("/tasks/{task_id}/history")
+        async def get_task_history(task_id: int, request: Request):
+            """
+            GET Endpoint to retrieve the full step-by-step agent history of a task as JSON.
+            """
+            async with self.task_lock:
+                record = self.task_records.get(task_id)
+                if record is None:
+                    raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+                history_handle = record.history_handle
+
+            if history_handle is None:
+                raise HTTPException(status_code=404, detail=f"Task {task_id} has no stored history")
+            return self.blob_response(history_handle, request, "application/json")
+
+        @app.get("/routerStats")
+        async def get_router_stats():
+            """
+            GET Endpoint to retrieve model routing counters aggregated over all tasks:
+            calls and average latency per tier, routing reasons and escalations.
+            """
+            return {
+                "enabled": self.model_routing,
+                "fast_model": self.fast_model,
+                "strong_model": self.llm_model,
+                **self.router_stats.snapshot(),
+            }
+
+        @app.get("/browserStats")
+        async def get_browser_stats():
+            """
+            GET Endpoint to retrieve Chrome process metrics: RSS and CPU of the process
+            tree, tasks served since the last restart, recycles and orphans killed.
+            """
+            return self.browser_governor.snapshot()
+
+        @app.get("/requestFilter")
+        async def get_request_filter():
+            """
+            GET Endpoint to retrieve the request filter profiles and, per profile,
+            requests and bytes loaded and blocked and the average step and state
+            timings of its tasks.
+            """
+            return {
+                "default": self.request_filter_profile,
+                "blocks": {
+                    level: {"types": sorted(profile.block_types), "domains": len(profile.block_domains)}
+                    for level, profile in self.request_filter_profiles.items()
+                },
+                **self.request_filter_stats.snapshot(),
+            }
+
+        @app.get("/httpCache")
+        async def get_http_cache():
+            """
+            GET Endpoint to retrieve the shared HTTP cache: entries, size, hit
+            ratio, bytes saved, stores and evictions. Task records carry their own
+            cache counters in `network`.
+            """
+            if self.http_cache is None:
+                return {"enabled": False, "isolated_contexts": self.browser_isolated_contexts}
+            return {"enabled": True, "isolated_contexts": self.browser_isolated_contexts, **self.http_cache.stats()}
+
+        @app.get("/concurrency")
+        async def get_concurrency():
+            """
+            GET Endpoint to retrieve the adaptive concurrency limit, running and
+            waiting tasks, the latest load signals and recent limit changes with
+            their reasons.
+            """
+            return self.concurrency.snapshot()
+
+        @app.get("/rateLimits")
+        async def get_rate_limits():
+            """
+            GET Endpoint to retrieve the LLM rate limiters per provider and model:
+            configured limits, calls, throttled calls, time waited, tokens used and
+            retried errors by status code.
+            """
+            return self.rate_limits.snapshot()
+
+        @app.get("/providers")
+        async def get_providers():
+            """
+            GET Endpoint to retrieve the provider failover chain, the circuit
+            breaker state of each provider and the hedging counters.
+            """
+            return {
+                "primary": self.llm_model,
+                "fallbacks": [f"{provider}:{model}" for provider, model in self.llm_fallbacks],
+                "call_timeout": self.call_timeout,
+                "breakers": self.breakers.snapshot(),
+                "hedging": {
+                    "enabled": self.llm_hedging,
+                    "hedge_provider": ":".join(self.llm_hedge_provider[0]) if self.llm_hedge_provider else None,
+                    **self.hedging.snapshot(),
+                },
+            }
+
+        @app.get("/")
+        def read_root():
+            return {
+                "message": "AI Agent API with BrowserUse is running. Use the /run endpoint with a 'task' field in the POST request body or as a query parameter in a GET request to execute tasks."
+            }
@@ -0,0 +1,183 @@
+"""
+Content-addressed, gzip-compressed blob storage on local disk.
+
+Large task results are written here instead of being kept inline on the task
+record. Blobs are named by the SHA-256 of their uncompressed bytes, so storing
+the same result twice costs nothing, and are sharded into two-character
+subdirectories to keep directory listings short.
+
+With `max_bytes` set, the least recently read or written blobs are deleted
+once the store grows past it, so a long-running server's disk use stays
+bounded. Handles of deleted blobs simply stop resolving (see `exists`).
+"""
+
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BlobStore:
+    """
+    Stores and streams gzip-compressed blobs under `root`, keeping at most
+    `max_bytes` of them on disk (0 for no limit).
+    """
+
+    def __init__(self, root: str, compresslevel: int = 6, max_bytes: int = 0):
+        self.root = root
+        self.compresslevel = compresslevel
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # path -> (compressed size, last access time)
+        self._index: Dict[str, Tuple[int, float]] = {}
+        self._total_bytes = 0
+        self._load_index()
+
+    def _load_index(self) -> None:
+        if not os.path.isdir(self.root):
+            return
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".gz"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                self._index[path] = (stat.st_size, stat.st_mtime)
+                self._total_bytes += stat.st_size
+
+    def _path(self, digest: str) -> str:
+        if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+            raise ValueError(f"Invalid blob handle: {digest}")
+        return os.path.join(self.root, digest[:2], f"{digest}.gz")
+
+    def put(self, data: bytes) -> str:
+        """
+        Stores `data` and returns its handle (hex SHA-256 digest).
+        Blocking; call through asyncio.to_thread from async code.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if os.path.exists(path):
+            self._touch(path)
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(
+                fileobj=raw, mode="wb", compresslevel=self.compresslevel, mtime=0
+            ) as gz:
+                gz.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            previous = self._index.get(path)
+            if previous:
+                self._total_bytes -= previous[0]
+            size = os.path.getsize(path)
+            self._index[path] = (size, time.time())
+            self._total_bytes += size
+            self._evict_locked(keep=path)
+        return digest
+
+    def _touch(self, path: str) -> None:
+        with self._lock:
+            entry = self._index.get(path)
+            if entry:
+                self._index[path] = (entry[0], time.time())
+
+    def _evict_locked(self, keep: str) -> None:
+        if not self.max_bytes or self._total_bytes <= self.max_bytes:
+            return
+        # Least recently used first
+        for path, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            del self._index[path]
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def delete(self, digests: Iterable[str]) -> int:
+        """
+        Deletes blobs, e.g. those of evicted task records. Returns how many
+        existed.
+        """
+        deleted = 0
+        for digest in digests:
+            path = self._path(digest)
+            with self._lock:
+                entry = self._index.pop(path, None)
+                if entry:
+                    self._total_bytes -= entry[0]
+            try:
+                os.remove(path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        return deleted
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+
+    def get(self, digest: str) -> bytes:
+        """
+        Returns the uncompressed bytes of a blob.
+        """
+        path = self._path(digest)
+        self._touch(path)
+        with gzip.open(path, "rb") as f:
+            return f.read()
+
+    def iter_compressed(self, digest: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Yields the raw gzip bytes of a blob, for clients that accept gzip.
+        """
+        path = self._path(digest)
+        self._touch(path)
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def iter_decompressed(self, digest: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Yields the uncompressed bytes of a blob without loading it all into memory.
+        """
+        path = self._path(digest)
+        self._touch(path)
+        with gzip.open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def stats(self) -> dict:
+        return {
+            "blobs": len(self._index),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
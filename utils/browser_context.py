@@ -0,0 +1,196 @@
+"""
+BrowserContext with a pluggable state-processing stage.
+
+The agent calls `browser_context.get_state()` once per step and turns the
+result into the LLM prompt. ManagedBrowserContext runs every configured
+state processor over that state first, so the servers can shrink or rewrite
+what the model sees without patching browser-use. It also keeps one metrics
+dict per step that processors can add to, and can restore and capture a
+storage state (cookies, localStorage and the current URL, see
+utils/storage_profiles.py) and filter network requests (see
+utils/request_filtering.py).
+"""
+
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Protocol, Sequence
+
+from browser_use.browser.browser import Browser
+from browser_use.browser.context import BrowserContext, BrowserContextConfig
+from browser_use.browser.views import BrowserState
+from playwright.async_api import BrowserContext as PlaywrightBrowserContext
+
+logger = logging.getLogger(__name__)
+
+
+class _WithoutDefaultContext:
+    """
+    A Playwright browser whose existing contexts are hidden, so that
+    BrowserContext creates a new one instead of reusing the default context
+    of a Chrome instance it connected to.
+    """
+
+    contexts = ()
+
+    def __init__(self, browser):
+        self._browser = browser
+
+    def __getattr__(self, name: str):
+        return getattr(self._browser, name)
+
+# Sets the saved localStorage items of the page's origin, leaving items the
+# site has written since untouched
+RESTORE_LOCAL_STORAGE_SCRIPT = """
+(origins => {
+    try {
+        const items = origins[window.location.origin];
+        if (!items) return;
+        for (const item of items) {
+            if (window.localStorage.getItem(item.name) === null) {
+                window.localStorage.setItem(item.name, item.value);
+            }
+        }
+    } catch (e) {}
+})(%s);
+"""
+
+
+class StateProcessor(Protocol):
+    async def process(self, state: BrowserState, context: "ManagedBrowserContext") -> BrowserState:
+        ...
+
+
+class ManagedBrowserContext(BrowserContext):
+    """
+    BrowserContext that passes each step's state through `state_processors`.
+    A processor that raises is logged and skipped for that step.
+
+    With `isolated`, the context gets its own cookies and storage even when
+    the browser is a shared Chrome instance connected over CDP, whose default
+    context browser-use would otherwise reuse.
+
+    `step_metrics` holds one dict per step: `state_seconds` is the time spent
+    building the state, `step_seconds` the time until the next state was
+    requested (LLM call plus actions).
+
+    `replaying` is set while a recorded action trace is replayed; processors
+    that rewrite the DOM tree leave states unchanged then.
+    """
+
+    def __init__(
+        self,
+        browser: Browser,
+        config: Optional[BrowserContextConfig] = None,
+        state_processors: Sequence[StateProcessor] = (),
+        isolated: bool = False,
+    ):
+        super().__init__(browser=browser, config=config or browser.config.new_context_config)
+        self.state_processors = list(state_processors)
+        self.isolated = isolated
+        self.step_metrics: List[Dict[str, Any]] = []
+        self.replaying = False
+        self._last_state_at: Optional[float] = None
+        self.storage_state: Optional[Dict[str, Any]] = None
+        self.request_filter = None
+
+    async def set_request_filter(self, request_filter) -> None:
+        """
+        Filters requests with `request_filter` (a RequestFilter): right away
+        when the context is already open, otherwise when it is created.
+        Detaches the previous one; None stops filtering.
+        """
+        if self.request_filter is not None:
+            await self.request_filter.detach()
+        self.request_filter = request_filter
+        if request_filter is not None and self.session is not None:
+            await request_filter.attach(self.session.context)
+
+    async def restore_storage_state(self, state: Dict[str, Any]) -> None:
+        """
+        Restores a captured storage state and opens its URL: right away when
+        the context is already open, otherwise when it is created.
+        """
+        if self.session is None:
+            self.storage_state = state
+            return
+        await self._apply_storage_state(self.session.context, state)
+        await self._open_storage_url(state)
+
+    async def capture_storage_state(self) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cookies and localStorage of the context and the URL of
+        the current page, or None when the browser was never opened.
+        """
+        if self.session is None:
+            return None
+        state = await self.session.context.storage_state()
+        state["url"] = self.session.current_page.url
+        return state
+
+    async def _apply_storage_state(self, context: PlaywrightBrowserContext, state: Dict[str, Any]) -> None:
+        if state.get("cookies"):
+            await context.add_cookies(state["cookies"])
+        origins = {
+            origin["origin"]: origin["localStorage"]
+            for origin in state.get("origins", [])
+            if origin.get("localStorage")
+        }
+        if origins:
+            await context.add_init_script(RESTORE_LOCAL_STORAGE_SCRIPT % json.dumps(origins))
+
+    async def _open_storage_url(self, state: Dict[str, Any]) -> None:
+        url = state.get("url")
+        if not url or not url.startswith(("http://", "https://")):
+            return
+        try:
+            await self.session.current_page.goto(url)
+            await self.session.current_page.wait_for_load_state()
+        except Exception as e:
+            logger.warning(f"Could not open the restored page {url}: {e}")
+
+    async def _create_context(self, browser):
+        context = await super()._create_context(_WithoutDefaultContext(browser) if self.isolated else browser)
+        if self.request_filter is not None:
+            await self.request_filter.attach(context)
+        if self.storage_state:
+            await self._apply_storage_state(context, self.storage_state)
+        return context
+
+    async def _initialize_session(self):
+        session = await super()._initialize_session()
+        if self.storage_state:
+            await self._open_storage_url(self.storage_state)
+        return session
+
+    def begin_task(self, state_processors: Sequence[StateProcessor]) -> None:
+        """
+        Prepares a context that is kept open across tasks (see
+        utils/browser_sessions.py) for the next one: its processors replace
+        the previous task's and step metrics start over. Tabs and page state
+        are left as they are.
+        """
+        self.state_processors = list(state_processors)
+        self.step_metrics = []
+        self._last_state_at = None
+
+    @property
+    def current_metrics(self) -> Dict[str, Any]:
+        return self.step_metrics[-1] if self.step_metrics else {}
+
+    async def get_state(self, use_vision: bool = False) -> BrowserState:
+        started = time.monotonic()
+        if self._last_state_at is not None and self.step_metrics:
+            self.step_metrics[-1]["step_seconds"] = round(started - self._last_state_at, 3)
+        self.step_metrics.append({"step": len(self.step_metrics) + 1})
+
+        state = await super().get_state(use_vision=use_vision)
+        for processor in self.state_processors:
+            try:
+                state = await processor.process(state, self)
+            except Exception as e:
+                logger.warning(f"State processor {type(processor).__name__} failed: {e}")
+
+        self._last_state_at = time.monotonic()
+        self.current_metrics["state_seconds"] = round(self._last_state_at - started, 3)
+        return state
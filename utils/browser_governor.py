@@ -0,0 +1,400 @@
+"""
+Chrome process launching, monitoring and recycling.
+
+Every task connects to one shared Chrome instance over CDP, and
+`Browser.close()` only disconnects. That Chrome process therefore lives as
+long as the server and its memory grows with every task. BrowserGovernor:
+
+- launches that Chrome itself, with its own profile directory and its own
+  remote debugging port, and tracks its PID;
+- samples the RSS and CPU of its process tree;
+- recycles it after `max_tasks` tasks or once it uses more than
+  `max_rss_mb`: new tasks wait, and as soon as no task is using the browser
+  the whole tree is terminated so the next task launches a fresh one. Open
+  browser sessions use it too, for as long as they are open; while one is,
+  the recycle waits for it to close and new tasks are not held back, since
+  they could not make it happen sooner;
+- optionally kills orphaned helper processes of that Chrome (renderer, GPU
+  and utility processes still running after their browser process is gone),
+  e.g. after a failed close;
+- reports all of this through `snapshot()`.
+
+Only a Chrome the governor launched is ever terminated. Without
+`chrome_path` the server attaches to a Chrome started by someone else (see
+BROWSER_CDP_URL), and the governor only counts tasks.
+
+Process inspection needs `psutil`; without it the governor only counts
+tasks and never recycles.
+"""
+
+import asyncio
+import logging
+import os
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover - optional dependency
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+CHROME_FLAGS = ("--no-first-run", "--no-default-browser-check")
+
+
+def _debugger_answers(url: str) -> bool:
+    try:
+        with urllib.request.urlopen(f"{url}/json/version", timeout=1) as response:
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+class BrowserGovernor:
+    """
+    One instance per server. Tasks call `acquire()` before they connect to
+    the browser at `cdp_url` and `release()` after they closed it; browser
+    sessions pass `session=True` to both.
+
+    `chrome_path` returns the Chrome executable to launch; None attaches to
+    an existing Chrome that is left alone. `max_tasks` and `max_rss_mb` of 0
+    disable that recycling trigger.
+    """
+
+    def __init__(
+        self,
+        chrome_path: Optional[Callable[[], str]] = None,
+        debug_port: int = 9223,
+        profile_dir: str = "chrome_profile",
+        max_tasks: int = 50,
+        max_rss_mb: float = 4096,
+        sample_seconds: float = 15.0,
+        kill_orphans: bool = False,
+        launch_timeout: float = 20.0,
+    ):
+        self.chrome_path = chrome_path
+        self.debug_port = debug_port
+        self.profile_dir = profile_dir
+        self.launch_timeout = launch_timeout
+        self.max_tasks = max_tasks
+        self.max_rss_mb = max_rss_mb
+        self.sample_seconds = sample_seconds
+        self.kill_orphans = kill_orphans
+        self.active_tasks = 0
+        self.active_sessions = 0
+        self.tasks_served = 0  # Since the current Chrome process started
+        self.recycle_reason: Optional[str] = None
+        self.recycles: Dict[str, int] = defaultdict(int)
+        self.orphans_killed = 0
+        self.pid: Optional[int] = None
+        self.processes = 0
+        self.rss_mb = 0.0
+        self.peak_rss_mb = 0.0
+        self.cpu_percent = 0.0
+        self.sampled_at: Optional[float] = None
+        self._condition = asyncio.Condition()
+        # Kept between samples: cpu_percent() measures since the previous call
+        self._process_cache: Dict[int, "psutil.Process"] = {}
+        # Helpers of the launched Chrome seen at the last sample, by PID
+        self._helpers: Dict[int, "psutil.Process"] = {}
+        self._popen: Optional[subprocess.Popen] = None
+        self._browser: Optional["psutil.Process"] = None
+        self._sampler: Optional[asyncio.Task] = None
+
+    @property
+    def managed(self) -> bool:
+        """Whether the governor launches (and may terminate) Chrome."""
+        return self.chrome_path is not None
+
+    @property
+    def enabled(self) -> bool:
+        return self.managed and psutil is not None
+
+    @property
+    def cdp_url(self) -> str:
+        return f"http://127.0.0.1:{self.debug_port}"
+
+    # Blocking process control and inspection; called through asyncio.to_thread
+
+    def _running(self) -> bool:
+        return self._popen is not None and self._popen.poll() is None
+
+    def launch(self) -> int:
+        """
+        Starts Chrome with its own profile and debugging port and waits until
+        it accepts CDP connections. Returns its PID.
+        """
+        if _debugger_answers(self.cdp_url):
+            # Never adopt a browser the governor did not start
+            raise RuntimeError(
+                f"Port {self.debug_port} is already used by another browser; "
+                "set BROWSER_DEBUG_PORT to a free port, or BROWSER_CDP_URL to attach to it"
+            )
+        os.makedirs(self.profile_dir, exist_ok=True)
+        command = [
+            self.chrome_path(),
+            f"--remote-debugging-port={self.debug_port}",
+            f"--user-data-dir={os.path.abspath(self.profile_dir)}",
+            *CHROME_FLAGS,
+        ]
+        self._popen = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + self.launch_timeout
+        while not _debugger_answers(self.cdp_url):
+            if self._popen.poll() is not None:
+                raise RuntimeError(f"Chrome exited with code {self._popen.returncode} on launch")
+            if time.monotonic() > deadline:
+                self._terminate_launched()
+                raise RuntimeError(f"Chrome did not open port {self.debug_port} within {self.launch_timeout}s")
+            time.sleep(0.1)
+        self.pid = self._popen.pid
+        self._browser = psutil.Process(self.pid) if psutil is not None else None
+        self.peak_rss_mb = 0.0
+        logger.info(f"Launched Chrome (PID {self.pid}) on port {self.debug_port} with profile {self.profile_dir}.")
+        return self.pid
+
+    def _terminate_launched(self) -> None:
+        """Stops the launched Chrome without psutil; it closes its own helpers."""
+        if self._popen is None:
+            return
+        self._popen.terminate()
+        try:
+            self._popen.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._popen.kill()
+            self._popen.wait()
+
+    def _process_tree(self) -> List["psutil.Process"]:
+        if self._browser is None or not self._running():
+            return []
+        try:
+            return [self._browser] + self._browser.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return []
+
+    def sample(self) -> None:
+        tree = self._process_tree()
+        rss = 0
+        cpu = 0.0
+        cache = {}
+        for proc in tree:
+            proc = self._process_cache.get(proc.pid, proc)
+            try:
+                with proc.oneshot():
+                    rss += proc.memory_info().rss
+                    cpu += proc.cpu_percent(None)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            cache[proc.pid] = proc
+        self._process_cache = cache
+        if tree:
+            self._helpers = {proc.pid: proc for proc in tree[1:]}
+
+        self.processes = len(cache)
+        self.rss_mb = round(rss / (1024 * 1024), 1)
+        self.peak_rss_mb = max(self.peak_rss_mb, self.rss_mb)
+        self.cpu_percent = round(cpu, 1)
+        self.sampled_at = time.time()
+
+    def _terminate(self, processes: List["psutil.Process"]) -> int:
+        for proc in processes:
+            try:
+                proc.terminate()
+            except psutil.NoSuchProcess:
+                pass
+        _, alive = psutil.wait_procs(processes, timeout=5)
+        for proc in alive:
+            try:
+                proc.kill()
+            except psutil.NoSuchProcess:
+                pass
+        return len(processes)
+
+    def kill_orphaned(self) -> int:
+        """
+        Kills helpers of the launched Chrome that are still running although
+        they are no longer in its process tree (their browser process exited
+        or was replaced). Only processes seen as its descendants are
+        considered. Returns the number of processes killed.
+        """
+        tree = {proc.pid for proc in self._process_tree()}
+        # is_running() also checks the creation time, so reused PIDs are skipped
+        orphans = [proc for pid, proc in self._helpers.items() if pid not in tree and proc.is_running()]
+        self._helpers = {pid: proc for pid, proc in self._helpers.items() if pid in tree}
+        if orphans:
+            logger.warning(f"Killing {len(orphans)} orphaned Chrome process(es): {[p.pid for p in orphans]}")
+            self._terminate(orphans)
+            self.orphans_killed += len(orphans)
+        return len(orphans)
+
+    def recycle(self) -> int:
+        """
+        Terminates the launched Chrome's process tree. Returns the number of
+        processes.
+        """
+        if not self.managed:
+            return 0
+        if psutil is None:
+            killed = int(self._running())
+            self._terminate_launched()
+        else:
+            tree = self._process_tree()
+            killed = self._terminate(tree) if tree else 0
+        if self._popen is not None:
+            self._popen.poll()  # Reap it
+        self._popen = None
+        self._browser = None
+        self._process_cache = {}
+        self.pid = None
+        self.processes = 0
+        self.rss_mb = 0.0
+        return killed
+
+    # Async API used by the server
+
+    def _recycle_trigger(self) -> Optional[str]:
+        if self.max_tasks and self.tasks_served >= self.max_tasks:
+            return "tasks"
+        if self.max_rss_mb and self.rss_mb >= self.max_rss_mb:
+            return "memory"
+        return None
+
+    async def _check(self) -> None:
+        """
+        Flags a recycle when a threshold is crossed and performs it once no
+        task is using the browser. Call with the condition held.
+        """
+        if not self.enabled:
+            return
+        if self.recycle_reason is None:
+            self.recycle_reason = self._recycle_trigger()
+            if self.recycle_reason:
+                logger.info(
+                    f"Chrome recycle pending ({self.recycle_reason}): {self.tasks_served} tasks, "
+                    f"{self.rss_mb} MB RSS, {self.active_tasks} task(s) still running, "
+                    f"{self.active_sessions} session(s) open."
+                )
+        if self.recycle_reason and self.active_tasks == 0 and self.active_sessions == 0:
+            killed = await asyncio.to_thread(self.recycle)
+            logger.info(f"Recycled Chrome ({self.recycle_reason}): terminated {killed} process(es).")
+            self.recycles[self.recycle_reason] += 1
+            self.recycle_reason = None
+            self.tasks_served = 0
+            self._condition.notify_all()
+
+    async def _ensure_running(self) -> None:
+        """Launches Chrome unless it is running. Call with the condition held."""
+        if self.managed and not self._running():
+            if self._popen is not None:
+                logger.warning(f"Chrome (PID {self.pid}) exited, launching a new one.")
+                await asyncio.to_thread(self.recycle)
+            await asyncio.to_thread(self.launch)
+            self.tasks_served = 0
+
+    async def prelaunch(self) -> None:
+        """
+        Launches the managed Chrome ahead of the first task, which would
+        otherwise wait for it.
+        """
+        async with self._condition:
+            await self._ensure_running()
+
+    def _admits(self) -> bool:
+        # With a session open the recycle waits for it anyway, so holding new
+        # tasks back would only stall them (and the concurrency slots they hold)
+        return self.recycle_reason is None or self.active_sessions > 0
+
+    async def acquire(self, session: bool = False) -> None:
+        """
+        Waits while a recycle is pending and can go ahead once the running
+        tasks finished, then counts the caller as a task (or session) using
+        the browser.
+        """
+        async with self._condition:
+            await self._condition.wait_for(self._admits)
+            await self._ensure_running()
+            if session:
+                self.active_sessions += 1
+            else:
+                self.active_tasks += 1
+
+    async def release(self, close_failed: bool = False, session: bool = False) -> None:
+        """
+        Counts the end of a task (or session) and recycles the browser if it
+        is due. A failed `browser.close()` triggers an orphan sweep.
+        """
+        async with self._condition:
+            if session:
+                self.active_sessions = max(0, self.active_sessions - 1)
+            else:
+                self.active_tasks = max(0, self.active_tasks - 1)
+            self.tasks_served += 1
+            if self.enabled:
+                await asyncio.to_thread(self.sample)
+            await self._check()
+        if close_failed and self.enabled and self.kill_orphans:
+            await asyncio.to_thread(self.kill_orphaned)
+
+    async def _sample_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sample_seconds)
+            try:
+                async with self._condition:
+                    await asyncio.to_thread(self.sample)
+                    await self._check()
+                if self.kill_orphans:
+                    await asyncio.to_thread(self.kill_orphaned)
+            except Exception as e:
+                logger.warning(f"Chrome sampling failed: {e}")
+
+    def start(self) -> None:
+        if not self.managed:
+            logger.info("Attached to an existing Chrome; it is not recycled or terminated.")
+            return
+        if not self.enabled:
+            logger.warning("psutil is not installed; Chrome memory tracking and recycling are disabled.")
+            return
+        self._sampler = asyncio.create_task(self._sample_loop())
+
+    async def close(self) -> None:
+        """
+        Stops sampling and terminates the launched Chrome and, with
+        `kill_orphans`, its orphaned helpers, so nothing it started outlives
+        the server. An attached Chrome is left running.
+        """
+        if self._sampler is not None:
+            self._sampler.cancel()
+            self._sampler = None
+        if not self.managed:
+            return
+        if self.enabled and self.kill_orphans:
+            await asyncio.to_thread(self.sample)
+        killed = await asyncio.to_thread(self.recycle)
+        if self.enabled and self.kill_orphans:
+            killed += await asyncio.to_thread(self.kill_orphaned)
+        logger.info(f"Terminated {killed} Chrome process(es) on shutdown.")
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "managed": self.managed,
+            "cdp_url": self.cdp_url if self.managed else None,
+            "pid": self.pid,
+            "processes": self.processes,
+            "rss_mb": self.rss_mb,
+            "peak_rss_mb": self.peak_rss_mb,
+            "cpu_percent": self.cpu_percent,
+            "sampled_at": self.sampled_at,
+            "active_tasks": self.active_tasks,
+            "active_sessions": self.active_sessions,
+            "tasks_served": self.tasks_served,
+            "max_tasks": self.max_tasks,
+            "max_rss_mb": self.max_rss_mb,
+            "recycle_pending": self.recycle_reason,
+            "recycles": dict(self.recycles),
+            "orphans_killed": self.orphans_killed,
+        }
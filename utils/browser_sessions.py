@@ -0,0 +1,191 @@
+"""
+Long-lived browser sessions that several tasks run in, one after the other.
+
+Without a session every task opens its own browser context and closes it at
+the end, so a follow-up task starts from a blank page and has to log in and
+navigate again. A session keeps one Browser and one ManagedBrowserContext
+open between tasks: tasks submitted to it run sequentially, in submission
+order, on the same tabs, cookies and page state.
+
+SessionManager creates and closes sessions through two callbacks supplied by
+the server, so it does not need to know how browsers are configured or
+accounted for. Closing a session lets its queued tasks finish first. Sessions
+without a task for `idle_seconds` are closed by a background sweep.
+"""
+
+import asyncio
+import logging
+import secrets
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+OpenBrowser = Callable[[], Awaitable[Tuple[Any, Any]]]
+CloseBrowser = Callable[[Any, Any], Awaitable[None]]
+
+
+class SessionLimitError(RuntimeError):
+    """Raised when `max_sessions` sessions are already open."""
+
+
+class SessionClosedError(RuntimeError):
+    """Raised when a task is submitted to a session that is closing."""
+
+
+class BrowserSession:
+    """
+    A browser and context shared by the tasks of one session. Tasks hold
+    `lock` while they use the browser; asyncio.Lock wakes waiters in FIFO
+    order, so they run in the order they were submitted.
+    """
+
+    def __init__(self, session_id: str, browser: Any, context: Any):
+        self.id = session_id
+        self.browser = browser
+        self.context = context
+        self.lock = asyncio.Lock()
+        self.task_ids: List[int] = []
+        self.pending = 0  # Submitted tasks that have not finished yet
+        self.closing = False
+        self.closed = False  # Set once the browser is being closed
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+
+    def submit(self, task_id: int) -> None:
+        if self.closing:
+            raise SessionClosedError(f"Session {self.id} is closing")
+        self.task_ids.append(task_id)
+        self.pending += 1
+        self.last_used = time.monotonic()
+
+    def task_done(self) -> None:
+        self.pending -= 1
+        self.last_used = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "created_at": self.created_at,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1) if not self.pending else 0.0,
+            "running": self.lock.locked(),
+            "pending_tasks": self.pending,
+            "task_ids": list(self.task_ids),
+            "closing": self.closing,
+        }
+
+
+class SessionManager:
+    """
+    One instance per server. `open_browser()` returns a (browser, context)
+    pair for a new session and `close_browser(browser, context)` disposes of
+    it. An `idle_seconds` of 0 keeps idle sessions open until closed.
+    """
+
+    def __init__(
+        self,
+        open_browser: OpenBrowser,
+        close_browser: CloseBrowser,
+        max_sessions: int = 4,
+        idle_seconds: float = 900.0,
+        sweep_seconds: float = 30.0,
+    ):
+        self.open_browser = open_browser
+        self.close_browser = close_browser
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.sweep_seconds = sweep_seconds
+        self.sessions: Dict[str, Optional[BrowserSession]] = {}  # None while being opened
+        self.created = 0
+        self.closed = 0
+        self.expired = 0
+        self._closing: Set[asyncio.Task] = set()
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.idle_seconds and self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    async def create(self) -> BrowserSession:
+        if len(self.sessions) >= self.max_sessions:
+            raise SessionLimitError(f"{self.max_sessions} sessions are already open")
+        # Reserved before the await, so concurrent creates respect the limit
+        session_id = secrets.token_hex(8)
+        self.sessions[session_id] = None
+        try:
+            browser, context = await self.open_browser()
+        except BaseException:
+            del self.sessions[session_id]
+            raise
+        session = self.sessions[session_id] = BrowserSession(session_id, browser, context)
+        self.created += 1
+        logger.info(f"Opened browser session {session_id}.")
+        return session
+
+    def get(self, session_id: str) -> Optional[BrowserSession]:
+        return self.sessions.get(session_id)
+
+    def close(self, session_id: str) -> Optional[BrowserSession]:
+        """
+        Stops the session from accepting tasks and closes it in the
+        background once its queued tasks finished. Returns None for an
+        unknown session.
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        if not session.closing:
+            session.closing = True
+            task = asyncio.create_task(self._close(session))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+        return session
+
+    async def _close(self, session: BrowserSession) -> None:
+        async with session.lock:
+            session.closed = True
+            try:
+                await self.close_browser(session.browser, session.context)
+            except Exception as e:
+                logger.error(f"Error closing browser session {session.id}: {e}")
+            finally:
+                self.sessions.pop(session.id, None)
+                self.closed += 1
+        logger.info(f"Closed browser session {session.id} after {len(session.task_ids)} task(s).")
+
+    async def _sweep(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_seconds)
+            now = time.monotonic()
+            for session in list(self.sessions.values()):
+                if session is None or session.closing or session.pending:
+                    continue
+                if now - session.last_used >= self.idle_seconds:
+                    logger.info(f"Browser session {session.id} idle for {self.idle_seconds:.0f}s, closing it.")
+                    self.expired += 1
+                    self.close(session.id)
+
+    async def close_all(self) -> None:
+        """
+        Closes every session. Called at shutdown, after the supervisor has
+        finished or cancelled the tasks running in them.
+        """
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        for session_id, session in list(self.sessions.items()):
+            if session is not None:
+                self.close(session_id)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "open": sum(1 for session in self.sessions.values() if session is not None),
+            "max_sessions": self.max_sessions,
+            "idle_seconds": self.idle_seconds,
+            "created": self.created,
+            "closed": self.closed,
+            "expired": self.expired,
+            "sessions": [session.snapshot() for session in self.sessions.values() if session is not None],
+        }
@@ -0,0 +1,107 @@
+"""
+Compact in-memory task records.
+
+A pydantic model per task costs a __dict__, a fields-set and pydantic's
+__setattr__ on every update, and execute_task updates records many times.
+`compact_record_type(TaskRecord, TaskStatus)` builds a plain class with
+`__slots__` for the same fields. The status is stored as a small integer
+code (the member's index in the status enum) and datetime fields as float
+epoch seconds (UTC). Unset fields stay None and take the model's defaults
+when the record is converted with `to_model()`, which only happens when a
+response is serialized.
+"""
+
+import typing
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+
+def _is_datetime(annotation: Any) -> bool:
+    return annotation is datetime or datetime in typing.get_args(annotation)
+
+
+def to_timestamp(value: datetime) -> float:
+    """
+    Epoch seconds of a datetime; naive datetimes are taken as UTC.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def to_datetime(timestamp: float) -> datetime:
+    """
+    Naive UTC datetime of epoch seconds, as `datetime.utcnow()` returns.
+    """
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+class CompactRecord:
+    """
+    Base of the classes created by `compact_record_type`.
+    """
+
+    __slots__ = ("_status",)
+    # Class attributes are prefixed with "_" so they cannot clash with fields
+    _model: Type[BaseModel]
+    _fields: Tuple[str, ...] = ()
+    _datetime_fields: frozenset = frozenset()
+    _statuses: Tuple[Enum, ...] = ()
+    _status_codes: Dict[Any, int] = {}
+
+    def __init__(self, **values: Any):
+        self._status = self._status_codes[values.pop("status")]
+        for name in self._fields:
+            setattr(self, name, values.pop(name, None))
+        if values:
+            raise TypeError(f"Unknown {self._model.__name__} fields: {', '.join(values)}")
+
+    @property
+    def status(self) -> Enum:
+        return self._statuses[self._status]
+
+    @status.setter
+    def status(self, value: Any) -> None:
+        self._status = self._status_codes[value]
+
+    @classmethod
+    def from_model(cls, model: BaseModel) -> "CompactRecord":
+        values = {name: getattr(model, name) for name in cls._fields if getattr(model, name) is not None}
+        for name in cls._datetime_fields & values.keys():
+            values[name] = to_timestamp(values[name])
+        return cls(status=model.status, **values)
+
+    def to_model(self) -> BaseModel:
+        values: Dict[str, Any] = {"status": self._statuses[self._status]}
+        for name in self._fields:
+            value = getattr(self, name)
+            if value is not None:
+                values[name] = to_datetime(value) if name in self._datetime_fields else value
+        return self._model(**values)
+
+
+def compact_record_type(model: Type[BaseModel], statuses: Type[Enum], name: Optional[str] = None) -> Type[CompactRecord]:
+    """
+    Creates a slotted record class with the fields of `model`, which must
+    have a `status` field of the `statuses` enum.
+    """
+    fields = tuple(field for field in model.model_fields if field != "status")
+    members = tuple(statuses)
+    codes = {member: code for code, member in enumerate(members)}
+    return type(
+        name or f"Compact{model.__name__}",
+        (CompactRecord,),
+        {
+            "__slots__": fields,
+            "_model": model,
+            "_fields": fields,
+            "_datetime_fields": frozenset(
+                field for field in fields if _is_datetime(model.model_fields[field].annotation)
+            ),
+            "_statuses": members,
+            "_status_codes": codes,
+        },
+    )
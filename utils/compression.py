@@ -0,0 +1,128 @@
+"""
+Accept-Encoding negotiation for pre-encoded response bodies.
+
+Brotli is used when the `brotli` package is installed and the client asks for
+it, otherwise gzip. Bodies smaller than `minimum_size` are sent as-is, since
+compressing them costs more than it saves. Polled endpoints pass a
+CompressionCache, so an unchanged body is compressed only once per coding.
+"""
+
+import gzip
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """
+    Parses an Accept-Encoding header into a mapping of coding -> q-value.
+    """
+    codings: Dict[str, float] = {}
+    if not header:
+        return codings
+    for part in header.split(","):
+        pieces = part.strip().split(";")
+        coding = pieces[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in pieces[1:]:
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def accepts_encoding(header: Optional[str], coding: str) -> bool:
+    """
+    Returns True if the header allows the given content coding.
+    """
+    codings = parse_accept_encoding(header)
+    return codings.get(coding, codings.get("*", 0.0)) > 0
+
+
+def choose_encoding(header: Optional[str]) -> Optional[str]:
+    """
+    Returns the best supported content coding for the header, or None for identity.
+    """
+    codings = parse_accept_encoding(header)
+    wildcard = codings.get("*", 0.0)
+    candidates = []
+    if brotli is not None:
+        candidates.append("br")
+    candidates.append("gzip")
+
+    best = None
+    best_q = 0.0
+    for coding in candidates:
+        q = codings.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 5) -> bytes:
+    """
+    Compresses a body with the given content coding ('br' or 'gzip').
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=gzip_level)
+    raise ValueError(f"Unsupported content coding: {encoding}")
+
+
+class CompressionCache:
+    """
+    Bounded LRU of compressed bodies, keyed by (coding, uncompressed body).
+    A poll that returns the same bytes as an earlier one reuses their
+    compressed form; comparing the bodies is far cheaper than compressing.
+    """
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[tuple[str, bytes], bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        key = (encoding, body)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        compressed = compress(body, encoding)
+        self._cache[key] = compressed
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return compressed
+
+
+def negotiated_response(
+    body: bytes,
+    accept_encoding: Optional[str],
+    media_type: str = "application/json",
+    minimum_size: int = 500,
+    cache: Optional[CompressionCache] = None,
+) -> Response:
+    """
+    Builds a Response for a pre-encoded body, compressed according to Accept-Encoding.
+    """
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = choose_encoding(accept_encoding) if len(body) >= minimum_size else None
+    if encoding:
+        body = cache.compress(body, encoding) if cache is not None else compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,226 @@
+"""
+Adaptive limit on the number of agents running at once.
+
+Every task waits for a slot from AdaptiveConcurrency before it starts a
+browser. The limit follows AIMD (additive increase, multiplicative
+decrease), re-evaluated every `adjust_seconds`:
+
+- decrease (limit * `backoff`) when host memory or CPU is above its high-water
+  mark, when the recent error rate of LLM calls and tasks is too high, or
+  when LLM latency rises: the short-term latency average exceeds the
+  long-term one by `latency_tolerance` (a latency gradient);
+- increase by one when tasks are waiting and every slot is in use;
+- hold otherwise.
+
+LLM latency and errors come from LLMCallMonitor, a LangChain callback
+handler attached to the chat models. Host load needs `psutil`; without it
+only the LLM signals are used. Every change of the limit is kept in
+`decisions` with the signals that caused it.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover - optional dependency
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCallMonitor(BaseCallbackHandler):
+    """
+    Reports the latency and outcome of every chat model call to the controller.
+    """
+
+    # Called on the event loop; the controller is not thread-safe
+    run_inline = True
+
+    def __init__(self, controller: "AdaptiveConcurrency"):
+        self.controller = controller
+        self._started: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[Any], *, run_id: UUID, **kwargs) -> None:
+        self._started[run_id] = time.monotonic()
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.controller.record_llm_call(time.monotonic() - started, ok=True)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        if self._started.pop(run_id, None) is not None:
+            self.controller.record_llm_call(None, ok=False)
+
+
+class AdaptiveConcurrency:
+    """
+    One instance per server. Use `acquire()`/`release(ok)` around each task.
+    """
+
+    def __init__(
+        self,
+        min_limit: int = 1,
+        max_limit: int = 8,
+        initial_limit: int = 2,
+        adjust_seconds: float = 5.0,
+        backoff: float = 0.7,
+        memory_high_percent: float = 85.0,
+        cpu_high_percent: float = 90.0,
+        error_rate_high: float = 0.3,
+        latency_tolerance: float = 1.5,
+        outcome_window: int = 20,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self.adjust_seconds = adjust_seconds
+        self.backoff = backoff
+        self.memory_high_percent = memory_high_percent
+        self.cpu_high_percent = cpu_high_percent
+        self.error_rate_high = error_rate_high
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.waiting = 0
+        self.latency_short: Optional[float] = None  # EWMA, alpha 0.3
+        self.latency_long: Optional[float] = None  # EWMA, alpha 0.05
+        self.outcomes: Deque[bool] = deque(maxlen=outcome_window)
+        self.new_calls = 0  # LLM calls since the last adjustment
+        self.signals: Dict[str, Any] = {}
+        self.decisions: Deque[dict] = deque(maxlen=50)
+        self.llm_monitor = LLMCallMonitor(self)
+        self._condition = asyncio.Condition()
+        self._adjuster: Optional[asyncio.Task] = None
+
+    @property
+    def slots(self) -> int:
+        return max(self.min_limit, math.floor(self.limit))
+
+    # Signals
+
+    def record_llm_call(self, seconds: Optional[float], ok: bool) -> None:
+        self.outcomes.append(ok)
+        self.new_calls += 1
+        if seconds is None:
+            return
+        if self.latency_short is None:
+            self.latency_short = self.latency_long = seconds
+        else:
+            self.latency_short += 0.3 * (seconds - self.latency_short)
+            self.latency_long += 0.05 * (seconds - self.latency_long)
+
+    def _read_signals(self) -> Dict[str, Any]:
+        signals: Dict[str, Any] = {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "latency_short_seconds": round(self.latency_short, 3) if self.latency_short is not None else None,
+            "latency_long_seconds": round(self.latency_long, 3) if self.latency_long is not None else None,
+            "error_rate": round(self.outcomes.count(False) / len(self.outcomes), 3) if self.outcomes else 0.0,
+        }
+        if psutil is not None:
+            signals["memory_percent"] = psutil.virtual_memory().percent
+            signals["cpu_percent"] = psutil.cpu_percent(None)
+        return signals
+
+    def _decide(self, signals: Dict[str, Any]) -> Optional[str]:
+        """
+        Returns the reason for changing the limit, or None to hold it.
+        Reasons starting with "decrease" shrink it, the rest grow it.
+        """
+        if signals.get("memory_percent", 0) >= self.memory_high_percent:
+            return "decrease:memory"
+        if signals.get("cpu_percent", 0) >= self.cpu_high_percent:
+            return "decrease:cpu"
+        # Latency and errors only count while there are fresh calls, so a
+        # stale slowdown does not keep shrinking the limit
+        if self.new_calls:
+            if len(self.outcomes) >= 5 and signals["error_rate"] >= self.error_rate_high:
+                return "decrease:errors"
+            short, long = self.latency_short, self.latency_long
+            if short is not None and short > long * self.latency_tolerance:
+                return "decrease:latency"
+        if self.waiting and self.in_flight >= self.slots:
+            return "increase:demand"
+        return None
+
+    async def adjust(self) -> None:
+        signals = await asyncio.to_thread(self._read_signals)
+        self.signals = signals
+        reason = self._decide(signals)
+        self.new_calls = 0
+        if reason is None:
+            return
+        previous = self.limit
+        if reason.startswith("decrease"):
+            self.limit = max(float(self.min_limit), self.limit * self.backoff)
+        else:
+            self.limit = min(float(self.max_limit), math.floor(self.limit) + 1.0)
+        if self.limit == previous:
+            return
+        decision = {
+            "at": time.time(),
+            "from": round(previous, 2),
+            "to": round(self.limit, 2),
+            "reason": reason,
+            "signals": signals,
+        }
+        self.decisions.append(decision)
+        logger.info(f"Concurrency limit {decision['from']} -> {decision['to']} ({reason}).")
+        if self.limit > previous:
+            async with self._condition:
+                self._condition.notify_all()
+
+    async def _adjust_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.adjust_seconds)
+            try:
+                await self.adjust()
+            except Exception as e:
+                logger.warning(f"Concurrency adjustment failed: {e}")
+
+    # Slots
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            self.waiting += 1
+            try:
+                await self._condition.wait_for(lambda: self.in_flight < self.slots)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+    async def release(self, ok: bool = True) -> None:
+        async with self._condition:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.outcomes.append(ok)
+            self._condition.notify_all()
+
+    def start(self) -> None:
+        if psutil is None:
+            logger.warning("psutil is not installed; concurrency adapts to LLM latency and errors only.")
+        self._adjuster = asyncio.create_task(self._adjust_loop())
+
+    async def close(self) -> None:
+        if self._adjuster is not None:
+            self._adjuster.cancel()
+            self._adjuster = None
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "slots": self.slots,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "signals": self.signals,
+            "decisions": list(self.decisions),
+        }
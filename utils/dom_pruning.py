@@ -0,0 +1,258 @@
+"""
+DOM state pruning and token budgeting before each LLM call.
+
+Every agent step renders the page's element tree into the prompt via
+`clickable_elements_to_string`. DomPruner renders a trimmed copy instead:
+
+- drops invisible and off-screen text nodes, `aria-hidden`/`hidden`
+  subtrees that carry no interactive element, and subtrees left empty after
+  pruning. The off-screen test is browser-use's own: a text node
+  is visible only when it lies within the viewport's height, and an element
+  is interactive (highlighted) only when it is the top element at its centre,
+  which it cannot be off-screen. Off-screen regions are therefore left with
+  no visible text and no interactive element, and are pruned as empty;
+- dedupes repeated list items (same text and links), repeated links (same
+  href and text) and repeated sibling text;
+- caps the number of interactive elements and the estimated prompt tokens,
+  keeping elements in document order (top of the page first).
+
+Only the rendered tree is pruned, and it is a copy: the session's cached
+state keeps the full tree, and the selector map is left untouched, so action
+indexes keep resolving to the same elements. While a recorded trace is
+replayed (ManagedBrowserContext.replaying), states are passed through as-is,
+because `Agent.rerun_history` re-locates elements in the returned tree.
+
+Token counts are estimates (about 4 characters per token); they are only
+used to compare steps and to enforce the budget.
+"""
+
+import asyncio
+import copy
+import dataclasses
+import inspect
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Sequence, Tuple
+
+from browser_use import Agent
+from browser_use.browser.views import BrowserState
+from browser_use.dom.views import DOMBaseNode, DOMElementNode, DOMTextNode
+
+logger = logging.getLogger(__name__)
+
+# Repeated siblings with these tags and identical content are deduplicated
+LIST_ITEM_TAGS = {"li", "tr", "option", "article"}
+
+# Same attributes the Agent renders into the prompt by default
+DEFAULT_INCLUDE_ATTRIBUTES: List[str] = list(
+    inspect.signature(Agent.__init__).parameters["include_attributes"].default
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+
+@dataclass
+class PruneStats:
+    tokens_before: int
+    tokens_after: int
+    nodes_removed: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+@dataclass
+class DomPruner:
+    """
+    State processor for ManagedBrowserContext. One instance per task; it
+    keeps the per-step statistics of that task.
+
+    token_budget and max_elements of 0 mean unlimited.
+    """
+
+    token_budget: int = 0
+    max_elements: int = 0
+    include_attributes: Sequence[str] = field(default_factory=lambda: DEFAULT_INCLUDE_ATTRIBUTES)
+    task_id: Optional[int] = None
+    steps: List[PruneStats] = field(default_factory=list)
+
+    @property
+    def tokens_saved(self) -> int:
+        return sum(step.tokens_saved for step in self.steps)
+
+    async def process(self, state: BrowserState, context: Any) -> BrowserState:
+        if getattr(context, "replaying", False):
+            return state
+        # Large pages take a while to walk; keep that off the event loop
+        element_tree, stats = await asyncio.to_thread(self.prune, state.element_tree)
+        self.steps.append(stats)
+        context.current_metrics.update(
+            dom_tokens_before=stats.tokens_before, dom_tokens_after=stats.tokens_after
+        )
+        logger.info(
+            f"Task ID {self.task_id}: DOM pruning step {len(self.steps)}: "
+            f"~{stats.tokens_before} -> ~{stats.tokens_after} tokens "
+            f"({stats.nodes_removed} nodes removed, ~{stats.tokens_saved} tokens saved)"
+        )
+        return dataclasses.replace(state, element_tree=element_tree)
+
+    def render(self, root: DOMElementNode) -> str:
+        return root.clickable_elements_to_string(include_attributes=list(self.include_attributes))
+
+    def prune(self, root: DOMElementNode) -> Tuple[DOMElementNode, PruneStats]:
+        """
+        Returns a pruned copy of the tree under `root` and its statistics.
+        `root` itself is not modified.
+        """
+        tokens_before = estimate_tokens(self.render(root))
+        pruned, removed = self._prune_structure(root)
+        removed += self._apply_budget(pruned)
+        tokens_after = estimate_tokens(self.render(pruned))
+        return pruned, PruneStats(tokens_before, tokens_after, removed)
+
+    def _prune_structure(self, root: DOMElementNode) -> Tuple[DOMElementNode, int]:
+        """
+        Copies the element nodes that are kept, with their kept children.
+        Text nodes are not modified and are shared with the original tree.
+        """
+        removed = 0
+        seen_links = set()
+
+        def visit(node: DOMBaseNode) -> Optional[DOMBaseNode]:
+            """Returns the node to keep (a copy for elements), or None."""
+            nonlocal removed
+            if isinstance(node, DOMTextNode):
+                return node if node.is_visible else None
+            if not isinstance(node, DOMElementNode):
+                return node
+
+            if node.highlight_index is not None and node.tag_name == "a":
+                href = node.attributes.get("href")
+                if href:
+                    key = (href, node.get_all_text_till_next_clickable_element())
+                    if key in seen_links:
+                        return None
+                    seen_links.add(key)
+
+            kept: List[DOMBaseNode] = []
+            previous_text = None
+            seen_items = set()
+            for child in node.children:
+                if isinstance(child, DOMTextNode) and child.text == previous_text:
+                    removed += 1
+                    continue
+                if isinstance(child, DOMElementNode) and child.tag_name in LIST_ITEM_TAGS:
+                    signature = _signature(child)
+                    if signature in seen_items:
+                        removed += 1
+                        continue
+                    seen_items.add(signature)
+                kept_child = visit(child)
+                if kept_child is not None:
+                    kept.append(kept_child)
+                    previous_text = child.text if isinstance(child, DOMTextNode) else None
+                else:
+                    removed += 1
+            clone = copy.copy(node)
+            clone.children = kept
+
+            if node.highlight_index is not None or node is root:
+                return clone
+            if _is_hidden(node) and not _has_interactive(clone):
+                return None
+            return clone if kept else None
+
+        return visit(root), removed
+
+    def _apply_budget(self, root: DOMElementNode) -> int:
+        if not self.token_budget and not self.max_elements:
+            return 0
+
+        include = list(self.include_attributes)
+        # (node, parent, rendered length) for every line the prompt would contain
+        items = []
+
+        def collect(node: DOMElementNode, has_highlighted_parent: bool) -> None:
+            for child in node.children:
+                if isinstance(child, DOMElementNode):
+                    if child.highlight_index is not None:
+                        items.append((child, node, _rendered_length(child, include)))
+                    collect(child, has_highlighted_parent or child.highlight_index is not None)
+                elif isinstance(child, DOMTextNode) and not has_highlighted_parent:
+                    items.append((child, node, len(child.text) + 5))
+
+        collect(root, False)
+
+        budget_chars = self.token_budget * 4 if self.token_budget else math.inf
+        used_chars = 0
+        elements = 0
+        cutoff = len(items)
+        for i, (node, _, length) in enumerate(items):
+            is_element = isinstance(node, DOMElementNode)
+            if used_chars + length > budget_chars or (
+                is_element and self.max_elements and elements >= self.max_elements
+            ):
+                cutoff = i
+                break
+            used_chars += length
+            elements += is_element
+
+        # Compare by identity: DOM nodes are dataclasses with field-wise __eq__
+        dropped = {id(node) for node, _, _ in items[cutoff:]}
+        removed = 0
+        for parent in {id(parent): parent for _, parent, _ in items[cutoff:]}.values():
+            kept = [child for child in parent.children if id(child) not in dropped]
+            removed += len(parent.children) - len(kept)
+            parent.children = kept
+        return removed
+
+
+def _signature(node: DOMElementNode) -> tuple:
+    """
+    Content signature of a list item: its text and link targets in order.
+    """
+    parts = []
+
+    def walk(current: DOMBaseNode) -> None:
+        if isinstance(current, DOMTextNode):
+            parts.append(current.text)
+        elif isinstance(current, DOMElementNode):
+            if current.attributes.get("href"):
+                parts.append(current.attributes["href"])
+            for child in current.children:
+                walk(child)
+
+    walk(node)
+    return (node.tag_name, tuple(parts))
+
+
+def _is_hidden(node: DOMElementNode) -> bool:
+    attributes = node.attributes
+    return (
+        attributes.get("aria-hidden") == "true"
+        or "hidden" in attributes
+        or (node.tag_name == "input" and attributes.get("type") == "hidden")
+    )
+
+
+def _has_interactive(node: DOMElementNode) -> bool:
+    for child in node.children:
+        if isinstance(child, DOMElementNode) and (
+            child.highlight_index is not None or _has_interactive(child)
+        ):
+            return True
+    return False
+
+
+def _rendered_length(node: DOMElementNode, include_attributes: List[str]) -> int:
+    attributes = sum(
+        len(key) + len(value) + 4
+        for key, value in node.attributes.items()
+        if key in include_attributes
+    )
+    text = node.get_all_text_till_next_clickable_element()
+    return len(str(node.highlight_index)) + 3 + 2 * len(node.tag_name) + 5 + attributes + len(text)
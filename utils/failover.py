@@ -0,0 +1,216 @@
+"""
+Failover across LLM providers with circuit breakers.
+
+FailoverModel tries a chain of chat models in order (e.g. OpenAI, then
+Gemini, then a local Ollama model) for every call, skipping providers whose
+circuit breaker is open. A call that fails on the provider's side (a
+transport error, 429 or 5xx) or exceeds `call_timeout` moves on to the next
+provider. Other errors, such as a 400 or a response that does not parse,
+are raised as they are: the next provider would not do better, and they say
+nothing about the provider's health.
+
+Each provider and model has one CircuitBreaker, shared by all tasks. It
+opens when, over its recent calls, the share of failures (errors, timeouts
+and calls slower than `slow_seconds`) reaches `failure_rate`. After
+`open_seconds` it lets a single trial call through (half-open) and closes
+again if that call succeeds. A trial that is cancelled (task cancelled,
+hedge lost, shutdown) counts as neither, and the next call becomes the trial.
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from utils.rate_limits import status_code
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Connection failures of the OpenAI SDK and httpx (used by Ollama), matched by
+# name so neither package has to be imported here
+TRANSPORT_ERRORS = {"APIConnectionError", "TransportError"}
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    Whether `error` means the provider is failing: a timeout, a connection
+    error, or an HTTP 408, 429 or 5xx.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__ in TRANSPORT_ERRORS for cls in type(error).__mro__):
+        return True
+    status = status_code(error)
+    return status is not None and (status in (408, 429) or status >= 500)
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_calls: int = 5,
+        window: int = 20,
+        slow_seconds: float = 60.0,
+        open_seconds: float = 30.0,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.outcomes: Deque[bool] = deque(maxlen=window)  # True = failed or slow
+        self.trial_in_flight = False
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+            self.trial_in_flight = False
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def release(self) -> None:
+        """
+        Ends a call allowed by `allow` without an outcome, e.g. when it was
+        cancelled, so a half-open breaker lets the next trial through.
+        """
+        if self.state == HALF_OPEN:
+            self.trial_in_flight = False
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.opened += 1
+        logger.warning(f"Circuit breaker {self.name} opened for {self.open_seconds}s.")
+
+    def record(self, ok: bool, seconds: float) -> None:
+        bad = not ok or seconds >= self.slow_seconds
+        if self.state == HALF_OPEN:
+            self.trial_in_flight = False
+            if bad:
+                self._open()
+            else:
+                self.state = CLOSED
+                self.outcomes.clear()
+                logger.info(f"Circuit breaker {self.name} closed.")
+            return
+        self.outcomes.append(bad)
+        if (
+            self.state == CLOSED
+            and len(self.outcomes) >= self.min_calls
+            and sum(self.outcomes) / len(self.outcomes) >= self.failure_rate
+        ):
+            self._open()
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "recent_failure_rate": round(sum(self.outcomes) / len(self.outcomes), 3) if self.outcomes else 0.0,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class BreakerRegistry:
+    """
+    One CircuitBreaker per "provider:model", shared by all tasks.
+    """
+
+    def __init__(self, **breaker_options: Any):
+        self.breaker_options = breaker_options
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker(name, **self.breaker_options)
+        return self.breakers[name]
+
+    def snapshot(self) -> dict:
+        return {name: breaker.snapshot() for name, breaker in self.breakers.items()}
+
+
+class FailoverModel:
+    """
+    Drop-in replacement for the Agent's `llm` over a chain of
+    ("provider:model", chat model) pairs, first one preferred. One instance
+    per task; `calls` and `last_provider` record which providers served it.
+    """
+
+    def __init__(
+        self,
+        chain: Sequence[Tuple[str, Any]],
+        breakers: BreakerRegistry,
+        call_timeout: Optional[float] = None,
+        task_id: Optional[int] = None,
+    ):
+        self.chain = list(chain)
+        self.breakers = breakers
+        self.call_timeout = call_timeout
+        self.task_id = task_id
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.failovers = 0
+        self.last_provider: Optional[str] = None
+        primary = self.chain[0][1]
+        self.model_name = getattr(primary, "model_name", None) or getattr(primary, "model", None)
+
+    def with_structured_output(self, schema: Any, include_raw: bool = False, **kwargs) -> "_FailoverStructuredModel":
+        runnables = [
+            (name, llm.with_structured_output(schema, include_raw=include_raw, **kwargs)) for name, llm in self.chain
+        ]
+        return _FailoverStructuredModel(self, runnables)
+
+
+class _FailoverStructuredModel:
+    def __init__(self, owner: FailoverModel, runnables: List[Tuple[str, Any]]):
+        self.owner = owner
+        self.runnables = runnables
+
+    async def ainvoke(self, messages: Any, config: Any = None, **kwargs) -> Any:
+        owner = self.owner
+        last_error: Optional[BaseException] = None
+        for position, (name, runnable) in enumerate(self.runnables):
+            breaker = owner.breakers.get(name)
+            # The last provider is tried even with an open breaker rather than failing the step
+            allowed = breaker.allow()
+            if not allowed and position < len(self.runnables) - 1:
+                continue
+            started = time.monotonic()
+            try:
+                response = await asyncio.wait_for(runnable.ainvoke(messages, config, **kwargs), owner.call_timeout)
+            except Exception as e:
+                if not is_provider_failure(e):
+                    if allowed:
+                        breaker.release()
+                    raise
+                breaker.record(False, time.monotonic() - started)
+                logger.warning(f"Task ID {owner.task_id}: {name} failed ({type(e).__name__}: {e}), trying next provider.")
+                last_error = e
+                continue
+            except BaseException:
+                # Cancelled: no outcome, but a half-open trial must not stay in flight
+                if allowed:
+                    breaker.release()
+                raise
+            breaker.record(True, time.monotonic() - started)
+            if position > 0:
+                owner.failovers += 1
+            # A hedged model may have been answered by its hedge provider
+            provider = getattr(runnable, "answered_by", name)
+            owner.calls[provider] += 1
+            owner.last_provider = provider
+            return response
+        raise last_error or RuntimeError("No LLM provider available")
@@ -0,0 +1,97 @@
+"""
+Planning and merging for tasks fanned out into parallel subtasks.
+
+A task like "compare the prices of these 8 products" runs one product after
+the other inside a single Agent and browser, although the lookups do not
+depend on each other. With fan-out, a planner call first asks the model
+whether the task splits into independent, self-contained subtasks. If it
+does, the server runs each subtask as a child task in its own browser
+context, concurrently under the adaptive concurrency limit, and a merge call
+combines their results into the answer to the original task. Wall-clock time
+then approaches that of the slowest subtask instead of their sum.
+
+Tasks the planner does not split, or that it fails to plan, run as a single
+task. If the merge call fails, the subtask results are listed one after the
+other instead.
+"""
+
+import logging
+from typing import Any, List, Optional, Tuple
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+PLANNER_PROMPT = """You split browser automation tasks into subtasks that run in parallel, each in its own browser, by agents that do not see each other's work.
+
+Split the task only when it repeats the same kind of work over several independent items (products, websites, people, search queries...). Write one subtask per item, each self-contained: it must name its item and include every instruction and piece of context from the original task that it needs, and say what to report back. Describe in merge_instructions how the subtask results are to be combined into the final answer (e.g. "compare the prices and name the cheapest").
+
+Return no subtasks when the steps depend on each other (log in, then ...; find X, then use it to ...), when there is a single item, or when you are unsure. Never return more than {max_subtasks} subtasks."""
+
+MERGE_PROMPT = """Several browser agents each worked on one subtask of the task below. Combine their results into a single final answer to the original task. Follow the merge instructions if any. Mention subtasks that failed or returned nothing instead of guessing their results.
+
+Task: {task}
+
+Merge instructions: {merge_instructions}"""
+
+
+class TaskPlan(BaseModel):
+    subtasks: List[str] = []
+    merge_instructions: str = ""
+
+
+class MergedResult(BaseModel):
+    answer: str
+
+
+# (subtask, result or None, error or None) per child task, in plan order
+SubtaskResult = Tuple[str, Optional[str], Optional[str]]
+
+
+async def plan_subtasks(llm: Any, task: str, max_subtasks: int) -> Optional[TaskPlan]:
+    """
+    Asks `llm` (anything with `with_structured_output`) to split `task`.
+    Returns the plan, or None when the task should run as a single task.
+    """
+    plan = await llm.with_structured_output(TaskPlan).ainvoke(
+        [SystemMessage(content=PLANNER_PROMPT.format(max_subtasks=max_subtasks)), HumanMessage(content=task)]
+    )
+    subtasks = list(dict.fromkeys(subtask.strip() for subtask in plan.subtasks if subtask.strip()))
+    if len(subtasks) > max_subtasks:
+        logger.warning(f"Planner returned {len(subtasks)} subtasks, keeping the first {max_subtasks}.")
+        subtasks = subtasks[:max_subtasks]
+    if len(subtasks) < 2:
+        return None
+    return TaskPlan(subtasks=subtasks, merge_instructions=plan.merge_instructions)
+
+
+def list_results(results: List[SubtaskResult]) -> str:
+    """
+    The subtask results one after the other, for when they cannot be merged.
+    """
+    sections = []
+    for position, (subtask, result, error) in enumerate(results, start=1):
+        outcome = result if result else f"Failed: {error}" if error else "No result"
+        sections.append(f"{position}. {subtask}\n{outcome}")
+    return "\n\n".join(sections)
+
+
+async def merge_results(llm: Any, task: str, plan: TaskPlan, results: List[SubtaskResult]) -> str:
+    """
+    Combines the subtask results into one answer to `task` with `llm`,
+    falling back to listing them.
+    """
+    try:
+        merged = await llm.with_structured_output(MergedResult).ainvoke(
+            [
+                SystemMessage(
+                    content=MERGE_PROMPT.format(task=task, merge_instructions=plan.merge_instructions or "none")
+                ),
+                HumanMessage(content=list_results(results)),
+            ]
+        )
+        return merged.answer
+    except Exception as e:
+        logger.warning(f"Merging subtask results failed, listing them instead: {e}")
+        return list_results(results)
@@ -0,0 +1,159 @@
+"""
+Hedged LLM requests.
+
+A few LLM calls land in a slow tail many times the median, and the agent
+step waits on them. HedgedModel starts the call on its model and, if it has
+not returned by the model's latency percentile (`HedgePolicy.percentile`
+of its recent calls), sends a duplicate to the hedge model (the same model
+or an alternate provider). The first successful response wins and the
+other call is cancelled; `answered_by` on the structured model names the one
+that answered, so callers count the call under the right provider.
+
+Hedges cost extra requests, so HedgePolicy only fires one while hedges stay
+under `max_ratio` of all calls, and only once `min_samples` latencies are
+known for the model. It counts hedges fired and hedges won (the duplicate
+answered first).
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class HedgePolicy:
+    """
+    Shared by all tasks: latency history per model, the hedge budget and
+    the counters.
+    """
+
+    def __init__(self, percentile: float = 95.0, max_ratio: float = 0.1, min_samples: int = 20, window: int = 200):
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self.calls = 0
+        self.fired = 0
+        self.won = 0
+
+    def record(self, name: str, seconds: float) -> None:
+        self.latencies[name].append(seconds)
+
+    def deadline(self, name: str) -> Optional[float]:
+        """
+        Seconds after which a call to `name` is hedged, or None while there
+        are too few samples.
+        """
+        samples = self.latencies[name]
+        if len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, math.ceil(len(ordered) * self.percentile / 100) - 1)
+        return ordered[index]
+
+    def try_fire(self) -> bool:
+        if self.fired + 1 > self.max_ratio * self.calls:
+            return False
+        self.fired += 1
+        return True
+
+    def snapshot(self) -> dict:
+        return {
+            "percentile": self.percentile,
+            "max_ratio": self.max_ratio,
+            "calls": self.calls,
+            "hedges_fired": self.fired,
+            "hedges_won": self.won,
+            "deadlines": {
+                name: round(deadline, 3)
+                for name in list(self.latencies)
+                if (deadline := self.deadline(name)) is not None
+            },
+        }
+
+
+class HedgedModel:
+    """
+    Wraps a chat model (`llm`, tracked under `name`) and hedges slow calls
+    to `hedge_llm` ("provider:model" `hedge_name`), which defaults to the
+    same model.
+    """
+
+    def __init__(
+        self,
+        llm: Any,
+        name: str,
+        policy: HedgePolicy,
+        hedge_llm: Any = None,
+        hedge_name: Optional[str] = None,
+        task_id: Optional[int] = None,
+    ):
+        self.llm = llm
+        self.name = name
+        self.policy = policy
+        self.hedge_llm = hedge_llm if hedge_llm is not None else llm
+        self.hedge_name = hedge_name if hedge_llm is not None and hedge_name else name
+        self.task_id = task_id
+        self.model_name = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+
+    def with_structured_output(self, schema: Any, include_raw: bool = False, **kwargs) -> "_HedgedStructuredModel":
+        return _HedgedStructuredModel(
+            self,
+            self.llm.with_structured_output(schema, include_raw=include_raw, **kwargs),
+            self.hedge_llm.with_structured_output(schema, include_raw=include_raw, **kwargs),
+        )
+
+
+class _HedgedStructuredModel:
+    def __init__(self, owner: HedgedModel, runnable: Any, hedge_runnable: Any):
+        self.owner = owner
+        self.runnable = runnable
+        self.hedge_runnable = hedge_runnable
+        self.answered_by = owner.name  # Name of the model that answered the last call
+
+    async def ainvoke(self, messages: Any, config: Any = None, **kwargs) -> Any:
+        owner, policy = self.owner, self.owner.policy
+        policy.calls += 1
+        self.answered_by = owner.name
+        started = time.monotonic()
+        primary = asyncio.ensure_future(self.runnable.ainvoke(messages, config, **kwargs))
+        deadline = policy.deadline(owner.name)
+        if deadline is not None:
+            try:
+                done, _ = await asyncio.wait({primary}, timeout=deadline)
+            except asyncio.CancelledError:
+                primary.cancel()
+                raise
+            if not done and policy.try_fire():
+                return await self._race(primary, messages, config, kwargs, started)
+        result = await primary
+        policy.record(owner.name, time.monotonic() - started)
+        return result
+
+    async def _race(self, primary: asyncio.Future, messages: Any, config: Any, kwargs: dict, started: float) -> Any:
+        owner, policy = self.owner, self.owner.policy
+        logger.info(f"Task ID {owner.task_id}: Hedging a {owner.name} call after {time.monotonic() - started:.1f}s.")
+        hedge = asyncio.ensure_future(self.hedge_runnable.ainvoke(messages, config, **kwargs))
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        error = future.exception()
+                        continue
+                    if future is hedge:
+                        policy.won += 1
+                        self.answered_by = owner.hedge_name
+                    # A cancelled primary still took at least this long
+                    policy.record(owner.name, time.monotonic() - started)
+                    return future.result()
+            raise error
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,272 @@
+"""
+Size-capped on-disk HTTP cache shared by every browser the server opens.
+
+Tasks run in their own browser contexts so cookies and storage do not leak
+between them, and Chrome keeps the cache of such contexts in memory only:
+every task downloads the scripts, stylesheets, images and fonts of the sites
+it visits again. SharedHttpCache keeps those responses on disk for all
+contexts and Chrome instances instead. It is consulted through the same CDP
+Fetch interception as the request filter (see utils/request_filtering.py):
+a fresh cached response is fulfilled without touching the network, a miss
+goes out and its response is stored if it may be.
+
+Only cookie-free, publicly cacheable GET responses are stored: status 200,
+an explicit lifetime (Cache-Control max-age, Expires, or 10% of the age given
+by Last-Modified, at most a day), no Set-Cookie, no Vary other than
+Accept-Encoding, and no Authorization or Cookie on the request. Requests
+that carry either are neither stored nor served from the cache, nor are
+requests for a URL the browser context has cookies for (they are added after
+the cache is consulted), so a response personalised for one context is never
+handed to another. Entries are served
+until they expire, without revalidation. Files are evicted least recently
+used first once the directory grows past `max_bytes`.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHEABLE_TYPES = ("script", "stylesheet", "image", "font")
+
+# Not replayed: the body is stored decoded and its length is set by Chrome
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+HEURISTIC_MAX_SECONDS = 86400
+
+# Request headers that make a response specific to whoever sent them
+PRIVATE_REQUEST_HEADERS = {"authorization", "cookie"}
+
+
+class CachedResponse(NamedTuple):
+    status: int
+    headers: List[Dict[str, str]]  # CDP header entries: {"name": ..., "value": ...}
+    body: bytes
+    encoded_bytes: int  # Size on the wire when it was downloaded
+
+
+def is_private_request(request_headers: Dict[str, str]) -> bool:
+    return any(name.lower() in PRIVATE_REQUEST_HEADERS for name in request_headers)
+
+
+def header_map(headers: List[Dict[str, str]]) -> Dict[str, str]:
+    """
+    Lower-cased header names to values, repeated headers joined by ", ".
+    """
+    result: Dict[str, str] = {}
+    for header in headers:
+        name = header["name"].lower()
+        result[name] = f"{result[name]}, {header['value']}" if name in result else header["value"]
+    return result
+
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_seconds(headers: Dict[str, str], now: float) -> Optional[float]:
+    """
+    How long a response may be served from cache, or None if it may not be
+    stored. `headers` are lower-cased, as returned by header_map.
+    """
+    directives = {}
+    for part in headers.get("cache-control", "").lower().split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name] = value.strip('"')
+    if {"no-store", "no-cache", "private"} & directives.keys():
+        return None
+    if "max-age" in directives:
+        try:
+            return float(directives["max-age"])
+        except ValueError:
+            return None
+    date = _http_date(headers.get("date")) or now
+    expires = _http_date(headers.get("expires"))
+    if "expires" in headers:
+        # An invalid Expires means already expired
+        return expires - date if expires else None
+    last_modified = _http_date(headers.get("last-modified"))
+    if last_modified and last_modified < date:
+        return min((date - last_modified) * 0.1, HEURISTIC_MAX_SECONDS)
+    return None
+
+
+class SharedHttpCache:
+    """
+    Stores cacheable responses as one file per SHA-256 of the URL under
+    `root`. Methods are blocking and thread-safe; call lookup and store
+    through asyncio.to_thread.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 1024 * 1024 * 1024, max_entry_bytes: int = 10 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # path -> (size, last access time)
+        self._index: Dict[str, Tuple[int, float]] = {}
+        self._total_bytes = 0
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self) -> None:
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".http"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                self._index[path] = (stat.st_size, stat.st_atime)
+                self._total_bytes += stat.st_size
+
+    def _path(self, url: str) -> str:
+        digest = hashlib.sha256(url.partition("#")[0].encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], f"{digest}.http")
+
+    def lookup(self, url: str) -> Optional[CachedResponse]:
+        """
+        Returns the fresh cached response for `url`, if any, and counts it as
+        a hit or a miss.
+        """
+        path = self._path(url)
+        try:
+            with open(path, "rb") as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except ValueError as e:
+            logger.warning(f"Discarding unreadable HTTP cache entry {path}: {e}")
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        if meta["expires"] <= time.time() or meta["url"] != url.partition("#")[0]:
+            self._remove(path)
+            self.misses += 1
+            return None
+        with self._lock:
+            if path in self._index:
+                self._index[path] = (self._index[path][0], time.time())
+            self.hits += 1
+            self.bytes_saved += meta["encoded_bytes"]
+        return CachedResponse(meta["status"], meta["headers"], body, meta["encoded_bytes"])
+
+    def cacheable_for(
+        self,
+        status: int,
+        request_headers: Dict[str, str],
+        response_headers: List[Dict[str, str]],
+    ) -> Optional[float]:
+        """
+        Seconds a response may be cached for, or None when it may not be.
+        Decided before its body is fetched.
+        """
+        headers = header_map(response_headers)
+        if status != 200 or "set-cookie" in headers:
+            return None
+        if is_private_request(request_headers):
+            return None
+        vary = {part.strip().lower() for part in headers.get("vary", "").split(",") if part.strip()}
+        if vary - {"accept-encoding"}:
+            return None
+        if int(headers.get("content-length") or 0) > self.max_entry_bytes:
+            return None
+        lifetime = freshness_seconds(headers, time.time())
+        return lifetime if lifetime and lifetime > 0 else None
+
+    def store(self, url: str, status: int, headers: List[Dict[str, str]], body: bytes, lifetime: float) -> bool:
+        if len(body) > self.max_entry_bytes:
+            return False
+        encoded_bytes = int(header_map(headers).get("content-length") or len(body))
+        meta = {
+            "url": url.partition("#")[0],
+            "status": status,
+            "headers": [header for header in headers if header["name"].lower() not in DROPPED_HEADERS],
+            "expires": time.time() + lifetime,
+            "encoded_bytes": encoded_bytes,
+        }
+        data = json.dumps(meta).encode("utf-8") + b"\n" + body
+
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            previous = self._index.get(path)
+            if previous:
+                self._total_bytes -= previous[0]
+            self._index[path] = (len(data), time.time())
+            self._total_bytes += len(data)
+            self.stores += 1
+            self._evict_locked()
+        return True
+
+    def _evict_locked(self) -> None:
+        if self._total_bytes <= self.max_bytes:
+            return
+        # Oldest access first
+        for path, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            del self._index[path]
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def _remove(self, path: str) -> None:
+        with self._lock:
+            entry = self._index.pop(path, None)
+            if entry:
+                self._total_bytes -= entry[0]
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._index),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "bytes_saved": self.bytes_saved,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
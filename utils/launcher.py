@@ -0,0 +1,129 @@
+"""
+Command line launcher for the servers.
+
+    python main.py --profile prod --host 0.0.0.0 --port 8000
+
+A profile sets uvicorn's options:
+
+- dev: reloads on code changes, logs every request and otherwise keeps
+  uvicorn's defaults;
+- prod: no reloader; uvloop and httptools when they are installed (asyncio
+  and h11 otherwise); a larger accept backlog; keep-alive longer than the
+  idle timeout of common load balancers, so they do not reuse a connection
+  the server is closing; a cap on concurrent connections, above which
+  uvicorn answers 503; no access log.
+
+Each option comes from the profile, then the environment (HOST, PORT,
+SERVER_PROFILE, SERVER_BACKLOG, SERVER_KEEP_ALIVE, SERVER_LIMIT_CONCURRENCY),
+then the command line. There is always a single worker, because task state
+is kept in the process.
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "dev": {
+        "reload": True,
+        "loop": "auto",
+        "http": "auto",
+        "backlog": 2048,
+        "timeout_keep_alive": 5,
+        "limit_concurrency": None,
+        "access_log": True,
+    },
+    "prod": {
+        "reload": False,
+        "loop": "uvloop",
+        "http": "httptools",
+        "backlog": 4096,
+        "timeout_keep_alive": 75,
+        "limit_concurrency": 1000,
+        "access_log": False,
+    },
+}
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def uvicorn_options(
+    profile: str,
+    host: str,
+    port: int,
+    backlog: Optional[int] = None,
+    keep_alive: Optional[int] = None,
+    limit_concurrency: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Keyword arguments for `uvicorn.run` from a profile and overrides (None
+    keeps the profile's value, a limit_concurrency of 0 removes the cap).
+    """
+    options = dict(PROFILES[profile], host=host, port=port)
+    if options["loop"] == "uvloop" and not _installed("uvloop"):
+        options["loop"] = "asyncio"
+    if options["http"] == "httptools" and not _installed("httptools"):
+        options["http"] = "h11"
+    if backlog is not None:
+        options["backlog"] = backlog
+    if keep_alive is not None:
+        options["timeout_keep_alive"] = keep_alive
+    if limit_concurrency is not None:
+        options["limit_concurrency"] = limit_concurrency or None
+    return options
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    # Packaged builds cannot reload, so they default to prod
+    default_profile = os.getenv("SERVER_PROFILE", "prod" if getattr(sys, "frozen", False) else "dev")
+    parser = argparse.ArgumentParser(description="Runs the A5 Browser Use server.")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=default_profile)
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8888")))
+    parser.add_argument("--backlog", type=int, default=_env_int("SERVER_BACKLOG"), help="Pending connections queued by the OS")
+    parser.add_argument("--keep-alive", type=int, default=_env_int("SERVER_KEEP_ALIVE"), help="Seconds an idle connection is kept open")
+    parser.add_argument(
+        "--limit-concurrency",
+        type=int,
+        default=_env_int("SERVER_LIMIT_CONCURRENCY"),
+        help="Concurrent connections before answering 503 (0 = unlimited)",
+    )
+    return parser.parse_args(argv)
+
+
+def run_server(app: Any, import_string: str, argv: Optional[List[str]] = None) -> None:
+    """
+    Runs `app` with uvicorn. The reloader needs the app's `import_string`
+    ("main:app"); without it the app object that is already imported is
+    served, so the module is not imported a second time.
+    """
+    import uvicorn
+
+    args = parse_args(argv)
+    options = uvicorn_options(args.profile, args.host, args.port, args.backlog, args.keep_alive, args.limit_concurrency)
+    if getattr(sys, "frozen", False):
+        # The module cannot be re-imported by name, and the reloader would
+        # restart the executable in a loop
+        options["reload"] = False
+    logger.info(
+        f"Starting {import_string} ({args.profile}) on {args.host}:{args.port}: loop={options['loop']}, "
+        f"http={options['http']}, backlog={options['backlog']}, keep_alive={options['timeout_keep_alive']}s, "
+        f"limit_concurrency={options['limit_concurrency']}, reload={options['reload']}."
+    )
+    if options["reload"]:
+        uvicorn.run(import_string, workers=1, **options)
+    else:
+        # Logging is already set up by the server's log pipeline
+        uvicorn.run(app, workers=1, log_config=None, **options)
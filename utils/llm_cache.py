@@ -0,0 +1,181 @@
+"""
+Persistent on-disk cache for LLM responses.
+
+Plugs into LangChain's cache hook (`ChatOpenAI(cache=...)` etc.), which keys
+every call on the serialized messages plus the model configuration string.
+Entries are stored as one file per SHA-256 of that pair, and the least
+recently used files are evicted once the directory grows past `max_bytes`.
+
+The messages are normalized before hashing so that a rerun of the same task
+can hit: the current date and time that browser-use writes into its system
+prompt is removed, and so are screenshots, which differ from run to run even
+on an unchanged page. The key is the text state of the page (URL, tabs and
+interactive elements) the agent sees, plus the conversation so far.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Written into browser-use's system prompt as 'Current date and time: 2025-01-31 14:05'
+DATE_LINE = re.compile(r"Current date and time: \d{4}-\d{2}-\d{2} \d{2}:\d{2}")
+
+
+def _drop_images(value):
+    if isinstance(value, list):
+        return [
+            _drop_images(item)
+            for item in value
+            if not (isinstance(item, dict) and item.get("type") in ("image_url", "image"))
+        ]
+    if isinstance(value, dict):
+        return {key: _drop_images(item) for key, item in value.items()}
+    return value
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    The part of a serialized prompt that identifies it across runs: without
+    the system prompt's timestamp and without image content parts.
+    """
+    try:
+        prompt = json.dumps(_drop_images(json.loads(prompt)), sort_keys=True)
+    except ValueError:
+        pass
+    return DATE_LINE.sub("Current date and time:", prompt)
+
+
+class DiskLLMCache(BaseCache):
+    """
+    LangChain cache that stores generations as JSON files under `root`.
+
+    LangChain calls lookup/update from a thread pool for async models, so
+    disk access stays off the event loop; the index is guarded by a lock.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 512 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # path -> (size, last access time)
+        self._index: Dict[str, Tuple[int, float]] = {}
+        self._total_bytes = 0
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self) -> None:
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                self._index[path] = (stat.st_size, stat.st_mtime)
+                self._total_bytes += stat.st_size
+
+    def _path(self, prompt: str, llm_string: str) -> str:
+        digest = hashlib.sha256(f"{llm_string}\x00{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], f"{digest}.json")
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        path = self._path(prompt, llm_string)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        try:
+            generations = loads(data)
+        except Exception as e:
+            logger.warning(f"Discarding unreadable LLM cache entry {path}: {e}")
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        with self._lock:
+            if path in self._index:
+                self._index[path] = (self._index[path][0], time.time())
+        self.hits += 1
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        path = self._path(prompt, llm_string)
+        data = dumps(return_val).encode("utf-8")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            previous = self._index.get(path)
+            if previous:
+                self._total_bytes -= previous[0]
+            self._index[path] = (len(data), time.time())
+            self._total_bytes += len(data)
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        if self._total_bytes <= self.max_bytes:
+            return
+        # Oldest access first
+        for path, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            del self._index[path]
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def _remove(self, path: str) -> None:
+        with self._lock:
+            entry = self._index.pop(path, None)
+            if entry:
+                self._total_bytes -= entry[0]
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self, **kwargs) -> None:
+        with self._lock:
+            for path in list(self._index):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._index.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._index),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
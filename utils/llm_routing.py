@@ -0,0 +1,194 @@
+"""
+Adaptive routing between a fast and a strong chat model.
+
+The Agent only talks to its LLM through `llm.with_structured_output(...)`
+followed by `ainvoke(messages)`. ModelRouter provides that same interface
+and picks a tier per call:
+
+- strong for planning (the first `planning_steps` steps), when the last
+  step reported an action error, for `sticky_steps` steps after an
+  escalation, and for anything that is not an agent step (e.g. the output
+  validator);
+- fast otherwise.
+
+A fast answer is escalated to the strong model (same messages) when it
+cannot be parsed, when it says the previous goal failed (ambiguity), or
+when it wants to finish the task, so final answers always come from the
+strong model.
+"""
+
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+logger = logging.getLogger(__name__)
+
+FAST = "fast"
+STRONG = "strong"
+
+
+def model_name(llm: Any) -> str:
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+
+
+class RouterStats:
+    """
+    Call counts, latency and escalation counters per tier. A server-wide
+    instance aggregates all tasks; each ModelRouter also keeps its own.
+    """
+
+    def __init__(self):
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.routes: Dict[str, int] = defaultdict(int)
+        self.escalations: Dict[str, int] = defaultdict(int)
+
+    def record_call(self, tier: str, seconds: float) -> None:
+        self.calls[tier] += 1
+        self.seconds[tier] += seconds
+
+    def snapshot(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "avg_latency_seconds": {
+                tier: round(self.seconds[tier] / count, 3) for tier, count in self.calls.items() if count
+            },
+            "routes": dict(self.routes),
+            "escalations": dict(self.escalations),
+        }
+
+
+class ModelRouter:
+    """
+    Drop-in replacement for the Agent's `llm` that routes each call to
+    `fast` or `strong`. One instance per task.
+    """
+
+    def __init__(
+        self,
+        fast: BaseChatModel,
+        strong: BaseChatModel,
+        planning_steps: int = 1,
+        sticky_steps: int = 1,
+        shared_stats: Optional[RouterStats] = None,
+        task_id: Optional[int] = None,
+    ):
+        self.fast = fast
+        self.strong = strong
+        self.planning_steps = planning_steps
+        self.sticky_steps = sticky_steps
+        self.stats = RouterStats()
+        self.shared_stats = shared_stats
+        self.task_id = task_id
+        self._sticky_remaining = 0
+        # Agent steps routed so far. Not derived from the messages: browser-use
+        # seeds them with an example AIMessage and trims old ones on long runs
+        self.agent_steps = 0
+        # Reported by the Agent in its run telemetry and logs
+        self.model_name = f"router({model_name(fast)}/{model_name(strong)})"
+
+    def with_structured_output(self, schema: Any, include_raw: bool = False, **kwargs) -> "RoutedStructuredModel":
+        return RoutedStructuredModel(self, schema, include_raw, kwargs)
+
+    def _count(self, attribute: str, key: str) -> None:
+        for stats in (self.stats, self.shared_stats):
+            if stats is not None:
+                getattr(stats, attribute)[key] += 1
+
+    def _record_call(self, tier: str, seconds: float) -> None:
+        for stats in (self.stats, self.shared_stats):
+            if stats is not None:
+                stats.record_call(tier, seconds)
+
+    def choose(self, messages: List[BaseMessage], is_agent_step: bool) -> tuple:
+        """
+        Returns (tier, reason) for a call with the given messages.
+        """
+        if not is_agent_step:
+            return STRONG, "non_step"
+        previous_steps = self.agent_steps
+        self.agent_steps += 1
+        if previous_steps < self.planning_steps:
+            return STRONG, "planning"
+        # Errors of the last step are either their own "Action error: ..."
+        # messages (include_in_memory) or part of the state message; both
+        # come after the agent's last output
+        for message in reversed(messages):
+            if isinstance(message, AIMessage):
+                break
+            if isinstance(message, HumanMessage) and "Action error" in _text(message):
+                return STRONG, "failure"
+        if self._sticky_remaining > 0:
+            self._sticky_remaining -= 1
+            return STRONG, "sticky"
+        return FAST, "routine"
+
+    def escalation_reason(self, response: Any) -> Optional[str]:
+        """
+        Returns why a fast answer should be redone by the strong model, or None.
+        """
+        parsed = response.get("parsed") if isinstance(response, dict) else response
+        if parsed is None or (isinstance(response, dict) and response.get("parsing_error")):
+            return "parse_failure"
+        current_state = getattr(parsed, "current_state", None)
+        if current_state is not None and "failed" in current_state.evaluation_previous_goal.lower():
+            return "ambiguity"
+        for action in getattr(parsed, "action", None) or []:
+            if getattr(action, "done", None) is not None:
+                return "final_answer"
+        return None
+
+
+class RoutedStructuredModel:
+    """
+    Structured-output runnable returned by ModelRouter.with_structured_output.
+    """
+
+    def __init__(self, router: ModelRouter, schema: Any, include_raw: bool, kwargs: dict):
+        self.router = router
+        self.include_raw = include_raw
+        self.is_agent_step = "action" in getattr(schema, "model_fields", {})
+        self._runnables = {
+            FAST: router.fast.with_structured_output(schema, include_raw=include_raw, **kwargs),
+            STRONG: router.strong.with_structured_output(schema, include_raw=include_raw, **kwargs),
+        }
+
+    async def _call(self, tier: str, messages: Any, config: Any) -> Any:
+        started = time.monotonic()
+        try:
+            return await self._runnables[tier].ainvoke(messages, config)
+        finally:
+            self.router._record_call(tier, time.monotonic() - started)
+
+    async def ainvoke(self, messages: Any, config: Any = None, **kwargs) -> Any:
+        router = self.router
+        tier, reason = router.choose(list(messages), self.is_agent_step)
+        router._count("routes", reason)
+        if tier == STRONG:
+            return await self._call(STRONG, messages, config)
+
+        try:
+            response = await self._call(FAST, messages, config)
+            reason = router.escalation_reason(response) if self.is_agent_step else None
+        except Exception as e:
+            logger.warning(f"Task ID {router.task_id}: Fast model failed, escalating: {e}")
+            reason = "error"
+        if reason is None:
+            return response
+
+        router._count("escalations", reason)
+        router._sticky_remaining = router.sticky_steps
+        logger.info(f"Task ID {router.task_id}: Escalating step to the strong model ({reason}).")
+        return await self._call(STRONG, messages, config)
+
+
+def _text(message: BaseMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return " ".join(
+        part.get("text", "") for part in message.content if isinstance(part, dict)
+    )
@@ -0,0 +1,187 @@
+"""
+Keeps the Ollama models resident and times the first token of each task.
+
+Ollama loads a model on its first request and unloads it once its
+keep-alive expires, so after an idle period the first task waits for the
+whole model to be loaded (tens of seconds for a 32B model with a 32k
+context). OllamaModelManager:
+
+- preloads the models at startup with an empty prompt and the same
+  `num_ctx` the agent uses (a different `num_ctx` forces a reload);
+- keeps them resident while tasks are running by sending `busy_keep_alive`,
+  and hands them back to `idle_keep_alive` once the last task finishes;
+- limits in-flight requests to `num_parallel`, which should match the
+  OLLAMA_NUM_PARALLEL the Ollama server was started with, so extra agents
+  wait here instead of timing out in the server's queue;
+- wraps each task's LLM to record its time to first token.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Sequence, Set, Union
+
+from ollama import AsyncClient
+
+logger = logging.getLogger(__name__)
+
+KeepAlive = Union[str, int]
+
+
+class OllamaModelManager:
+    """
+    One instance per server, shared by all tasks.
+    """
+
+    def __init__(
+        self,
+        models: Sequence[str],
+        num_ctx: int,
+        busy_keep_alive: KeepAlive = "30m",
+        idle_keep_alive: KeepAlive = "5m",
+        num_parallel: int = 1,
+        host: Optional[str] = None,
+    ):
+        self.models = list(models)
+        self.num_ctx = num_ctx
+        self.busy_keep_alive = busy_keep_alive
+        self.idle_keep_alive = idle_keep_alive
+        self.num_parallel = num_parallel
+        self.limiter = asyncio.Semaphore(num_parallel)
+        self.active_tasks = 0
+        self.load_seconds: Dict[str, float] = {}
+        self._client = AsyncClient(host=host)
+        self._keep_alive_lock = asyncio.Lock()
+        self._background: Set[asyncio.Task] = set()
+
+    async def _load(self, model: str, keep_alive: KeepAlive) -> float:
+        """
+        Loads `model` (or refreshes its keep-alive if it is already loaded).
+        Returns the server-reported load time in seconds.
+        """
+        response = await self._client.generate(
+            model=model, prompt="", keep_alive=keep_alive, options={"num_ctx": self.num_ctx}
+        )
+        return (response.load_duration or 0) / 1e9
+
+    async def preload(self) -> Dict[str, float]:
+        """
+        Loads every model before the first task. Failures are logged, not
+        raised, so the server still starts when Ollama is down.
+        """
+        for model in self.models:
+            started = time.monotonic()
+            try:
+                self.load_seconds[model] = await self._load(model, self._current_keep_alive())
+            except Exception as e:
+                logger.warning(f"Could not preload Ollama model {model}: {e}")
+                continue
+            logger.info(
+                f"Preloaded Ollama model {model} in {time.monotonic() - started:.1f}s "
+                f"(load {self.load_seconds[model]:.1f}s, num_ctx {self.num_ctx})."
+            )
+        return dict(self.load_seconds)
+
+    def _current_keep_alive(self) -> KeepAlive:
+        return self.busy_keep_alive if self.active_tasks else self.idle_keep_alive
+
+    async def _apply_keep_alive(self) -> None:
+        # Serialized and re-evaluated when sent, so quick start/finish
+        # sequences always end with the keep-alive matching the task count
+        async with self._keep_alive_lock:
+            keep_alive = self._current_keep_alive()
+            for model in self.models:
+                try:
+                    await self._load(model, keep_alive)
+                except Exception as e:
+                    logger.warning(f"Could not set keep-alive {keep_alive} on Ollama model {model}: {e}")
+
+    def _in_background(self, coroutine: Any) -> None:
+        task = asyncio.create_task(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def task_started(self) -> None:
+        """
+        Call when a task starts. The first active task reloads the models
+        if needed, overlapping the load with browser startup.
+        """
+        self.active_tasks += 1
+        if self.active_tasks == 1:
+            self._in_background(self._apply_keep_alive())
+
+    def task_finished(self) -> None:
+        """
+        Call when a task ends. Once no task is left the models fall back to
+        `idle_keep_alive`.
+        """
+        self.active_tasks = max(0, self.active_tasks - 1)
+        if self.active_tasks == 0:
+            self._in_background(self._apply_keep_alive())
+
+    def wrap(self, llm: Any, task_id: Optional[int] = None, started_at: Optional[float] = None) -> "OllamaTaskModel":
+        return OllamaTaskModel(self, llm, task_id, started_at)
+
+
+class OllamaTaskModel:
+    """
+    Wraps a task's LLM (a ChatOllama or a ModelRouter over ChatOllama
+    models). Calls wait for a free parallel slot; the first one records the
+    task's time to first token.
+
+    `time_to_first_token` counts from `started_at` (time.monotonic(), the
+    task start by default) to the first generated token, which is the end
+    of the call minus the server's generation time.
+    """
+
+    def __init__(self, manager: OllamaModelManager, llm: Any, task_id: Optional[int], started_at: Optional[float]):
+        self.manager = manager
+        self.llm = llm
+        self.task_id = task_id
+        self.started_at = started_at if started_at is not None else time.monotonic()
+        self.time_to_first_token: Optional[float] = None
+        self.model_load_seconds: Optional[float] = None
+        self.queue_seconds = 0.0
+        self.model_name = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+
+    def with_structured_output(self, schema: Any, include_raw: bool = False, **kwargs) -> "_LimitedStructuredModel":
+        return _LimitedStructuredModel(self, self.llm.with_structured_output(schema, include_raw=include_raw, **kwargs))
+
+    def _record_first_call(self, response: Any, finished_at: float) -> None:
+        raw = response.get("raw") if isinstance(response, dict) else None
+        metadata = getattr(raw, "response_metadata", None) or {}
+        first_token_at = finished_at - (metadata.get("eval_duration") or 0) / 1e9
+        self.time_to_first_token = round(first_token_at - self.started_at, 3)
+        if metadata.get("load_duration") is not None:
+            self.model_load_seconds = round(metadata["load_duration"] / 1e9, 3)
+        logger.info(
+            f"Task ID {self.task_id}: Time to first token {self.time_to_first_token}s "
+            f"(model load {self.model_load_seconds}s, queued {self.queue_seconds:.3f}s)."
+        )
+
+
+class _LimitedStructuredModel:
+    def __init__(self, owner: OllamaTaskModel, runnable: Any):
+        self.owner = owner
+        self.runnable = runnable
+
+    async def ainvoke(self, messages: Any, config: Any = None, **kwargs) -> Any:
+        owner = self.owner
+        queued = time.monotonic()
+        async with owner.manager.limiter:
+            owner.queue_seconds += time.monotonic() - queued
+            response = await self.runnable.ainvoke(messages, config, **kwargs)
+        if owner.time_to_first_token is None:
+            owner._record_first_call(response, time.monotonic())
+        return response
+
+
+def parse_keep_alive(value: str) -> KeepAlive:
+    """
+    Parses a keep-alive setting: a duration string ("30m") or a whole number
+    of seconds ("-1" keeps the model loaded indefinitely).
+    """
+    try:
+        return int(value)
+    except ValueError:
+        return value
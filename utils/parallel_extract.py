@@ -0,0 +1,167 @@
+"""
+Parallel page extraction for the agent.
+
+Once the agent has collected a list of URLs to read (search results, product
+pages, articles...), browser-use visits them one at a time: open or navigate,
+extract, go back, with an LLM call for every step. The `parallel_extract`
+action added by ParallelExtractor opens up to `max_tabs` of them in extra tabs
+of the agent's browser context at once, waits for them to load concurrently,
+extracts their main content like browser-use's `extract_content` and returns
+all of it in a single step.
+
+The tabs belong to the same context as the agent's own, so they share its
+cookies, request filter and HTTP cache, and are closed again before the action
+returns. The agent stays on the tab it was on.
+
+All of the content goes into the agent's memory and so into every later
+prompt. A call therefore reads at most `max_urls` pages, and their content
+shares a budget of `max_chars` characters: pages shorter than an even share
+leave the rest to the longer ones.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from browser_use.agent.views import ActionResult
+from browser_use.controller.service import Controller
+from main_content_extractor import MainContentExtractor
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+
+class ParallelExtractAction(BaseModel):
+    urls: List[str] = Field(description="Full URLs of the pages to read")
+    include_links: bool = False
+
+
+def split_budget(lengths: List[int], budget: int) -> List[int]:
+    """
+    Characters to keep of each of several texts of `lengths` so that they
+    add up to at most `budget`: texts shorter than an even share are kept
+    whole and what they leave is shared by the others.
+    """
+    limits = [0] * len(lengths)
+    remaining = budget
+    for position, index in enumerate(sorted(range(len(lengths)), key=lengths.__getitem__)):
+        limits[index] = min(lengths[index], remaining // (len(lengths) - position))
+        remaining -= limits[index]
+    return limits
+
+
+class ParallelExtractor:
+    """
+    One instance per task. `max_tabs` caps the tabs open at once; further
+    URLs wait for a free tab. A page that has not finished loading after
+    `timeout_seconds` is extracted as far as it got. A call reads the first
+    `max_urls` URLs and cuts their content to `max_chars` characters in
+    total (0 removes either cap).
+    """
+
+    def __init__(self, max_tabs: int = 6, timeout_seconds: float = 20.0, max_urls: int = 12, max_chars: int = 40000):
+        self.max_tabs = max_tabs
+        self.timeout_seconds = timeout_seconds
+        self.max_urls = max_urls
+        self.max_chars = max_chars
+        self.calls = 0
+        self.pages = 0
+        self.failed = 0
+        self.skipped = 0
+        self.truncated = 0
+        self.seconds = 0.0
+
+    def register_actions(self, controller: Controller) -> None:
+        """
+        Adds the `parallel_extract` action, unless `max_tabs` is 0.
+        """
+        if not self.max_tabs:
+            return
+
+        @controller.action(
+            "Read several pages at once: opens the urls in background tabs in parallel and extracts their content "
+            "as text, or markdown with links if include_links is set to true. Use it instead of visiting pages "
+            f"one by one when you only need to read them. Reads at most {self.max_urls or 'all'} urls per call",
+            param_model=ParallelExtractAction,
+            requires_browser=True,
+        )
+        async def parallel_extract(params: ParallelExtractAction, browser: Any):
+            return await self.extract(params, browser)
+
+    async def extract(self, params: ParallelExtractAction, browser: Any) -> ActionResult:
+        urls = list(dict.fromkeys(url.strip() for url in params.urls if url.strip()))
+        if not urls:
+            return ActionResult(error="No urls to extract", include_in_memory=True)
+        skipped: List[str] = []
+        if self.max_urls and len(urls) > self.max_urls:
+            urls, skipped = urls[: self.max_urls], urls[self.max_urls :]
+        output_format = "markdown" if params.include_links else "text"
+        session = await browser.get_session()
+        agent_page = session.current_page
+        tabs = asyncio.Semaphore(self.max_tabs)
+        started = time.monotonic()
+
+        async def read(url: str) -> str:
+            async with tabs:
+                page = await session.context.new_page()
+                try:
+                    try:
+                        await page.goto(url, wait_until="load", timeout=self.timeout_seconds * 1000)
+                    except Exception as e:
+                        # Timed out pages are read as far as they loaded
+                        if page.url in ("", "about:blank"):
+                            raise
+                        logger.debug(f"Page {url} did not finish loading: {e}")
+                    html = await page.content()
+                finally:
+                    await page.close()
+            return await asyncio.to_thread(MainContentExtractor.extract, html=html, output_format=output_format)
+
+        outcomes = await asyncio.gather(*(read(url) for url in urls), return_exceptions=True)
+        # browser-use switches the agent to every page opened in its context
+        session.current_page = agent_page
+
+        contents = ["" if isinstance(outcome, Exception) else outcome for outcome in outcomes]
+        limits: List[Optional[int]] = (
+            split_budget([len(content) for content in contents], self.max_chars) if self.max_chars else [None] * len(urls)
+        )
+        sections = []
+        failed = 0
+        truncated = 0
+        for url, outcome, limit in zip(urls, outcomes, limits):
+            if isinstance(outcome, Exception):
+                failed += 1
+                sections.append(f"## {url}\nFailed to load: {outcome}")
+            elif limit is not None and len(outcome) > limit:
+                truncated += 1
+                sections.append(f"## {url}\n{outcome[:limit]}\n[truncated]")
+            else:
+                sections.append(f"## {url}\n{outcome}")
+        if skipped:
+            sections.append(
+                f"## Not read\nOnly {self.max_urls} urls are read per call; call parallel_extract again for: "
+                + ", ".join(skipped)
+            )
+        elapsed = time.monotonic() - started
+        self.calls += 1
+        self.pages += len(urls)
+        self.failed += failed
+        self.skipped += len(skipped)
+        self.truncated += truncated
+        self.seconds += elapsed
+        msg = f"📄  Extracted {len(urls) - failed} of {len(urls)} pages in parallel as {output_format}\n\n" + "\n\n".join(
+            sections
+        )
+        logger.info(f"Extracted {len(urls) - failed}/{len(urls)} pages in parallel in {elapsed:.1f}s.")
+        return ActionResult(extracted_content=msg, include_in_memory=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "pages": self.pages,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "truncated": self.truncated,
+            "seconds": round(self.seconds, 3),
+        }
@@ -0,0 +1,53 @@
+"""
+Chat model construction for any of the supported providers.
+
+Each server builds its own provider's model directly; this module is used
+for the other providers in a failover chain, so main.py can fall back to
+Gemini or a local Ollama model and vice versa. Provider packages are
+imported on first use.
+"""
+
+import os
+from typing import Any, List, Tuple
+
+from pydantic import SecretStr
+
+PROVIDERS = ("openai", "google", "ollama")
+
+
+def create_chat_model(provider: str, model: str, **kwargs: Any) -> Any:
+    """
+    Creates a LangChain chat model for `provider`. API keys come from
+    OPENAI_API_KEY and GEMINI_API_KEY, as in the servers; extra keyword
+    arguments (cache, rate_limiter, callbacks, ...) are passed through.
+    """
+    if provider == "openai":
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(model=model, api_key=os.getenv("OPENAI_API_KEY"), max_retries=0, **kwargs)
+    if provider == "google":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY is not set")
+        return ChatGoogleGenerativeAI(model=model, api_key=SecretStr(api_key), max_retries=0, **kwargs)
+    if provider == "ollama":
+        from langchain_ollama import ChatOllama
+
+        return ChatOllama(model=model, num_ctx=32000, **kwargs)
+    raise ValueError(f"Unknown LLM provider {provider!r}, expected one of {PROVIDERS}")
+
+
+def parse_provider_chain(value: str) -> List[Tuple[str, str]]:
+    """
+    Parses "provider:model,..." into (provider, model) pairs. Only the first
+    colon separates the two, so Ollama tags such as "qwen2.5:7b" work.
+    """
+    chain = []
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        provider, _, model = item.partition(":")
+        if provider not in PROVIDERS or not model:
+            raise ValueError(f"Invalid provider entry {item!r}, expected provider:model")
+        chain.append((provider, model))
+    return chain
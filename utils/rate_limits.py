@@ -0,0 +1,286 @@
+"""
+Shared rate limiting and retries for LLM calls.
+
+Every chat model gets the ProviderLimiter of its provider and model, shared
+by all concurrent agents. The limiter holds two token buckets, requests per
+minute and tokens per minute, and plugs into LangChain's `rate_limiter`
+hook, so cache hits are not limited. Tokens are reserved up front from a
+running average of tokens per call and corrected with the actual usage
+once the call returns.
+
+RetryingModel wraps a chat model and retries calls that fail with 429 or
+5xx using jittered exponential backoff. A 429 pauses the whole limiter, so
+every agent on that model backs off rather than only the one that was
+rejected.
+
+Time spent waiting is added to the calling task's LimiterStats (a context
+variable set by `track_task()`), so it can be reported per task.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.rate_limiters import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+@dataclass
+class LimiterStats:
+    wait_seconds: float = 0.0  # Waiting for rate limit capacity
+    backoff_seconds: float = 0.0  # Sleeping before retries of 5xx errors
+    retries: int = 0
+
+
+_task_stats: ContextVar[Optional[LimiterStats]] = ContextVar("llm_limiter_stats", default=None)
+
+
+def track_task() -> LimiterStats:
+    """
+    Starts collecting LimiterStats for the current task (asyncio context).
+    """
+    stats = LimiterStats()
+    _task_stats.set(stats)
+    return stats
+
+
+class TokenBucket:
+    """
+    Bucket refilled at `per_minute / 60` per second up to `per_minute`.
+    `reserve` takes capacity immediately, letting the level go negative, and
+    returns how long the caller has to wait for it. 0 means unlimited.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.per_minute, self.level + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        if not self.per_minute:
+            return 0.0
+        self._refill()
+        self.level -= amount
+        return max(0.0, -self.level * 60 / self.per_minute)
+
+    def adjust(self, amount: float) -> None:
+        if self.per_minute:
+            self._refill()
+            self.level -= amount
+
+
+class _UsageHandler(BaseCallbackHandler):
+    run_inline = True
+
+    def __init__(self, limiter: "ProviderLimiter"):
+        self.limiter = limiter
+
+    def on_llm_end(self, response: Any, **kwargs) -> None:
+        tokens = None
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    tokens = (tokens or 0) + usage.get("total_tokens", 0)
+        if tokens is None:
+            tokens = ((response.llm_output or {}).get("token_usage") or {}).get("total_tokens")
+        if tokens:
+            self.limiter.record_usage(tokens)
+
+
+class ProviderLimiter(BaseRateLimiter):
+    """
+    Requests-per-minute and tokens-per-minute limits for one provider and
+    model. Attach it as the chat model's `rate_limiter` and `usage_handler`
+    as one of its callbacks.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0, tokens_estimate: int = 4000):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.tokens_estimate = float(tokens_estimate)
+        self.usage_handler = _UsageHandler(self)
+        self.paused_until = 0.0
+        self.calls = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+        self.tokens_used = 0
+        self.errors: Dict[str, int] = {}
+
+    def _reserve(self) -> float:
+        self.calls += 1
+        delay = max(
+            self.requests.reserve(1),
+            self.tokens.reserve(self.tokens_estimate),
+            self.paused_until - time.monotonic(),
+        )
+        if delay > 0:
+            self.throttled += 1
+            self.wait_seconds += delay
+            stats = _task_stats.get()
+            if stats is not None:
+                stats.wait_seconds += delay
+        return delay
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return True
+
+    def record_usage(self, tokens: int) -> None:
+        # The reservation used the estimate; charge the difference
+        self.tokens.adjust(tokens - self.tokens_estimate)
+        self.tokens_estimate += 0.2 * (tokens - self.tokens_estimate)
+        self.tokens_used += tokens
+
+    def record_error(self, status: int) -> None:
+        key = str(status)
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def snapshot(self) -> dict:
+        return {
+            "requests_per_minute": self.requests.per_minute,
+            "tokens_per_minute": self.tokens.per_minute,
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "tokens_used": self.tokens_used,
+            "tokens_per_call_estimate": round(self.tokens_estimate),
+            "errors": dict(self.errors),
+        }
+
+
+class RateLimitRegistry:
+    """
+    One ProviderLimiter per provider and model, created on first use with
+    the limits configured for that model (unlimited otherwise).
+    """
+
+    def __init__(self, limits: Optional[Dict[str, tuple]] = None):
+        self.limits = limits or {}
+        self.limiters: Dict[str, ProviderLimiter] = {}
+
+    def get(self, provider: str, model: str) -> ProviderLimiter:
+        key = f"{provider}:{model}"
+        if key not in self.limiters:
+            requests_per_minute, tokens_per_minute = self.limits.get(model, (0, 0))
+            self.limiters[key] = ProviderLimiter(key, requests_per_minute, tokens_per_minute)
+        return self.limiters[key]
+
+    def snapshot(self) -> dict:
+        return {key: limiter.snapshot() for key, limiter in self.limiters.items()}
+
+
+def parse_rate_limits(value: str) -> Dict[str, tuple]:
+    """
+    Parses "model=requests/tokens,..." (per minute, 0 = unlimited), e.g.
+    "gpt-4o=500/30000,gpt-4o-mini=500/200000".
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        model, _, rates = item.partition("=")
+        requests, _, tokens = rates.partition("/")
+        limits[model.strip()] = (float(requests or 0), float(tokens or 0))
+    return limits
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    """
+    HTTP status of a provider error (OpenAI, Google API core, Ollama, httpx).
+    """
+    for candidate in (
+        getattr(error, "status_code", None),
+        getattr(getattr(error, "response", None), "status_code", None),
+        getattr(error, "code", None),
+    ):
+        if isinstance(candidate, int):
+            return candidate
+    return None
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryingModel:
+    """
+    Wraps a chat model; structured-output calls are retried on 429/5xx with
+    full-jitter exponential backoff (at most `max_retries` times).
+    """
+
+    def __init__(self, llm: Any, limiter: ProviderLimiter, max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.llm = llm
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.model_name = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+
+    def with_structured_output(self, schema: Any, include_raw: bool = False, **kwargs) -> "_RetryingStructuredModel":
+        return _RetryingStructuredModel(self, self.llm.with_structured_output(schema, include_raw=include_raw, **kwargs))
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, _retry_after(error) or 0.0)
+
+
+class _RetryingStructuredModel:
+    def __init__(self, owner: RetryingModel, runnable: Any):
+        self.owner = owner
+        self.runnable = runnable
+
+    async def ainvoke(self, messages: Any, config: Any = None, **kwargs) -> Any:
+        owner = self.owner
+        attempt = 0
+        while True:
+            try:
+                return await self.runnable.ainvoke(messages, config, **kwargs)
+            except Exception as e:
+                status = status_code(e)
+                if status not in RETRYABLE_STATUS_CODES or attempt >= owner.max_retries:
+                    raise
+                owner.limiter.record_error(status)
+                delay = owner.backoff(attempt, e)
+                attempt += 1
+                stats = _task_stats.get()
+                if stats is not None:
+                    stats.retries += 1
+                logger.warning(
+                    f"{owner.limiter.name}: HTTP {status}, retry {attempt}/{owner.max_retries} in {delay:.1f}s."
+                )
+                if status == 429:
+                    # The next attempt waits in the limiter, together with every other caller
+                    owner.limiter.pause(delay)
+                else:
+                    if stats is not None:
+                        stats.backoff_seconds += delay
+                    await asyncio.sleep(delay)
+
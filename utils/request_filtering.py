@@ -0,0 +1,419 @@
+"""
+Network request filtering for the agent's browser.
+
+Pages load every image, font, video, analytics script and ad they reference,
+and the agent waits for all of it on each navigation and before each state
+snapshot. A RequestFilter blocks requests by resource type and by domain
+before they leave Chrome, according to a named FilterProfile:
+
+- off: nothing is blocked;
+- trackers: ad, analytics and session-recording domains;
+- lean: trackers, plus media and web fonts;
+- text: lean, plus images. Screenshots then show empty image boxes.
+
+Blocking is done over a CDP session per page rather than Playwright's
+`route()`, which would disable Chrome's HTTP cache: domains are blocked by
+Chrome itself (Network.setBlockedURLs), and only requests of a blocked
+resource type are paused and failed (Fetch). Pages opened by the page itself
+are attached as soon as Playwright reports them, so their first requests may
+get through.
+
+With a SharedHttpCache (see utils/http_cache.py), requests for scripts,
+stylesheets, images and fonts that are not blocked are paused as well, to
+be answered from that cache or have their response stored in it.
+
+The same CDP session reports the encoded size of every loaded response.
+Blocked requests never download, so their size is estimated from the average
+size of loaded responses of the same type across all tasks (FilterStats), or
+from typical sizes until one was seen.
+"""
+
+import asyncio
+import base64
+import logging
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from utils.http_cache import CACHEABLE_TYPES, is_private_request
+
+logger = logging.getLogger(__name__)
+
+# Playwright resource type names and their CDP equivalents. Documents are
+# never blocked.
+CDP_RESOURCE_TYPES = {
+    "stylesheet": "Stylesheet",
+    "image": "Image",
+    "media": "Media",
+    "font": "Font",
+    "script": "Script",
+    "texttrack": "TextTrack",
+    "xhr": "XHR",
+    "fetch": "Fetch",
+    "prefetch": "Prefetch",
+    "eventsource": "EventSource",
+    "websocket": "WebSocket",
+    "manifest": "Manifest",
+    "ping": "Ping",
+    "other": "Other",
+}
+
+# Rough encoded sizes per request, used until a response of the type was seen
+TYPICAL_BYTES = {"image": 30000, "media": 250000, "font": 30000, "script": 25000, "stylesheet": 15000}
+DEFAULT_TYPICAL_BYTES = 5000
+
+TRACKER_DOMAINS = (
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googletagservices.com",
+    "adservice.google.com",
+    "amazon-adsystem.com",
+    "adnxs.com",
+    "adsrvr.org",
+    "criteo.com",
+    "criteo.net",
+    "taboola.com",
+    "outbrain.com",
+    "pubmatic.com",
+    "rubiconproject.com",
+    "casalemedia.com",
+    "moatads.com",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "hotjar.com",
+    "fullstory.com",
+    "clarity.ms",
+    "mixpanel.com",
+    "segment.io",
+    "nr-data.net",
+    "bat.bing.com",
+    "connect.facebook.net",
+)
+
+
+class FilterLevel(str, Enum):
+    OFF = "off"
+    TRACKERS = "trackers"
+    LEAN = "lean"
+    TEXT = "text"
+
+
+@dataclass(frozen=True)
+class FilterProfile:
+    name: str
+    block_types: FrozenSet[str] = frozenset()
+    block_domains: Tuple[str, ...] = ()
+
+    def url_patterns(self) -> List[str]:
+        """
+        Network.setBlockedURLs patterns for the domain and its subdomains.
+        """
+        patterns = []
+        for domain in self.block_domains:
+            patterns += [f"*://{domain}/*", f"*://*.{domain}/*"]
+        return patterns
+
+    def fetch_patterns(self, cached_types: Iterable[str] = ()) -> List[Dict[str, str]]:
+        """
+        Fetch.enable patterns: blocked types are paused before they are
+        sent, `cached_types` that are not blocked also once their response
+        arrived.
+        """
+        patterns = [
+            {"urlPattern": "*", "resourceType": CDP_RESOURCE_TYPES[resource_type], "requestStage": "Request"}
+            for resource_type in sorted(self.block_types)
+        ]
+        for resource_type in sorted(set(cached_types) - self.block_types):
+            for stage in ("Request", "Response"):
+                patterns.append({"urlPattern": "*", "resourceType": CDP_RESOURCE_TYPES[resource_type], "requestStage": stage})
+        return patterns
+
+
+def build_profiles(extra_domains: Iterable[str] = ()) -> Dict[FilterLevel, FilterProfile]:
+    """
+    The profile of each level; `extra_domains` are blocked by all but "off".
+    """
+    domains = TRACKER_DOMAINS + tuple(domain for domain in extra_domains if domain not in TRACKER_DOMAINS)
+    return {
+        FilterLevel.OFF: FilterProfile("off"),
+        FilterLevel.TRACKERS: FilterProfile("trackers", block_domains=domains),
+        FilterLevel.LEAN: FilterProfile("lean", frozenset({"media", "font"}), domains),
+        FilterLevel.TEXT: FilterProfile("text", frozenset({"media", "font", "image"}), domains),
+    }
+
+
+def parse_domains(value: str) -> List[str]:
+    """
+    Parses a comma separated domain list, e.g. "ads.example.com,tracker.io".
+    """
+    return [part.strip().lower() for part in value.split(",") if part.strip()]
+
+
+def _domain(url: str) -> str:
+    return urlsplit(url).hostname or ""
+
+
+class FilterStats:
+    """
+    Server-wide counters per profile: requests and bytes loaded and blocked,
+    and the average step and state timings of the tasks that used it, to
+    compare profiles. Also holds the average response size per resource
+    type used to estimate the bytes a blocked request saved.
+    """
+
+    def __init__(self):
+        self.type_requests: Dict[str, int] = defaultdict(int)
+        self.type_bytes: Dict[str, int] = defaultdict(int)
+        self.profiles: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def record_response(self, resource_type: str, size: int) -> None:
+        self.type_requests[resource_type] += 1
+        self.type_bytes[resource_type] += size
+
+    def average_bytes(self, resource_type: str) -> int:
+        count = self.type_requests.get(resource_type)
+        if not count:
+            return TYPICAL_BYTES.get(resource_type, DEFAULT_TYPICAL_BYTES)
+        return self.type_bytes[resource_type] // count
+
+    def record_task(self, request_filter: "RequestFilter", step_metrics: List[Dict[str, Any]]) -> None:
+        totals = self.profiles[request_filter.profile.name]
+        totals["tasks"] += 1
+        totals["requests_loaded"] += request_filter.requests_loaded
+        totals["bytes_loaded"] += request_filter.bytes_loaded
+        totals["requests_blocked"] += request_filter.requests_blocked
+        totals["bytes_saved"] += request_filter.bytes_saved
+        for metrics in step_metrics:
+            if "step_seconds" in metrics:
+                totals["steps"] += 1
+                totals["step_seconds"] += metrics["step_seconds"]
+            if "state_seconds" in metrics:
+                totals["states"] += 1
+                totals["state_seconds"] += metrics["state_seconds"]
+
+    def snapshot(self) -> dict:
+        profiles = {}
+        for name, totals in self.profiles.items():
+            profiles[name] = {
+                "tasks": int(totals["tasks"]),
+                "requests_loaded": int(totals["requests_loaded"]),
+                "bytes_loaded": int(totals["bytes_loaded"]),
+                "requests_blocked": int(totals["requests_blocked"]),
+                "bytes_saved": int(totals["bytes_saved"]),
+                "avg_step_seconds": round(totals["step_seconds"] / totals["steps"], 3) if totals["steps"] else None,
+                "avg_state_seconds": round(totals["state_seconds"] / totals["states"], 3) if totals["states"] else None,
+            }
+        return {
+            "profiles": profiles,
+            "avg_response_bytes": {
+                resource_type: self.average_bytes(resource_type) for resource_type in sorted(self.type_requests)
+            },
+        }
+
+
+class RequestFilter:
+    """
+    Applies a FilterProfile to the pages of a Playwright browser context and
+    counts what was loaded and blocked, answering from `http_cache` (a
+    SharedHttpCache) when one is given. One instance per task.
+    """
+
+    def __init__(
+        self,
+        profile: FilterProfile,
+        shared_stats: Optional[FilterStats] = None,
+        task_id: Optional[int] = None,
+        http_cache=None,
+    ):
+        self.profile = profile
+        self.shared_stats = shared_stats
+        self.task_id = task_id
+        self.http_cache = http_cache
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_stores = 0
+        self.cache_bytes_saved = 0
+        self._fulfilled: set = set()  # Network request IDs answered from the cache
+        self._sent_cookies: set = set()  # Network request IDs Chrome attached cookies to
+        self.requests_loaded = 0
+        self.bytes_loaded = 0
+        self.requests_blocked = 0
+        self.bytes_saved = 0
+        self.blocked_types: Counter = Counter()
+        self.blocked_domains: Counter = Counter()
+        self._context = None
+        self._cdp_sessions: List[Any] = []
+        self._requests: Dict[str, Tuple[str, str]] = {}  # Type and URL by request ID
+
+    async def attach(self, context) -> None:
+        """
+        Filters the pages of `context`, the open ones and those opened later.
+        """
+        self._context = context
+        context.on("page", self._attach_page)
+        for page in context.pages:
+            await self._attach_page(page)
+
+    async def detach(self) -> None:
+        """
+        Stops filtering and counting, leaving the pages open (used when a
+        session's context outlives the task).
+        """
+        if self._context is None:
+            return
+        self._context.remove_listener("page", self._attach_page)
+        self._context = None
+        for cdp in self._cdp_sessions:
+            try:
+                await cdp.detach()
+            except Exception:
+                pass  # The page was closed
+        self._cdp_sessions = []
+
+    async def _attach_page(self, page) -> None:
+        try:
+            cdp = await page.context.new_cdp_session(page)
+            cdp.on("Network.requestWillBeSent", self._on_request)
+            cdp.on("Network.requestWillBeSentExtraInfo", self._on_request_extra)
+            cdp.on("Network.loadingFinished", self._on_finished)
+            cdp.on("Network.loadingFailed", self._on_failed)
+            cdp.on("Fetch.requestPaused", lambda event: asyncio.ensure_future(self._on_paused(cdp, event)))
+            await cdp.send("Network.enable")
+            if self.profile.block_domains:
+                await cdp.send("Network.setBlockedURLs", {"urls": self.profile.url_patterns()})
+            patterns = self.profile.fetch_patterns(CACHEABLE_TYPES if self.http_cache is not None else ())
+            if patterns:
+                await cdp.send("Fetch.enable", {"patterns": patterns})
+            self._cdp_sessions.append(cdp)
+        except Exception as e:
+            logger.warning(f"Task ID {self.task_id}: Could not filter requests of {page.url}: {e}")
+
+    def _on_request(self, event: dict) -> None:
+        resource_type = (event.get("type") or "Other").lower()
+        self._requests[event["requestId"]] = (resource_type, event.get("request", {}).get("url", ""))
+
+    def _on_request_extra(self, event: dict) -> None:
+        # Chrome adds the context's cookies after Fetch pauses the request, so
+        # they only show up here, before the response is paused
+        if self.http_cache is None:
+            return
+        if is_private_request(event.get("headers", {})) or any(
+            not cookie.get("blockedReasons") for cookie in event.get("associatedCookies", [])
+        ):
+            self._sent_cookies.add(event["requestId"])
+
+    def _on_finished(self, event: dict) -> None:
+        resource_type, _ = self._requests.pop(event["requestId"], ("other", ""))
+        self._sent_cookies.discard(event["requestId"])
+        if event["requestId"] in self._fulfilled:
+            self._fulfilled.discard(event["requestId"])
+            return
+        size = int(event.get("encodedDataLength") or 0)
+        self.requests_loaded += 1
+        self.bytes_loaded += size
+        if self.shared_stats is not None:
+            self.shared_stats.record_response(resource_type, size)
+
+    def _on_failed(self, event: dict) -> None:
+        resource_type, url = self._requests.pop(event["requestId"], ((event.get("type") or "other").lower(), ""))
+        self._sent_cookies.discard(event["requestId"])
+        # Requests blocked by Network.setBlockedURLs; those failed in
+        # _on_paused are already counted
+        if event.get("blockedReason") == "inspector":
+            self._count_blocked(resource_type, url)
+
+    async def _on_paused(self, cdp, event: dict) -> None:
+        resource_type = event.get("resourceType", "Other").lower()
+        request = event.get("request", {})
+        try:
+            if resource_type in self.profile.block_types:
+                self._count_blocked(resource_type, request.get("url", ""))
+                await cdp.send("Fetch.failRequest", {"requestId": event["requestId"], "errorReason": "BlockedByClient"})
+            elif "responseStatusCode" in event or "responseErrorReason" in event:
+                await self._store_response(cdp, event)
+            else:
+                await self._serve_cached(cdp, event)
+        except Exception as e:
+            # Usually the page navigated away or was closed
+            logger.debug(f"Task ID {self.task_id}: Paused request {request.get('url')} not handled: {e}")
+
+    async def _serve_cached(self, cdp, event: dict) -> None:
+        request = event["request"]
+        cached = None
+        if request.get("method") == "GET" and not is_private_request(request.get("headers", {})):
+            cached = await asyncio.to_thread(self.http_cache.lookup, request["url"])
+            # Chrome only adds the context's cookies after this pause, so a hit
+            # is served only if it has none for the URL
+            if cached is not None and (await cdp.send("Network.getCookies", {"urls": [request["url"]]}))["cookies"]:
+                cached = None
+            if cached is None:
+                self.cache_misses += 1
+        if cached is None:
+            await cdp.send("Fetch.continueRequest", {"requestId": event["requestId"]})
+            return
+        self.cache_hits += 1
+        self.cache_bytes_saved += cached.encoded_bytes
+        if event.get("networkId"):
+            self._fulfilled.add(event["networkId"])
+        await cdp.send(
+            "Fetch.fulfillRequest",
+            {
+                "requestId": event["requestId"],
+                "responseCode": cached.status,
+                "responseHeaders": cached.headers,
+                "body": base64.b64encode(cached.body).decode("ascii"),
+            },
+        )
+
+    async def _store_response(self, cdp, event: dict) -> None:
+        request = event["request"]
+        status = event.get("responseStatusCode")
+        headers = event.get("responseHeaders", [])
+        lifetime = None
+        if request.get("method") == "GET" and status is not None and event.get("networkId") not in self._sent_cookies:
+            lifetime = self.http_cache.cacheable_for(status, request.get("headers", {}), headers)
+        if lifetime:
+            response = await cdp.send("Fetch.getResponseBody", {"requestId": event["requestId"]})
+            body = (
+                base64.b64decode(response["body"]) if response.get("base64Encoded") else response["body"].encode("utf-8")
+            )
+            if await asyncio.to_thread(self.http_cache.store, request["url"], status, headers, body, lifetime):
+                self.cache_stores += 1
+        await cdp.send("Fetch.continueRequest", {"requestId": event["requestId"]})
+
+    def _count_blocked(self, resource_type: str, url: str) -> None:
+        self.requests_blocked += 1
+        self.blocked_types[resource_type] += 1
+        if url:
+            self.blocked_domains[_domain(url)] += 1
+        self.bytes_saved += (
+            self.shared_stats.average_bytes(resource_type)
+            if self.shared_stats is not None
+            else TYPICAL_BYTES.get(resource_type, DEFAULT_TYPICAL_BYTES)
+        )
+
+    def snapshot(self) -> dict:
+        return {
+            "profile": self.profile.name,
+            "requests_loaded": self.requests_loaded,
+            "bytes_loaded": self.bytes_loaded,
+            "requests_blocked": self.requests_blocked,
+            "bytes_saved": self.bytes_saved,  # Estimated
+            "blocked_types": dict(self.blocked_types),
+            "blocked_domains": dict(self.blocked_domains.most_common(10)),
+            **(
+                {
+                    "cache_hits": self.cache_hits,
+                    "cache_misses": self.cache_misses,
+                    "cache_stores": self.cache_stores,
+                    "cache_bytes_saved": self.cache_bytes_saved,
+                }
+                if self.http_cache is not None
+                else {}
+            ),
+        }
@@ -0,0 +1,104 @@
+"""
+Fast JSON encoding for task records.
+
+FastAPI's default response path validates every record against the
+response_model, walks it through jsonable_encoder and then json.dumps the
+result. For /lastResponses that work is repeated for every record on every
+poll, even though finished records never change. This module encodes each
+record once (with orjson when it is installed) and reuses the bytes.
+"""
+
+import json
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Iterable, Optional
+
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """
+    Fallback for values the encoder does not know, e.g. an agent history object
+    assigned to a `str` field. They are sent as their string form.
+    """
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return str(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serializes a JSON-compatible object to bytes, using orjson when available.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def encode_model(model: BaseModel) -> bytes:
+    """
+    Serializes a pydantic model to JSON bytes without the jsonable_encoder pass.
+    """
+    # orjson handles datetime and str-Enum values natively; json uses _default.
+    return dumps(model.model_dump(warnings=False))
+
+
+class RecordEncoder:
+    """
+    Encodes task records to JSON and caches the bytes of finished records.
+
+    Records are cached under (id, status) and only once their status is in
+    `final_statuses`, because running records are still mutated in place by
+    the background task. The cache is a bounded LRU. Records that are not
+    pydantic models are converted with `to_model` first.
+    """
+
+    def __init__(
+        self,
+        final_statuses: Iterable[Any],
+        max_entries: int = 10000,
+        to_model: Optional[Callable[[Any], BaseModel]] = None,
+    ):
+        self.final_statuses = frozenset(final_statuses)
+        self.max_entries = max_entries
+        self.to_model = to_model
+        self._cache: "OrderedDict[tuple[Any, Any], bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _encode(self, record: Any) -> bytes:
+        return encode_model(self.to_model(record) if self.to_model else record)
+
+    def encode(self, record: Any) -> bytes:
+        """
+        Returns the JSON bytes for a single record.
+        """
+        status = getattr(record, "status", None)
+        if status not in self.final_statuses:
+            return self._encode(record)
+
+        key = (getattr(record, "id", None), status)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        encoded = self._encode(record)
+        self._cache[key] = encoded
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return encoded
+
+    def encode_list(self, records: Iterable[Any]) -> bytes:
+        """
+        Returns a JSON array of the given records, joining the per-record bytes.
+        """
+        return b"[" + b",".join(self.encode(record) for record in records) + b"]"
+
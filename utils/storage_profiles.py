@@ -0,0 +1,156 @@
+"""
+Encrypted, expiring browser storage-state profiles on local disk.
+
+Every task starts from a blank browser profile, so an authenticated site
+costs the agent several steps and LLM calls just to log in again. A storage
+profile is the Playwright storage state of a finished task (cookies and
+localStorage per origin) plus the URL it ended on, saved under a name.
+A later task that names the profile starts with that state restored and on
+that page (see ManagedBrowserContext.restore_storage_state).
+
+Profiles hold session cookies, so each is stored as a Fernet token: AES-128
+encrypted and HMAC-signed with the server's key. The token carries the time it
+was written, which is used for expiry: a profile older than `ttl_seconds` is
+deleted instead of restored (a `ttl_seconds` of 0 or None never expires). Cookies that expired on their own are dropped
+when a profile is loaded.
+
+Needs the `cryptography` package.
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # pragma: no cover - optional dependency
+    Fernet = None
+
+from utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+PROFILE_NAME_PATTERN = r"^[A-Za-z0-9_.-]{1,64}$"
+
+
+class StorageProfileStore:
+    """
+    Stores one encrypted storage state per profile name under `root`.
+    `key` is a Fernet key (32 url-safe base64-encoded bytes).
+    Methods are blocking; call them through asyncio.to_thread.
+    """
+
+    def __init__(self, root: str, key: str, ttl_seconds: Optional[float] = 86400.0):
+        if Fernet is None:
+            raise RuntimeError("Storage profiles need the 'cryptography' package")
+        self.root = root
+        self.fernet = Fernet(key.encode("ascii") if isinstance(key, str) else key)
+        self.ttl_seconds = ttl_seconds or None
+
+    def _path(self, name: str) -> str:
+        if not re.match(PROFILE_NAME_PATTERN, name) or name.startswith("."):
+            raise ValueError(f"Invalid storage profile name: {name}")
+        return os.path.join(self.root, f"{name}.profile")
+
+    def _expires_at(self, saved_at: float) -> Optional[float]:
+        return saved_at + self.ttl_seconds if self.ttl_seconds else None
+
+    def _expired(self, saved_at: float, now: float) -> bool:
+        expires_at = self._expires_at(saved_at)
+        return expires_at is not None and expires_at < now
+
+    def _read_token(self, name: str) -> Optional[bytes]:
+        try:
+            with open(self._path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def load(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the storage state saved as `name`, or None when there is none,
+        it expired or it cannot be decrypted with the current key.
+        """
+        token = self._read_token(name)
+        if token is None:
+            return None
+        now = time.time()
+        try:
+            # Expiry is checked here rather than by Fernet, whose ttl is whole seconds
+            if self._expired(self.fernet.extract_timestamp(token), now):
+                raise InvalidToken
+            state = json.loads(self.fernet.decrypt(token))
+        except InvalidToken:
+            # Expired, or written with another key
+            logger.info(f"Storage profile {name} expired or unreadable, deleting it.")
+            self.delete(name)
+            return None
+        # Session cookies have an expires of -1
+        state["cookies"] = [
+            cookie for cookie in state.get("cookies", []) if not (0 < cookie.get("expires", -1) < now)
+        ]
+        return state
+
+    def save(self, name: str, state: Dict[str, Any]) -> int:
+        """
+        Encrypts and stores `state` as `name`, replacing the previous one and
+        restarting its expiry. Returns the size of the stored token in bytes.
+        """
+        path = self._path(name)
+        token = self.fernet.encrypt(dumps(state))
+        os.makedirs(self.root, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial profile
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(token)
+            os.replace(tmp_path, path)  # mkstemp files are only readable by their owner
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return len(token)
+
+    def delete(self, name: str) -> bool:
+        try:
+            os.remove(self._path(name))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def list(self) -> List[Dict[str, Any]]:
+        """
+        Lists the saved profiles with when they were saved and expire,
+        deleting the expired ones. Contents are not decrypted.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        profiles = []
+        now = time.time()
+        for filename in sorted(os.listdir(self.root)):
+            name, ext = os.path.splitext(filename)
+            if ext != ".profile":
+                continue
+            token = self._read_token(name)
+            if token is None:
+                continue
+            try:
+                saved_at = self.fernet.extract_timestamp(token)
+            except InvalidToken:
+                saved_at = None
+            if saved_at is None or self._expired(saved_at, now):
+                self.delete(name)
+                continue
+            profiles.append(
+                {
+                    "name": name,
+                    "saved_at": saved_at,
+                    "expires_at": self._expires_at(saved_at),
+                    "bytes": len(token),
+                }
+            )
+        return profiles
@@ -0,0 +1,203 @@
+"""
+Non-blocking structured logging.
+
+LogPipeline replaces the root logger's handlers with a single QueueHandler,
+so a log call on the event loop only merges its message and puts the record
+on a bounded queue. A QueueListener thread formats the records (including
+tracebacks) and writes them to stderr and, optionally, a rotating file.
+When the queue is full records are dropped rather than blocking the loop;
+the number dropped is logged once there is room again.
+
+Records are written as JSON lines with the fields bound to the current task
+by `bind_log_context()` (task_id, phase) and any `extra` fields. SamplingFilter
+keeps only a share of the INFO and DEBUG records of noisy loggers; warnings
+and errors are always kept.
+
+browser_use and uvicorn install handlers of their own; LogPipeline removes
+them and lets those loggers propagate to the queue as well.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
+
+_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+
+# Attributes every LogRecord has; anything else was passed as `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+TAKEN_OVER_LOGGERS = ("browser_use", "uvicorn", "uvicorn.error", "uvicorn.access")
+
+
+def bind_log_context(**fields: Any) -> None:
+    """
+    Adds `fields` (e.g. task_id, phase) to every record logged from the
+    current asyncio task from now on.
+    """
+    _context.set({**_context.get(), **fields})
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS and not key.startswith("_")}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_extra_fields(record),
+        }
+        if record.exc_info:
+            event["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            event["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Plain text lines, with the bound and extra fields appended as key=value.
+    """
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-8s [%(name)s] %(message)s")
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps INFO and DEBUG records of a logger (or its children) with the
+    probability given in `rates`, e.g. {"uvicorn.access": 0.1}.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, Optional[float]] = {}
+
+    def _rate(self, name: str) -> Optional[float]:
+        if name not in self._resolved:
+            matches = [key for key in self.rates if name == key or name.startswith(key + ".")]
+            self._resolved[name] = self.rates[max(matches, key=len)] if matches else None
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate is None or random.random() < rate
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge the message here; formatting, tracebacks included, is
+        # left to the listener thread
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            notice = logging.makeLogRecord({
+                "name": __name__,
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": f"Dropped {dropped} log records; the log queue was full.",
+            })
+            try:
+                self.queue.put_nowait(notice)
+            except queue.Full:
+                self.dropped += dropped
+
+
+def parse_sampling(value: str) -> Dict[str, float]:
+    """
+    Parses "logger=rate,..." e.g. "uvicorn.access=0.1,browser_use.dom=0".
+    """
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+class LogPipeline:
+    """
+    One instance per server; `install()` it at import time and `stop()` it
+    at shutdown to flush the queue.
+    """
+
+    def __init__(
+        self,
+        level: str = "INFO",
+        fmt: str = "json",
+        file: Optional[str] = None,
+        file_max_bytes: int = 50 * 1024 * 1024,
+        file_backups: int = 5,
+        sampling: Optional[Dict[str, float]] = None,
+        queue_size: int = 10000,
+    ):
+        self.level = level.upper()
+        formatter = TextFormatter() if fmt == "text" else JsonFormatter()
+        self.handlers = [logging.StreamHandler(sys.stderr)]
+        if file:
+            os.makedirs(os.path.dirname(os.path.abspath(file)), exist_ok=True)
+            self.handlers.append(RotatingFileHandler(file, maxBytes=file_max_bytes, backupCount=file_backups, encoding="utf-8"))
+        for handler in self.handlers:
+            handler.setFormatter(formatter)
+        self.queue_handler = _NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+        if sampling:
+            self.queue_handler.addFilter(SamplingFilter(sampling))
+        self.listener = QueueListener(self.queue_handler.queue, *self.handlers)
+        self._running = False
+
+    def install(self) -> None:
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.queue_handler)
+        root.setLevel(self.level)
+        for name in TAKEN_OVER_LOGGERS:
+            taken_over = logging.getLogger(name)
+            taken_over.handlers = []
+            taken_over.propagate = True
+        self.listener.start()
+        self._running = True
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        if self._running:
+            self._running = False
+            self.listener.stop()
+            for handler in self.handlers:
+                handler.close()
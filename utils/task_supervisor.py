@@ -0,0 +1,113 @@
+"""
+Tracking of running agent tasks for graceful shutdown.
+
+Tasks are started as asyncio tasks owned by the supervisor rather than as
+FastAPI background tasks, so the server's lifespan can decide how long to
+wait for them. On shutdown the supervisor stops accepting tasks, cancels
+the ones still queued (waiting for a concurrency slot or their session), so
+none of them opens a browser, waits for running ones up to a deadline,
+cancels the rest (execute_task checkpoints their history when cancelled)
+and finally closes every browser that is still open.
+
+A task counts as running once it called `begin`, which refuses to start it
+once shutdown began.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Coroutine, Dict, List, Set
+
+logger = logging.getLogger(__name__)
+
+
+class ShuttingDownError(RuntimeError):
+    """Raised by `begin` when a queued task would start during shutdown."""
+
+
+class TaskSupervisor:
+    """
+    Owns the asyncio tasks of running agent tasks and the browsers they
+    opened. One instance per server.
+    """
+
+    def __init__(self, cancel_grace_seconds: float = 10.0):
+        self.accepting = True
+        self.cancel_grace_seconds = cancel_grace_seconds
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self.running: Set[int] = set()  # Tasks that called begin()
+        # Objects with an async close() (browsers, contexts) per task, in creation order
+        self.resources: Dict[int, List[Any]] = {}
+
+    def start(self, task_id: int, coroutine: Coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine, name=f"agent-task-{task_id}")
+        self.tasks[task_id] = task
+        task.add_done_callback(lambda _: self._forget(task_id))
+        return task
+
+    def _forget(self, task_id: int) -> None:
+        self.tasks.pop(task_id, None)
+        self.running.discard(task_id)
+
+    def begin(self, task_id: int) -> None:
+        """
+        Marks a queued task as running, right before it opens a browser.
+        Raises ShuttingDownError once shutdown began.
+        """
+        if not self.accepting:
+            raise ShuttingDownError("Server is shutting down")
+        self.running.add(task_id)
+
+    def track(self, task_id: int, resource: Any) -> None:
+        self.resources.setdefault(task_id, []).append(resource)
+
+    def untrack(self, task_id: int) -> None:
+        self.resources.pop(task_id, None)
+
+    async def shutdown(self, drain_seconds: float) -> dict:
+        """
+        Stops intake, cancels queued tasks, drains running ones for up to
+        `drain_seconds`, cancels the remaining ones and closes whatever they
+        left open. Returns counts of refused, drained and cancelled tasks and
+        closed resources.
+        """
+        self.accepting = False
+        started = time.monotonic()
+        queued = [task for task_id, task in self.tasks.items() if task_id not in self.running]
+        for task in queued:
+            task.cancel()
+        if queued:
+            logger.info(f"Shutdown: cancelled {len(queued)} queued task(s) before they started.")
+            await asyncio.wait(queued, timeout=self.cancel_grace_seconds)
+        running = list(self.tasks.values())
+        if running:
+            logger.info(f"Shutdown: waiting up to {drain_seconds}s for {len(running)} running task(s).")
+            _, pending = await asyncio.wait(running, timeout=drain_seconds)
+        else:
+            pending = set()
+
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Shutdown: cancelled {len(pending)} task(s) still running after {drain_seconds}s.")
+            await asyncio.wait(pending, timeout=self.cancel_grace_seconds)
+
+        closed = 0
+        for task_id, resources in list(self.resources.items()):
+            for resource in reversed(resources):
+                try:
+                    await resource.close()
+                    closed += 1
+                except Exception as e:
+                    logger.error(f"Shutdown: error closing {type(resource).__name__} of task {task_id}: {e}")
+            self.untrack(task_id)
+
+        summary = {
+            "refused": len(queued),
+            "drained": len(running) - len(pending),
+            "cancelled": len(pending),
+            "closed": closed,
+            "seconds": round(time.monotonic() - started, 3),
+        }
+        logger.info(f"Shutdown complete: {summary}")
+        return summary
@@ -0,0 +1,161 @@
+"""
+Screenshot policy and downscaling for agent steps.
+
+With vision on, every step sends a full-resolution PNG screenshot to the
+LLM, which dominates request size and latency. VisionProcessor takes over
+screenshot capture from browser-use (the Agent runs with use_vision=False)
+and decides per step whether to capture, following a VisionPolicy:
+
+- off: never send screenshots;
+- on_demand: only when the agent asks for one through the
+  `request_screenshot` action, or when the page looks like it needs one
+  (very few interactive elements, or the page did not change since the
+  previous step);
+- always: every step.
+
+Captured screenshots are downscaled and re-encoded before they are sent.
+They stay PNG because browser-use labels the image as image/png in the
+prompt.
+"""
+
+import asyncio
+import base64
+import io
+import logging
+import time
+from enum import Enum
+from typing import Any, Optional
+
+from browser_use.agent.views import ActionResult
+from browser_use.browser.views import BrowserState
+from browser_use.controller.service import Controller
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+class VisionPolicy(str, Enum):
+    OFF = "off"
+    ON_DEMAND = "on_demand"
+    ALWAYS = "always"
+
+
+def downscale_png(png_bytes: bytes, max_width: int, target_bytes: int, min_width: int = 480) -> bytes:
+    """
+    Downscales a PNG to at most `max_width` pixels wide, then keeps shrinking it
+    (and finally reduces it to a 256-colour palette) until it fits in
+    `target_bytes` or reaches `min_width`.
+    """
+    image = Image.open(io.BytesIO(png_bytes))
+    image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGB")
+
+    def encode(img: Image.Image) -> bytes:
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+
+    width = min(image.width, max_width)
+    quantized = False
+    while True:
+        if width < image.width:
+            height = max(1, round(image.height * width / image.width))
+            candidate = image.resize((width, height), Image.Resampling.LANCZOS)
+        else:
+            candidate = image
+        if quantized:
+            candidate = candidate.convert("RGB").quantize(colors=256)
+        encoded = encode(candidate)
+        if len(encoded) <= target_bytes:
+            return encoded
+        if width > min_width:
+            width = max(min_width, int(width * 0.75))
+        elif not quantized:
+            quantized = True
+        else:
+            return encoded
+
+
+class VisionProcessor:
+    """
+    State processor for ManagedBrowserContext that captures, filters and
+    downscales screenshots according to `policy`. One instance per task.
+    """
+
+    def __init__(
+        self,
+        policy: VisionPolicy,
+        max_width: int = 1024,
+        target_bytes: int = 150_000,
+        min_interactive_elements: int = 3,
+        task_id: Optional[int] = None,
+    ):
+        self.policy = policy
+        self.max_width = max_width
+        self.target_bytes = target_bytes
+        self.min_interactive_elements = min_interactive_elements
+        self.task_id = task_id
+        self.screenshot_requested = False
+        self.bytes_captured = 0
+        self.bytes_sent = 0
+        self.screenshots_sent = 0
+        self._previous_page: Optional[tuple] = None
+
+    def register_actions(self, controller: Controller) -> None:
+        """
+        Adds the `request_screenshot` action for the on_demand policy.
+        """
+        if self.policy != VisionPolicy.ON_DEMAND:
+            return
+
+        @controller.action(
+            "Request a screenshot of the current page in the next step, when the element list is not enough to decide"
+        )
+        async def request_screenshot():
+            self.screenshot_requested = True
+            return ActionResult(
+                extracted_content="A screenshot will be included in the next step.",
+                include_in_memory=True,
+            )
+
+    def _wants_screenshot(self, state: BrowserState) -> bool:
+        page = (state.url, state.title, len(state.selector_map))
+        unchanged = page == self._previous_page
+        self._previous_page = page
+
+        if self.policy == VisionPolicy.ALWAYS:
+            return True
+        if self.policy == VisionPolicy.OFF:
+            return False
+        if self.screenshot_requested:
+            self.screenshot_requested = False
+            return True
+        return unchanged or len(state.selector_map) < self.min_interactive_elements
+
+    async def process(self, state: BrowserState, context: Any) -> BrowserState:
+        if not self._wants_screenshot(state):
+            state.screenshot = None
+            context.current_metrics.update(screenshot_bytes=0)
+            return state
+
+        started = time.monotonic()
+        if state.screenshot is None:
+            state.screenshot = await context.take_screenshot()
+        raw = base64.b64decode(state.screenshot)
+        small = await asyncio.to_thread(downscale_png, raw, self.max_width, self.target_bytes)
+        state.screenshot = base64.b64encode(small).decode("ascii")
+
+        self.bytes_captured += len(raw)
+        self.bytes_sent += len(small)
+        self.screenshots_sent += 1
+        context.current_metrics.update(
+            screenshot_bytes=len(small),
+            screenshot_raw_bytes=len(raw),
+            screenshot_seconds=round(time.monotonic() - started, 3),
+        )
+        logger.info(
+            f"Task ID {self.task_id}: Screenshot {len(raw)} -> {len(small)} bytes "
+            f"({self.policy.value} policy)."
+        )
+        return state